@@ -0,0 +1,155 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, List
+
+import numpy as np
+
+
+class AnswerCache:
+    """
+    LRU cache of question answers with exact and semantic lookup
+
+    The first tier matches questions by normalized text. The second tier
+    matches earlier questions whose query embedding has a cosine similarity
+    of at least similarity_threshold. Entries expire after ttl_seconds and
+    are dropped when any document that contributed to them changes.
+    """
+
+    def __init__(self, max_entries: int = 500, ttl_seconds: int = 3600,
+                 similarity_threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.hits = {'exact': 0, 'semantic': 0}
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        """Normalize question text for exact matching"""
+        question = re.sub(r'\s+', ' ', question.strip().lower())
+        return question.rstrip('?!. ')
+
+    def get(self, question: str, scope: Hashable = None) -> Dict[str, any]:
+        """
+        Look up an answer for the exact (normalized) question
+
+        Args:
+            question: User's question
+            scope: Anything else the answer depends on, such as n_results
+
+        Returns:
+            Cached response or None
+        """
+        key = (scope, self.normalize(question))
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and self._expired(entry):
+                del self._entries[key]
+                entry = None
+
+            if entry is None:
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits['exact'] += 1
+            return dict(entry['response'], cached='exact')
+
+    def get_similar(self, embedding: List[float], scope: Hashable = None) -> Dict[str, any]:
+        """
+        Look up an answer for a near-duplicate question
+
+        Args:
+            embedding: Query embedding of the new question
+            scope: Anything else the answer depends on, such as n_results
+
+        Returns:
+            Cached response of the most similar question above the threshold, or None
+        """
+        query = self._unit(embedding)
+
+        with self._lock:
+            self._evict_expired()
+            keys = [key for key, entry in self._entries.items() if entry['scope'] == scope]
+
+            if keys:
+                matrix = np.stack([self._entries[key]['embedding'] for key in keys])
+                similarities = matrix @ query
+                best = int(np.argmax(similarities))
+
+                if similarities[best] >= self.similarity_threshold:
+                    self._entries.move_to_end(keys[best])
+                    self.hits['semantic'] += 1
+                    return dict(self._entries[keys[best]]['response'], cached='semantic')
+
+            self.misses += 1
+            return None
+
+    def put(self, question: str, scope: Hashable, embedding: List[float],
+            response: Dict[str, any], file_names: Iterable[str]):
+        """
+        Cache a response
+
+        Args:
+            question: User's question
+            scope: Anything else the answer depends on, such as n_results
+            embedding: Query embedding of the question
+            response: Response to return on later hits
+            file_names: Documents whose chunks were used to build the answer
+        """
+        key = (scope, self.normalize(question))
+
+        with self._lock:
+            self._entries[key] = {
+                'scope': scope,
+                'embedding': self._unit(embedding),
+                'response': response,
+                'file_names': set(file_names),
+                'created_at': time.time()
+            }
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_files(self, file_names: Iterable[str]):
+        """Drop every entry that used any of the given documents"""
+        file_names = set(file_names)
+
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry['file_names'] & file_names]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, any]:
+        """Get cache counters"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'exact_hits': self.hits['exact'],
+                'semantic_hits': self.hits['semantic'],
+                'misses': self.misses
+            }
+
+    def _expired(self, entry: Dict[str, any]) -> bool:
+        return time.time() - entry['created_at'] > self.ttl_seconds
+
+    def _evict_expired(self):
+        for key in [key for key, entry in self._entries.items() if self._expired(entry)]:
+            del self._entries[key]
+
+    @staticmethod
+    def _unit(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
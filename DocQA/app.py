@@ -1,17 +1,32 @@
 import os
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+import json
+import shutil
+import tempfile
+import zipfile
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, stream_with_context
 from werkzeug.utils import secure_filename
 from query_engine import QueryEngine
+from vector_store import build_where
+from job_queue import JobQueue
 from config import Config
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = Config.SECRET_KEY
 app.config['UPLOAD_FOLDER'] = Config.UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = Config.MAX_FILE_SIZE_MB * 1024 * 1024
+# Batch uploads carry many files per request; /upload enforces the per-file limit itself
+app.config['MAX_CONTENT_LENGTH'] = Config.MAX_BATCH_UPLOAD_MB * 1024 * 1024
 
-# Initialize
-Config.init_app()
-query_engine = QueryEngine()
+# Initialize components
+query_engine = None
+job_queue = None
+
+
+def init_app():
+    """Initialize application components"""
+    global query_engine, job_queue
+    Config.init_app()
+    query_engine = QueryEngine()
+    job_queue = JobQueue(max_workers=Config.INDEX_WORKERS)
 
 
 def allowed_file(filename):
@@ -20,6 +35,143 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
 
 
+class ArchiveLimitError(ValueError):
+    """A zip archive holds more files or unpacks to more bytes than allowed"""
+
+
+def upload_path(filename, replace=False, taken=()):
+    """
+    Pick the upload path for a file, adding a numeric suffix unless replacing
+    
+    A path in taken, already used by an earlier file of the same batch, is
+    never replaced, so two files of one batch cannot race for the same path.
+    """
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    replace = replace and filepath not in taken
+    
+    # Check if file already exists
+    counter = 1
+    base_name, ext = os.path.splitext(filename)
+    while not replace and os.path.exists(filepath):
+        filename = f"{base_name}_{counter}{ext}"
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        counter += 1
+    
+    return filepath
+
+
+def staged_upload_path(filepath):
+    """
+    Pick where to save an upload until it is indexed
+    
+    New files are saved in place. A file replacing an earlier upload is
+    staged under the same name in a directory of its own, so the earlier
+    upload is kept if the new one cannot be indexed.
+    """
+    if not os.path.exists(filepath):
+        return filepath
+    
+    staging_folder = os.path.join(app.config['UPLOAD_FOLDER'], '.staging')
+    os.makedirs(staging_folder, exist_ok=True)
+    return os.path.join(tempfile.mkdtemp(dir=staging_folder), os.path.basename(filepath))
+
+
+def finish_upload(filepath, staged_path, indexed):
+    """Move an indexed upload into place, or discard one that failed"""
+    if indexed:
+        if staged_path != filepath:
+            os.replace(staged_path, filepath)
+    elif os.path.exists(staged_path):
+        os.remove(staged_path)
+    
+    if staged_path != filepath:
+        shutil.rmtree(os.path.dirname(staged_path), ignore_errors=True)
+
+
+def discard_uploads(uploads):
+    """Delete saved (path, staged path) uploads that will not be indexed, keeping earlier uploads they replace"""
+    for filepath, staged_path in uploads:
+        finish_upload(filepath, staged_path, False)
+
+
+def save_archive_members(archive, replace=False, taken=None):
+    """
+    Stream the supported members of a zip archive into the upload folder, as (path, staged path) pairs
+    
+    Raises ArchiveLimitError, leaving nothing saved, if the archive has more
+    than Config.MAX_ARCHIVE_MEMBERS entries or unpacks to more than
+    Config.MAX_ARCHIVE_UNPACKED_MB. Bytes are counted as they are written,
+    not taken from the archive's headers.
+    """
+    saved = []
+    taken = set() if taken is None else taken
+    max_size = Config.MAX_FILE_SIZE_MB * 1024 * 1024
+    budget = Config.MAX_ARCHIVE_UNPACKED_MB * 1024 * 1024
+    
+    try:
+        with zipfile.ZipFile(archive) as zf:
+            members = zf.infolist()
+            if len(members) > Config.MAX_ARCHIVE_MEMBERS:
+                raise ArchiveLimitError(f'Zip archive has more than {Config.MAX_ARCHIVE_MEMBERS} entries')
+            
+            for member in members:
+                filename = secure_filename(os.path.basename(member.filename))
+                if member.is_dir() or not allowed_file(filename) or member.file_size > max_size:
+                    continue
+                
+                filepath = upload_path(filename, replace, taken)
+                staged_path = staged_upload_path(filepath)
+                saved.append((filepath, staged_path))
+                taken.add(filepath)
+                with zf.open(member) as src, open(staged_path, 'wb') as dst:
+                    budget -= copy_limited(src, dst, min(max_size, budget), filename)
+    
+    except Exception:
+        discard_uploads(saved)
+        raise
+    
+    return saved
+
+
+def copy_limited(src, dst, limit, filename):
+    """Copy a stream, raising ArchiveLimitError once more than limit bytes have been read"""
+    copied = 0
+    for block in iter(lambda: src.read(1024 * 1024), b''):
+        copied += len(block)
+        if copied > limit:
+            raise ArchiveLimitError(f'Zip archive member "{filename}" unpacks past the size limit')
+        dst.write(block)
+    return copied
+
+
+def index_upload(filepath, staged_path=None, progress=None):
+    """Index an uploaded file, discarding it if indexing fails (an earlier upload it replaces is kept)"""
+    staged_path = staged_path or filepath
+    indexed = False
+    
+    try:
+        result = query_engine.index_document(staged_path, progress=progress)
+        indexed = result['success']
+        return result
+    
+    finally:
+        finish_upload(filepath, staged_path, indexed)
+
+
+def index_upload_batch(uploads, progress=None):
+    """Index a batch of (path, staged path) uploads, discarding the ones that could not be indexed"""
+    indexed = set()
+    
+    try:
+        result = query_engine.index_documents([staged_path for _, staged_path in uploads], progress=progress)
+        indexed = {doc['file_name'] for doc in result['indexed']}
+        return result
+    
+    finally:
+        for filepath, staged_path in uploads:
+            finish_upload(filepath, staged_path, os.path.basename(staged_path) in indexed)
+
+
 @app.route('/')
 def index():
     """Main page"""
@@ -29,10 +181,16 @@ def index():
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
-    """Handle file upload and indexing"""
+    """Handle file upload and queue it for background indexing"""
     if 'file' not in request.files:
         return jsonify({'success': False, 'error': 'No file provided'}), 400
     
+    if (request.content_length or 0) > Config.MAX_FILE_SIZE_MB * 1024 * 1024:
+        return jsonify({
+            'success': False,
+            'error': f'File exceeds the {Config.MAX_FILE_SIZE_MB}MB limit'
+        }), 413
+    
     file = request.files['file']
     
     if file.filename == '':
@@ -46,44 +204,99 @@ def upload_file():
     
     try:
         # Save file
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        # Re-uploads with replace=true update the existing document in place,
+        # so only chunks whose content changed get re-embedded
+        replace = request.form.get('replace', '').lower() in ('1', 'true', 'yes')
         
-        # Check if file already exists
-        counter = 1
-        base_name, ext = os.path.splitext(filename)
-        while os.path.exists(filepath):
-            filename = f"{base_name}_{counter}{ext}"
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            counter += 1
+        filepath = upload_path(secure_filename(file.filename), replace)
+        filename = os.path.basename(filepath)
+        staged_path = staged_upload_path(filepath)
+        file.save(staged_path)
         
-        file.save(filepath)
+        # Index the document in the background
+        job_id = job_queue.submit(index_upload, filepath, staged_path)
         
-        # Index the document
-        result = query_engine.index_document(filepath)
+        return jsonify({
+            'success': True,
+            'message': f'Document "{filename}" uploaded, indexing started',
+            'file_name': filename,
+            'job_id': job_id
+        }), 202
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/upload/batch', methods=['POST'])
+def upload_batch():
+    """Handle a multi-file or zip archive upload and queue it for background indexing"""
+    files = [f for f in request.files.getlist('files') if f.filename]
+    
+    if not files:
+        return jsonify({'success': False, 'error': 'No files provided'}), 400
+    
+    replace = request.form.get('replace', '').lower() in ('1', 'true', 'yes')
+    
+    uploads = []
+    try:
+        skipped = []
+        taken = set()
         
-        if result['success']:
-            return jsonify({
-                'success': True,
-                'message': f'Document "{filename}" uploaded and indexed successfully',
-                'file_name': result['file_name'],
-                'chunks': result['chunks'],
-                'size': result['size']
-            })
-        else:
-            # Clean up file if indexing failed
-            os.remove(filepath)
+        for file in files:
+            if file.filename.lower().endswith('.zip'):
+                uploads.extend(save_archive_members(file.stream, replace, taken))
+            elif allowed_file(file.filename):
+                filepath = upload_path(secure_filename(file.filename), replace, taken)
+                staged_path = staged_upload_path(filepath)
+                uploads.append((filepath, staged_path))
+                taken.add(filepath)
+                file.save(staged_path)
+            else:
+                skipped.append(file.filename)
+        
+        if not uploads:
             return jsonify({
                 'success': False,
-                'error': result.get('error', 'Failed to index document')
+                'error': f'No supported files found. Allowed types: {", ".join(Config.ALLOWED_EXTENSIONS)}'
             }), 400
+        
+        # Index all documents in one background job
+        job_id = job_queue.submit(index_upload_batch, uploads)
+        
+        return jsonify({
+            'success': True,
+            'message': f'{len(uploads)} documents uploaded, indexing started',
+            'file_names': [os.path.basename(filepath) for filepath, _ in uploads],
+            'skipped': skipped,
+            'job_id': job_id
+        }), 202
+    
+    except ArchiveLimitError as e:
+        discard_uploads(uploads)
+        return jsonify({'success': False, 'error': str(e)}), 413
+    
+    except zipfile.BadZipFile:
+        discard_uploads(uploads)
+        return jsonify({'success': False, 'error': 'Invalid zip archive'}), 400
     
     except Exception as e:
+        discard_uploads(uploads)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Report the stage and progress of an indexing job"""
+    job = job_queue.get(job_id)
+    
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    return jsonify({'success': True, 'job': job})
+
+
 @app.route('/query', methods=['POST'])
-def query():
+async def query():
     """Handle question queries"""
     data = request.get_json()
     
@@ -95,14 +308,53 @@ def query():
     if not question:
         return jsonify({'success': False, 'error': 'Question cannot be empty'}), 400
     
+    filters = data.get('filters')
+    try:
+        build_where(filters)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
     try:
-        result = query_engine.ask(question)
+        result = await query_engine.aask(question, filters=filters)
         return jsonify(result)
     
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/query/stream', methods=['POST'])
+def query_stream():
+    """Handle question queries, streaming the answer as Server-Sent Events"""
+    data = request.get_json()
+    
+    if not data or 'question' not in data:
+        return jsonify({'success': False, 'error': 'No question provided'}), 400
+    
+    question = data['question'].strip()
+    
+    if not question:
+        return jsonify({'success': False, 'error': 'Question cannot be empty'}), 400
+    
+    filters = data.get('filters')
+    try:
+        build_where(filters)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    def events():
+        try:
+            for event in query_engine.ask_stream(question, filters=filters):
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @app.route('/documents', methods=['GET'])
 def list_documents():
     """List all indexed documents"""
@@ -165,6 +417,8 @@ def clear_all():
 
 
 if __name__ == '__main__':
+    init_app()
+    
     print(f"""
 ╔═══════════════════════════════════════════════════════════╗
 ║                   DocQA Server Starting                   ║
@@ -0,0 +1,229 @@
+import math
+import re
+import sqlite3
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterable, List, Sequence, Tuple
+
+
+# Words, optionally joined into identifiers such as theme-marketing, ERR_TIMEOUT or v2.1
+TOKEN_PATTERN = re.compile(r'[^\W_]+(?:[-_./][^\W_]+)*')
+PART_SEPARATOR = re.compile(r'[-_./]')
+
+STOPWORDS = frozenset("""
+    a an and are as at be but by for from has have if in into is it its of on or
+    that the their then there these they this to was were will with
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into index terms, keeping identifiers whole and also indexing their parts"""
+    terms = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group()
+        if token in STOPWORDS:
+            continue
+        terms.append(token)
+        if not token.isalnum():
+            terms.extend(part for part in PART_SEPARATOR.split(token) if part not in STOPWORDS)
+    return terms
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Merge ranked ID lists with reciprocal rank fusion
+
+    Args:
+        rankings: ID lists, each ordered best first
+        k: Damping constant; larger values flatten the contribution of top ranks
+
+    Returns:
+        (id, score) pairs ordered by fused score
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, 1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """
+    SQLite inverted index that scores chunks with Okapi BM25
+
+    Each chunk is stored with its document key and length, and every term
+    it contains gets a posting with its term frequency. Corpus totals are
+    kept up to date on every write so queries never scan the whole index.
+    """
+
+    _SQL_BATCH = 500
+
+    def __init__(self, db_path: str, k1: float = 1.2, b: float = 0.75):
+        self.db_path = db_path
+        self.k1 = k1
+        self.b = b
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS chunks (
+                    id TEXT PRIMARY KEY,
+                    document TEXT NOT NULL,
+                    length INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS chunks_document ON chunks (document);
+                CREATE TABLE IF NOT EXISTS postings (
+                    term TEXT NOT NULL,
+                    chunk_id TEXT NOT NULL,
+                    tf INTEGER NOT NULL,
+                    PRIMARY KEY (term, chunk_id)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS postings_chunk ON postings (chunk_id);
+                CREATE TABLE IF NOT EXISTS totals (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    chunks INTEGER NOT NULL,
+                    length INTEGER NOT NULL
+                );
+                INSERT OR IGNORE INTO totals (id, chunks, length) VALUES (0, 0, 0);
+            """)
+
+    @contextmanager
+    def _connect(self):
+        """Open a connection that commits on success and rolls back on error"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def add(self, chunks: Iterable[Tuple[str, str, str]]):
+        """
+        Index chunks, replacing any already indexed under the same ID
+
+        Args:
+            chunks: (chunk_id, document key, text) tuples
+        """
+        # The last text given for an ID wins
+        chunks = list({chunk[0]: chunk for chunk in chunks}.values())
+        if not chunks:
+            return
+
+        with self._connect() as conn:
+            self._remove(conn, [chunk_id for chunk_id, _, _ in chunks])
+
+            total_length = 0
+            for chunk_id, document, text in chunks:
+                counts = Counter(tokenize(text))
+                length = sum(counts.values())
+                total_length += length
+
+                conn.execute(
+                    "INSERT INTO chunks (id, document, length) VALUES (?, ?, ?)",
+                    (chunk_id, document, length)
+                )
+                conn.executemany(
+                    "INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)",
+                    [(term, chunk_id, tf) for term, tf in counts.items()]
+                )
+
+            conn.execute(
+                "UPDATE totals SET chunks = chunks + ?, length = length + ?",
+                (len(chunks), total_length)
+            )
+
+    def remove(self, chunk_ids: Iterable[str]):
+        """Remove chunks from the index"""
+        with self._connect() as conn:
+            self._remove(conn, list(chunk_ids))
+
+    def remove_document(self, document: str):
+        """Remove every chunk of a document"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT id FROM chunks WHERE document = ?", (document,)).fetchall()
+            self._remove(conn, [row[0] for row in rows])
+
+    def clear(self):
+        """Remove every chunk"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM postings")
+            conn.execute("DELETE FROM chunks")
+            conn.execute("UPDATE totals SET chunks = 0, length = 0")
+
+    def count(self) -> int:
+        """Number of indexed chunks"""
+        with self._connect() as conn:
+            return conn.execute("SELECT chunks FROM totals").fetchone()[0]
+
+    def search(self, query: str, limit: int) -> List[Tuple[str, float]]:
+        """
+        Score chunks against a query
+
+        Args:
+            query: Search query
+            limit: Maximum number of results
+
+        Returns:
+            (chunk_id, score) pairs, best first
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        with self._connect() as conn:
+            chunk_count, total_length = conn.execute("SELECT chunks, length FROM totals").fetchone()
+            if not chunk_count:
+                return []
+            average_length = total_length / chunk_count or 1.0
+
+            weights = []
+            for term in terms:
+                df = conn.execute("SELECT COUNT(*) FROM postings WHERE term = ?", (term,)).fetchone()[0]
+                if df:
+                    idf = math.log(1 + (chunk_count - df + 0.5) / (df + 0.5))
+                    weights.append((term, idf))
+
+            if not weights:
+                return []
+
+            values = ", ".join("(?, ?)" for _ in weights)
+            params = [value for weight in weights for value in weight]
+            rows = conn.execute(
+                f"""
+                WITH query_terms (term, idf) AS (VALUES {values})
+                SELECT p.chunk_id,
+                       SUM(q.idf * p.tf * (? + 1) / (p.tf + ? * (1 - ? + ? * c.length / ?))) AS score
+                FROM query_terms q
+                JOIN postings p ON p.term = q.term
+                JOIN chunks c ON c.id = p.chunk_id
+                GROUP BY p.chunk_id
+                ORDER BY score DESC
+                LIMIT ?
+                """,
+                params + [self.k1, self.k1, self.b, self.b, average_length, limit]
+            ).fetchall()
+
+        return [(chunk_id, score) for chunk_id, score in rows]
+
+    def _remove(self, conn, chunk_ids: List[str]):
+        """Delete chunks and their postings, keeping corpus totals in step"""
+        for start in range(0, len(chunk_ids), self._SQL_BATCH):
+            batch = chunk_ids[start:start + self._SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+
+            removed, removed_length = conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(length), 0) FROM chunks WHERE id IN ({placeholders})",
+                batch
+            ).fetchone()
+            if not removed:
+                continue
+
+            conn.execute(f"DELETE FROM postings WHERE chunk_id IN ({placeholders})", batch)
+            conn.execute(f"DELETE FROM chunks WHERE id IN ({placeholders})", batch)
+            conn.execute(
+                "UPDATE totals SET chunks = chunks - ?, length = length - ?",
+                (removed, removed_length)
+            )
@@ -10,6 +10,7 @@ class Config:
     ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY')
     OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-4-turbo-preview')
     ANTHROPIC_MODEL = os.getenv('ANTHROPIC_MODEL', 'claude-3-sonnet-20240229')
+    LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 16))
     
     # Embedding Model
     EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
@@ -18,15 +19,56 @@ class Config:
     CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', 1000))
     CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', 200))
     MAX_FILE_SIZE_MB = int(os.getenv('MAX_FILE_SIZE_MB', 50))
+    MAX_BATCH_UPLOAD_MB = int(os.getenv('MAX_BATCH_UPLOAD_MB', 1024))
+    MAX_ARCHIVE_MEMBERS = int(os.getenv('MAX_ARCHIVE_MEMBERS', 1000))
+    MAX_ARCHIVE_UNPACKED_MB = int(os.getenv('MAX_ARCHIVE_UNPACKED_MB', 2048))
+    EXTRACT_WORKERS = int(os.getenv('EXTRACT_WORKERS', os.cpu_count() or 2))
+    PDF_WORKERS = int(os.getenv('PDF_WORKERS', os.cpu_count() or 2))
+    PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', 50))
+    
+    # Embedding Pipeline
+    EMBED_BATCH_SIZE = int(os.getenv('EMBED_BATCH_SIZE', 64))
+    EMBED_WORKERS = int(os.getenv('EMBED_WORKERS', 2))
     
     # Vector Store
     TOP_K_RESULTS = int(os.getenv('TOP_K_RESULTS', 5))
+    CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', 6000))
     CHROMA_DB_PATH = os.getenv('CHROMA_DB_PATH', './chroma_db')
+    CATALOG_DB_PATH = os.getenv('CATALOG_DB_PATH', os.path.join(CHROMA_DB_PATH, 'catalog.sqlite3'))
+    
+    # Hybrid Search (BM25 keyword index fused with vector results)
+    HYBRID_SEARCH = os.getenv('HYBRID_SEARCH', 'True').lower() == 'true'
+    BM25_DB_PATH = os.getenv('BM25_DB_PATH', os.path.join(CHROMA_DB_PATH, 'bm25.sqlite3'))
+    BM25_K1 = float(os.getenv('BM25_K1', 1.2))
+    BM25_B = float(os.getenv('BM25_B', 0.75))
+    RRF_K = int(os.getenv('RRF_K', 60))
+    HYBRID_CANDIDATES = int(os.getenv('HYBRID_CANDIDATES', 20))
+    
+    # Embedding Cache (shared with GDriveQA when pointed at the same directory)
+    EMBEDDING_CACHE_ENABLED = os.getenv('EMBEDDING_CACHE_ENABLED', 'True').lower() == 'true'
+    EMBEDDING_CACHE_PATH = os.path.expanduser(
+        os.getenv('EMBEDDING_CACHE_PATH', '~/.cache/qa-embeddings')
+    )
+    EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', 100000))
+    
+    # Re-ranking (cross-encoder over an over-fetched candidate list)
+    RERANK_ENABLED = os.getenv('RERANK_ENABLED', 'False').lower() == 'true'
+    RERANK_MODEL = os.getenv('RERANK_MODEL', 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+    RERANK_CANDIDATES = int(os.getenv('RERANK_CANDIDATES', 20))
+    RERANK_TOP_K = int(os.getenv('RERANK_TOP_K', 3))
+    RERANK_BATCH_SIZE = int(os.getenv('RERANK_BATCH_SIZE', 32))
+    
+    # Answer Cache
+    ANSWER_CACHE_ENABLED = os.getenv('ANSWER_CACHE_ENABLED', 'True').lower() == 'true'
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', 500))
+    ANSWER_CACHE_TTL_SECONDS = int(os.getenv('ANSWER_CACHE_TTL_SECONDS', 3600))
+    ANSWER_CACHE_SIMILARITY = float(os.getenv('ANSWER_CACHE_SIMILARITY', 0.95))
     
     # Flask Configuration
     FLASK_PORT = int(os.getenv('FLASK_PORT', 5001))
     FLASK_DEBUG = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', './uploads')
+    INDEX_WORKERS = int(os.getenv('INDEX_WORKERS', 2))  # Concurrent background indexing jobs
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
     
     # Supported file extensions
@@ -41,3 +83,5 @@ class Config:
         """Initialize application directories"""
         os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
         os.makedirs(Config.CHROMA_DB_PATH, exist_ok=True)
+        os.makedirs(os.path.dirname(Config.CATALOG_DB_PATH) or '.', exist_ok=True)
+        os.makedirs(os.path.dirname(Config.BM25_DB_PATH) or '.', exist_ok=True)
@@ -0,0 +1,140 @@
+from functools import lru_cache
+from typing import Dict, List
+
+import tiktoken
+
+
+# Rough characters per token for English text, used when no tokenizer is available
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def _load_encoding(model: str):
+    """Load the tokenizer for a model, or None if it cannot be loaded"""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        # Models tiktoken does not know (e.g. Anthropic) are approximated with cl100k
+        pass
+    except Exception as e:
+        print(f"Error loading tokenizer for {model}: {e}")
+        return None
+
+    try:
+        return tiktoken.get_encoding('cl100k_base')
+    except Exception as e:
+        print(f"Error loading tokenizer for {model}: {e}")
+        return None
+
+
+class ContextPacker:
+    """
+    Packs retrieved chunks into a prompt token budget
+
+    Chunks are taken in relevance order and each one is counted with the
+    model's tokenizer. Text that a chunk shares with an already packed chunk
+    (the CHUNK_OVERLAP window between neighbouring chunks) is trimmed before
+    counting, and chunks that no longer fit the remaining budget are skipped.
+    """
+
+    def __init__(self, token_budget: int, model: str, max_overlap: int, min_overlap: int = 16):
+        self.token_budget = token_budget
+        self.max_overlap = max_overlap
+        self.min_overlap = min_overlap
+        self.encoding = _load_encoding(model)
+
+    def count_tokens(self, text: str) -> int:
+        """Count the tokens in a text"""
+        if self.encoding is None:
+            return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut a text down to at most max_tokens tokens"""
+        if self.encoding is None:
+            return text[:max_tokens * CHARS_PER_TOKEN]
+        return self.encoding.decode(self.encoding.encode(text, disallowed_special=())[:max_tokens])
+
+    def pack(self, texts: List[str], headers: List[str] = None, separator: str = "\n\n",
+             token_budget: int = None) -> Dict[str, any]:
+        """
+        Select and trim chunks to fit the token budget
+
+        Args:
+            texts: Chunk texts, most relevant first
+            headers: Optional label prepended to each chunk, counted against the budget
+            separator: Text placed between packed chunks
+            token_budget: Overrides the packer's budget for this call
+
+        Returns:
+            Dictionary with the packed 'parts' (header + text), the 'indices'
+            of the chunks they came from and token counts before and after packing
+        """
+        if headers is None:
+            headers = [''] * len(texts)
+        if token_budget is None:
+            token_budget = self.token_budget
+
+        separator_tokens = self.count_tokens(separator)
+        unpacked_tokens = max(0, separator_tokens * (len(texts) - 1))
+        packed_texts = []
+        parts = []
+        indices = []
+        used = 0
+
+        for i, (header, text) in enumerate(zip(headers, texts)):
+            unpacked_tokens += self.count_tokens(header + text)
+
+            text = self._remove_overlap(text, packed_texts)
+            if not text.strip():
+                continue
+
+            part = header + text
+            cost = self.count_tokens(part) + (separator_tokens if parts else 0)
+
+            if used + cost > token_budget:
+                if parts:
+                    continue
+                # Always send something: cut the most relevant chunk down to the budget
+                part = self.truncate(part, token_budget)
+                cost = self.count_tokens(part)
+
+            packed_texts.append(text)
+            parts.append(part)
+            indices.append(i)
+            used += cost
+
+        return {
+            'parts': parts,
+            'indices': indices,
+            'tokens': used,
+            'unpacked_tokens': unpacked_tokens,
+            'tokens_saved': max(0, unpacked_tokens - used)
+        }
+
+    def _remove_overlap(self, text: str, packed_texts: List[str]) -> str:
+        """Trim text that is already present in a packed chunk"""
+        for packed in packed_texts:
+            if text in packed:
+                return ''
+
+            # This chunk continues a packed one: drop its leading overlap
+            overlap = self._overlap(packed, text)
+            if overlap:
+                text = text[overlap:]
+                continue
+
+            # This chunk precedes a packed one: drop its trailing overlap
+            overlap = self._overlap(text, packed)
+            if overlap:
+                text = text[:-overlap]
+
+        return text
+
+    def _overlap(self, first: str, second: str) -> int:
+        """Length of the longest suffix of first that is a prefix of second"""
+        longest = min(len(first), len(second), self.max_overlap)
+        for size in range(longest, self.min_overlap - 1, -1):
+            if first.endswith(second[:size]):
+                return size
+        return 0
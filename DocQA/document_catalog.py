@@ -0,0 +1,92 @@
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+
+class DocumentCatalog:
+    """SQLite sidecar that tracks per-document statistics for the vector store"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+
+        with self.transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    file_name TEXT PRIMARY KEY,
+                    chunk_count INTEGER NOT NULL,
+                    size INTEGER,
+                    file_type TEXT,
+                    indexed_at REAL NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Open a catalog transaction
+
+        The transaction commits when the block exits normally and rolls back
+        if it raises, so vector store writes performed inside the block and
+        the matching catalog update succeed or fail together.
+        """
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def record(self, conn, file_name: str, chunk_count: int, size: int = None,
+               file_type: str = None, indexed_at: float = None):
+        """Insert or replace the catalog entry for a document"""
+        conn.execute(
+            "INSERT OR REPLACE INTO documents (file_name, chunk_count, size, file_type, indexed_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (file_name, chunk_count, size, file_type, indexed_at or time.time())
+        )
+
+    def remove(self, conn, file_name: str):
+        """Remove a document's catalog entry"""
+        conn.execute("DELETE FROM documents WHERE file_name = ?", (file_name,))
+
+    def clear(self, conn):
+        """Remove every catalog entry"""
+        conn.execute("DELETE FROM documents")
+
+    def list_documents(self) -> List[str]:
+        """List catalogued document names in sorted order"""
+        with self.transaction() as conn:
+            rows = conn.execute("SELECT file_name FROM documents ORDER BY file_name").fetchall()
+        return [row[0] for row in rows]
+
+    def get_document(self, file_name: str) -> Dict[str, any]:
+        """Get the catalog entry for a document, or None"""
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT file_name, chunk_count, size, file_type, indexed_at "
+                "FROM documents WHERE file_name = ?",
+                (file_name,)
+            ).fetchone()
+
+        if not row:
+            return None
+
+        return {
+            'file_name': row[0],
+            'chunk_count': row[1],
+            'size': row[2],
+            'file_type': row[3],
+            'indexed_at': row[4]
+        }
+
+    def totals(self) -> Dict[str, int]:
+        """Get document and chunk totals"""
+        with self.transaction() as conn:
+            documents, chunks = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(chunk_count), 0) FROM documents"
+            ).fetchone()
+        return {'total_documents': documents, 'total_chunks': chunks}
@@ -1,5 +1,8 @@
 import os
-from typing import List, Dict
+import re
+import codecs
+from bisect import bisect_left, bisect_right
+from typing import List, Dict, Iterable, Iterator
 import PyPDF2
 import docx
 from openpyxl import load_workbook
@@ -7,12 +10,52 @@ from pptx import Presentation
 from bs4 import BeautifulSoup
 import json
 import csv
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+# Sentence terminator followed by whitespace; chunks end right after the terminator
+SENTENCE_END = re.compile(r'[.!?](?=[ \n])')
+
+
+def _iter_pdf_pages(file_path: str, start: int, end: int) -> Iterator[str]:
+    """Lazily extract pages [start, end) of a PDF, one marked string per page"""
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        for page_num in range(start, end):
+            page_text = pdf_reader.pages[page_num].extract_text()
+            if page_text:
+                yield f"--- Page {page_num + 1} ---\n{page_text}"
+
+
+def _extract_pdf_pages(file_path: str, start: int, end: int) -> List[str]:
+    """Extract the text of pages [start, end) of a PDF, one marked string per page"""
+    return list(_iter_pdf_pages(file_path, start, end))
+
+
+def _join_lazily(parts: Iterable[str], separator: str) -> Iterator[str]:
+    """Yield parts with separator between them, a streaming separator.join(parts)"""
+    first = True
+    for part in parts:
+        if not first:
+            yield separator
+        yield part
+        first = False
 
 
 class DocumentProcessor:
     """Extracts text from various document formats"""
     
-    def __init__(self):
+    READ_BLOCK_SIZE = 64 * 1024
+    
+    def __init__(self, pdf_workers: int = 1, pdf_parallel_min_pages: int = 50):
+        """
+        Args:
+            pdf_workers: Processes used to extract large PDFs (1 disables parallel extraction)
+            pdf_parallel_min_pages: Smallest page count extracted in parallel
+        """
+        self.pdf_workers = pdf_workers
+        self.pdf_parallel_min_pages = pdf_parallel_min_pages
         self.supported_formats = {
             '.pdf': self._extract_pdf,
             '.txt': self._extract_txt,
@@ -31,15 +74,19 @@ class DocumentProcessor:
             '.rtf': self._extract_txt,
         }
     
-    def process_document(self, file_path: str) -> Dict[str, any]:
+    def stream_document(self, file_path: str) -> Dict[str, any]:
         """
-        Process a document and extract its text content
+        Open a document for incremental text extraction
+        
+        Extraction is lazy: the returned 'segments' iterator yields pieces
+        of text (pages, rows, paragraphs) whose concatenation is the full
+        document text, and extraction errors surface while iterating.
         
         Args:
             file_path: Path to the document
             
         Returns:
-            Dictionary with document metadata and content
+            Dictionary with document metadata and a 'segments' iterator
         """
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File not found: {file_path}")
@@ -49,136 +96,170 @@ class DocumentProcessor:
         if file_ext not in self.supported_formats:
             raise ValueError(f"Unsupported file format: {file_ext}")
         
-        try:
-            text_content = self.supported_formats[file_ext](file_path)
+        return {
+            'file_path': file_path,
+            'file_name': os.path.basename(file_path),
+            'file_type': file_ext,
+            'segments': self.supported_formats[file_ext](file_path),
+            'size': os.path.getsize(file_path)
+        }
+    
+    def process_document(self, file_path: str) -> Dict[str, any]:
+        """
+        Process a document and extract its text content
+        
+        Args:
+            file_path: Path to the document
             
-            return {
-                'file_path': file_path,
-                'file_name': os.path.basename(file_path),
-                'file_type': file_ext,
-                'content': text_content,
-                'size': os.path.getsize(file_path),
+        Returns:
+            Dictionary with document metadata and content
+        """
+        result = self.stream_document(file_path)
+        segments = result.pop('segments')
+        
+        try:
+            result.update({
+                'content': ''.join(segments),
                 'success': True,
                 'error': None
-            }
+            })
         except Exception as e:
-            return {
-                'file_path': file_path,
-                'file_name': os.path.basename(file_path),
-                'file_type': file_ext,
+            result.update({
                 'content': '',
-                'size': os.path.getsize(file_path),
                 'success': False,
                 'error': str(e)
-            }
+            })
+        
+        return result
     
-    def _extract_pdf(self, file_path: str) -> str:
-        """Extract text from PDF"""
-        text = []
+    def _extract_pdf(self, file_path: str) -> Iterator[str]:
+        """Extract text from PDF, splitting large files into page ranges across processes"""
         with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page_num, page in enumerate(pdf_reader.pages):
-                page_text = page.extract_text()
-                if page_text:
-                    text.append(f"--- Page {page_num + 1} ---\n{page_text}")
-        return "\n\n".join(text)
-    
-    def _extract_txt(self, file_path: str) -> str:
+            page_count = len(PyPDF2.PdfReader(file).pages)
+        
+        # Inside a pool worker the other cores are already busy, so never start a nested pool
+        if (self.pdf_workers <= 1 or page_count < self.pdf_parallel_min_pages
+                or multiprocessing.parent_process() is not None):
+            yield from _join_lazily(_iter_pdf_pages(file_path, 0, page_count), "\n\n")
+            return
+        
+        # One contiguous page range per worker, reassembled in page order
+        workers = min(self.pdf_workers, page_count)
+        bounds = [page_count * i // workers for i in range(workers + 1)]
+        # Spawned, not forked: the calling process may be running other threads
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            parts = pool.map(
+                _extract_pdf_pages,
+                [file_path] * workers,
+                bounds[:-1],
+                bounds[1:]
+            )
+            pages = (page for part in parts for page in part)
+            yield from _join_lazily(pages, "\n\n")
+    
+    def _extract_txt(self, file_path: str) -> Iterator[str]:
         """Extract text from plain text files"""
+        encoding = self._detect_encoding(file_path)
+        with open(file_path, 'r', encoding=encoding) as file:
+            for block in iter(lambda: file.read(self.READ_BLOCK_SIZE), ''):
+                yield block
+    
+    def _detect_encoding(self, file_path: str) -> str:
+        """Find the first supported encoding that decodes the whole file"""
         encodings = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
         for encoding in encodings:
+            decoder = codecs.getincrementaldecoder(encoding)()
             try:
-                with open(file_path, 'r', encoding=encoding) as file:
-                    return file.read()
+                with open(file_path, 'rb') as file:
+                    for block in iter(lambda: file.read(self.READ_BLOCK_SIZE), b''):
+                        decoder.decode(block)
+                    decoder.decode(b'', final=True)
+                return encoding
             except UnicodeDecodeError:
                 continue
         raise ValueError(f"Unable to decode file with supported encodings")
     
-    def _extract_docx(self, file_path: str) -> str:
+    def _extract_docx(self, file_path: str) -> Iterator[str]:
         """Extract text from Word documents"""
         doc = docx.Document(file_path)
-        text = []
         
-        for para in doc.paragraphs:
-            if para.text.strip():
-                text.append(para.text)
-        
-        # Extract text from tables
-        for table in doc.tables:
-            for row in table.rows:
-                row_text = [cell.text.strip() for cell in row.cells]
-                text.append(" | ".join(row_text))
+        def paragraphs():
+            for para in doc.paragraphs:
+                if para.text.strip():
+                    yield para.text
+            
+            # Extract text from tables
+            for table in doc.tables:
+                for row in table.rows:
+                    row_text = [cell.text.strip() for cell in row.cells]
+                    yield " | ".join(row_text)
         
-        return "\n\n".join(text)
+        yield from _join_lazily(paragraphs(), "\n\n")
     
-    def _extract_xlsx(self, file_path: str) -> str:
+    def _extract_xlsx(self, file_path: str) -> Iterator[str]:
         """Extract text from Excel files"""
         wb = load_workbook(file_path, read_only=True, data_only=True)
-        text = []
         
-        for sheet_name in wb.sheetnames:
-            sheet = wb[sheet_name]
-            text.append(f"=== Sheet: {sheet_name} ===")
-            
-            for row in sheet.iter_rows(values_only=True):
-                row_text = [str(cell) if cell is not None else '' for cell in row]
-                if any(row_text):  # Skip empty rows
-                    text.append(" | ".join(row_text))
+        def rows():
+            for sheet_name in wb.sheetnames:
+                sheet = wb[sheet_name]
+                yield f"=== Sheet: {sheet_name} ==="
+                
+                for row in sheet.iter_rows(values_only=True):
+                    row_text = [str(cell) if cell is not None else '' for cell in row]
+                    if any(row_text):  # Skip empty rows
+                        yield " | ".join(row_text)
         
-        return "\n\n".join(text)
+        yield from _join_lazily(rows(), "\n\n")
     
-    def _extract_pptx(self, file_path: str) -> str:
+    def _extract_pptx(self, file_path: str) -> Iterator[str]:
         """Extract text from PowerPoint presentations"""
         prs = Presentation(file_path)
-        text = []
         
-        for slide_num, slide in enumerate(prs.slides, 1):
-            text.append(f"=== Slide {slide_num} ===")
-            
-            for shape in slide.shapes:
-                if hasattr(shape, "text") and shape.text.strip():
-                    text.append(shape.text)
+        def shapes():
+            for slide_num, slide in enumerate(prs.slides, 1):
+                yield f"=== Slide {slide_num} ==="
+                
+                for shape in slide.shapes:
+                    if hasattr(shape, "text") and shape.text.strip():
+                        yield shape.text
         
-        return "\n\n".join(text)
+        yield from _join_lazily(shapes(), "\n\n")
     
-    def _extract_html(self, file_path: str) -> str:
+    def _extract_html(self, file_path: str) -> Iterator[str]:
         """Extract text from HTML files"""
         with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
             soup = BeautifulSoup(file.read(), 'lxml')
-            
-            # Remove script and style elements
-            for script in soup(["script", "style"]):
-                script.decompose()
-            
-            text = soup.get_text()
-            
-            # Clean up whitespace
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            text = '\n'.join(chunk for chunk in chunks if chunk)
-            
-            return text
+        
+        # Remove script and style elements
+        for script in soup(["script", "style"]):
+            script.decompose()
+        
+        text = soup.get_text()
+        
+        # Clean up whitespace
+        lines = (line.strip() for line in text.splitlines())
+        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+        yield from _join_lazily((chunk for chunk in chunks if chunk), '\n')
     
-    def _extract_csv(self, file_path: str) -> str:
+    def _extract_csv(self, file_path: str) -> Iterator[str]:
         """Extract text from CSV files"""
-        text = []
         with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
             csv_reader = csv.reader(file)
-            for row in csv_reader:
-                text.append(" | ".join(row))
-        return "\n".join(text)
+            yield from _join_lazily((" | ".join(row) for row in csv_reader), "\n")
     
-    def _extract_json(self, file_path: str) -> str:
+    def _extract_json(self, file_path: str) -> Iterator[str]:
         """Extract text from JSON files"""
         with open(file_path, 'r', encoding='utf-8') as file:
             data = json.load(file)
-            return json.dumps(data, indent=2)
+        yield from json.JSONEncoder(indent=2).iterencode(data)
     
-    def _extract_xml(self, file_path: str) -> str:
+    def _extract_xml(self, file_path: str) -> Iterator[str]:
         """Extract text from XML files"""
         with open(file_path, 'r', encoding='utf-8') as file:
             soup = BeautifulSoup(file.read(), 'lxml')
-            return soup.get_text()
+        yield soup.get_text()
     
     def chunk_text(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
         """
@@ -192,25 +273,118 @@ class DocumentProcessor:
         Returns:
             List of text chunks
         """
-        if len(text) <= chunk_size:
-            return [text]
+        return list(self.iter_chunks([text], chunk_size=chunk_size, overlap=overlap))
+    
+    def iter_chunks(self, segments: Iterable[str], chunk_size: int = 1000,
+                    overlap: int = 200) -> Iterator[str]:
+        """
+        Split streamed text into overlapping chunks
         
-        chunks = []
-        start = 0
+        Consumes extractor output incrementally and only buffers the text
+        that has not been chunked yet, so the whole document never has to
+        exist as a single string. Sentence terminators are indexed with a
+        single regex scan as text arrives, and each chunk ends right after
+        the latest terminator inside its window, found by bisection.
         
-        while start < len(text):
+        Args:
+            segments: Pieces of text whose concatenation is the document
+            chunk_size: Size of each chunk in characters
+            overlap: Number of overlapping characters between chunks
+            
+        Yields:
+            Text chunks
+        """
+        buffer = ''
+        base = 0  # Document offset of buffer[0]
+        start = 0  # Document offset of the next chunk
+        boundaries = []  # Document offsets of sentence terminators, ascending
+        
+        for segment in segments:
+            # A terminator at the old end of the buffer only matches once its next char arrives
+            scan_from = max(0, len(buffer) - 1)
+            buffer += segment
+            boundaries.extend(base + m.start() for m in SENTENCE_END.finditer(buffer, scan_from))
+            
+            # Windows that end before the buffered text does can be chunked now
+            while start + chunk_size < base + len(buffer):
+                end = self._chunk_end(boundaries, start, chunk_size, overlap)
+                chunk = buffer[start - base:end - base].strip()
+                if chunk:
+                    yield chunk
+                start = end - overlap
+            
+            # Drop text and boundaries that no future chunk will include
+            buffer = buffer[start - base:]
+            base = start
+            del boundaries[:bisect_left(boundaries, start)]
+        
+        total = base + len(buffer)
+        
+        # Short documents are returned as a single chunk
+        if total <= chunk_size:
+            if buffer.strip():
+                yield buffer
+            return
+        
+        while start < total:
             end = start + chunk_size
+            if end < total:
+                end = self._chunk_end(boundaries, start, chunk_size, overlap)
             
-            # Try to break at sentence boundary
-            if end < len(text):
-                # Look for sentence endings
-                for sep in ['. ', '.\n', '! ', '!\n', '? ', '?\n']:
-                    last_sep = text[start:end].rfind(sep)
-                    if last_sep != -1:
-                        end = start + last_sep + len(sep)
-                        break
+            chunk = buffer[start - base:end - base].strip()
+            if chunk:
+                yield chunk
             
-            chunks.append(text[start:end].strip())
-            start = end - overlap
+            start = end - overlap if end < total else total
+    
+    def _chunk_end(self, boundaries: List[int], start: int, chunk_size: int, overlap: int) -> int:
+        """Find where the chunk starting at start should end, preferring a sentence boundary"""
+        end = start + chunk_size
         
-        return chunks
+        # Latest terminator whose following whitespace still lies inside the window
+        i = bisect_right(boundaries, end - 2) - 1
+        # Skip boundaries so early that the next chunk would not move forward
+        if i >= 0 and boundaries[i] >= start + overlap:
+            return boundaries[i] + 1
+        
+        return end
+
+
+def extract_chunks(file_path: str, chunk_size: int = 1000, overlap: int = 200) -> Dict[str, any]:
+    """
+    Extract and chunk a document in a single call
+    
+    Defined at module level so it can run in a worker process; only the
+    chunks are sent back, never the full extracted text.
+    
+    Args:
+        file_path: Path to the document
+        chunk_size: Size of each chunk in characters
+        overlap: Number of overlapping characters between chunks
+        
+    Returns:
+        Document metadata with a list of chunks
+    """
+    # Callers already run one document per worker, so PDFs stay single-process here
+    processor = DocumentProcessor()
+    
+    try:
+        document = processor.stream_document(file_path)
+        segments = document.pop('segments')
+        chunks = list(processor.iter_chunks(segments, chunk_size=chunk_size, overlap=overlap))
+    except Exception as e:
+        return {
+            'file_path': file_path,
+            'file_name': os.path.basename(file_path),
+            'chunks': [],
+            'success': False,
+            'error': str(e)
+        }
+    
+    document.update({
+        'chunks': chunks,
+        'success': bool(chunks),
+        'error': None if chunks else 'Document contains no extractable text'
+    })
+    
+    return document
@@ -0,0 +1,234 @@
+"""Persistent on-disk cache for text embeddings."""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Sequence, Set
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Embedding cache keyed by (model name, text hash)
+
+    Vectors are stored in a memory-mapped float32 matrix with one row per
+    slot. A SQLite index maps each key to its slot and records when it was
+    last used, so the least recently used rows are evicted once the cache
+    reaches max_entries. Several processes may share the same directory.
+    """
+
+    _SQL_BATCH = 500
+
+    def __init__(self, cache_dir: str, model_name: str, max_entries: int = 100000):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        slug = hashlib.md5(model_name.encode()).hexdigest()[:16]
+        self._matrix_path = os.path.join(cache_dir, f"{slug}.f32")
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._dim = None
+
+        self._db = sqlite3.connect(
+            os.path.join(cache_dir, f"{slug}.sqlite3"),
+            timeout=30,
+            check_same_thread=False
+        )
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                slot INTEGER NOT NULL UNIQUE,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+            CREATE TABLE IF NOT EXISTS meta (
+                name TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+        self._db.execute(
+            "INSERT OR IGNORE INTO meta (name, value) VALUES ('model', ?)", (model_name,)
+        )
+        # Drop rows that no longer fit if max_entries was lowered
+        self._db.execute("DELETE FROM entries WHERE slot >= ?", (max_entries,))
+        self._db.commit()
+
+        dim = self._get_meta('dim')
+        if dim is not None:
+            self._open_matrix(int(dim))
+
+    def encode(self, texts: Sequence[str], encode_fn: Callable) -> np.ndarray:
+        """
+        Encode texts, only calling encode_fn for texts not in the cache
+
+        Args:
+            texts: Texts to embed
+            encode_fn: Function mapping a list of texts to an embedding matrix
+
+        Returns:
+            float32 matrix with one embedding row per text
+        """
+        keys = [self._key(text) for text in texts]
+        cached = self.get_many(keys)
+
+        # Each distinct missing text is encoded once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        with self._lock:
+            hits = sum(1 for key in keys if key in cached)
+            self.hits += hits
+            self.misses += len(keys) - hits
+
+        if missing:
+            vectors = np.asarray(encode_fn(list(missing.values())), dtype=np.float32)
+            fresh = dict(zip(missing.keys(), vectors))
+            self.put_many(fresh)
+            cached.update(fresh)
+
+        if not keys:
+            return np.zeros((0, self._dim or 0), dtype=np.float32)
+        return np.stack([cached[key] for key in keys])
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Look up cached vectors, refreshing their LRU position"""
+        found = {}
+        with self._lock:
+            if self._matrix is None:
+                return found
+
+            now = time.time()
+            # put_many in another process writes evicted rows before it commits, so
+            # rows are read under the same write lock it holds while doing that
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for start in range(0, len(keys), self._SQL_BATCH):
+                    batch = list(set(keys[start:start + self._SQL_BATCH]))
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self._db.execute(
+                        f"SELECT key, slot FROM entries WHERE key IN ({placeholders})", batch
+                    ).fetchall()
+                    for key, slot in rows:
+                        found[key] = np.array(self._matrix[slot])
+                    self._db.executemany(
+                        "UPDATE entries SET last_used = ? WHERE key = ?",
+                        [(now, key) for key, _ in rows]
+                    )
+                self._db.commit()
+            except Exception:
+                self._db.rollback()
+                raise
+        return found
+
+    def put_many(self, vectors: Dict[str, np.ndarray]):
+        """Store vectors, evicting least recently used entries if full"""
+        if not vectors:
+            return
+
+        with self._lock:
+            if self._matrix is None:
+                dim = len(next(iter(vectors.values())))
+                self._set_meta('dim', str(dim))
+                self._open_matrix(dim)
+
+            # The newest entries win if more arrive than the cache can hold
+            items = list(vectors.items())[-self.max_entries:]
+            now = time.time()
+
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                # Another thread or process may have stored some keys since they missed;
+                # they keep their slot so it is never orphaned
+                slots = self._existing_slots([key for key, _ in items])
+                new_keys = [key for key, _ in items if key not in slots]
+                slots.update(zip(new_keys, self._allocate_slots(len(new_keys), keep=set(slots))))
+                for key, vector in items:
+                    self._matrix[slots[key]] = vector
+                self._matrix.flush()
+
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO entries (key, slot, last_used) VALUES (?, ?, ?)",
+                    [(key, slots[key], now) for key, _ in items]
+                )
+                self._db.commit()
+            except Exception:
+                self._db.rollback()
+                raise
+
+    def stats(self) -> Dict[str, any]:
+        """Get cache counters"""
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0,
+                'entries': entries,
+                'max_entries': self.max_entries
+            }
+
+    def _existing_slots(self, keys: List[str]) -> Dict[str, int]:
+        """Slots of the keys that are already stored"""
+        slots = {}
+        for start in range(0, len(keys), self._SQL_BATCH):
+            batch = keys[start:start + self._SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            slots.update(self._db.execute(
+                f"SELECT key, slot FROM entries WHERE key IN ({placeholders})", batch
+            ).fetchall())
+        return slots
+
+    def _allocate_slots(self, count: int, keep: Set[str] = frozenset()) -> List[int]:
+        """Hand out free slots, evicting LRU entries other than keep once the matrix is full"""
+        next_slot = min(int(self._get_meta('next_slot') or 0), self.max_entries)
+        fresh = min(count, self.max_entries - next_slot)
+        slots = list(range(next_slot, next_slot + fresh))
+        self._set_meta('next_slot', str(next_slot + fresh), commit=False)
+
+        if fresh < count:
+            candidates = self._db.execute(
+                "SELECT key, slot FROM entries ORDER BY last_used LIMIT ?",
+                (count - fresh + len(keep),)
+            ).fetchall()
+            evicted = [(key, slot) for key, slot in candidates if key not in keep][:count - fresh]
+            self._db.executemany(
+                "DELETE FROM entries WHERE key = ?", [(key,) for key, _ in evicted]
+            )
+            slots.extend(slot for _, slot in evicted)
+
+        return slots
+
+    def _open_matrix(self, dim: int):
+        """Map the vector matrix, growing the backing file if needed"""
+        size = self.max_entries * dim * 4
+        mode = 'r+b' if os.path.exists(self._matrix_path) else 'w+b'
+        with open(self._matrix_path, mode) as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() < size:
+                f.truncate(size)
+        self._matrix = np.memmap(
+            self._matrix_path, dtype=np.float32, mode='r+', shape=(self.max_entries, dim)
+        )
+        self._dim = dim
+
+    def _get_meta(self, name: str):
+        row = self._db.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, name: str, value: str, commit: bool = True):
+        self._db.execute(
+            "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value)
+        )
+        if commit:
+            self._db.commit()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\x00{text}".encode('utf-8')).hexdigest()
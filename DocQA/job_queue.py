@@ -0,0 +1,84 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+
+class JobQueue:
+    """Runs background indexing jobs on a bounded worker pool and tracks their progress"""
+
+    def __init__(self, max_workers: int, max_finished_jobs: int = 500):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='index-job')
+        self.max_finished_jobs = max_finished_jobs
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, func: Callable, *args, **kwargs) -> str:
+        """
+        Queue a job for background execution
+
+        The job function is called with an extra progress(stage, percent)
+        keyword argument and must return a result dictionary with a
+        'success' key.
+
+        Returns:
+            Job ID
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+
+        with self._lock:
+            self._jobs[job_id] = {
+                'id': job_id,
+                'status': 'queued',
+                'stage': 'queued',
+                'percent': 0,
+                'result': None,
+                'error': None,
+                'created_at': now,
+                'updated_at': now
+            }
+            self._prune()
+
+        self.executor.submit(self._run, job_id, func, args, kwargs)
+        return job_id
+
+    def get(self, job_id: str) -> Dict[str, any]:
+        """Get a snapshot of a job's state, or None if it is unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _run(self, job_id: str, func: Callable, args: tuple, kwargs: dict):
+        """Execute a job and record its outcome"""
+        self._update(job_id, status='running', stage='starting')
+
+        def progress(stage: str, percent: int):
+            self._update(job_id, stage=stage, percent=max(0, min(100, int(percent))))
+
+        try:
+            result = func(*args, progress=progress, **kwargs)
+            if result.get('success'):
+                self._update(job_id, status='completed', stage='done', percent=100, result=result)
+            else:
+                self._update(job_id, status='failed', stage='done', result=result,
+                             error=result.get('error', 'Job failed'))
+        except Exception as e:
+            self._update(job_id, status='failed', stage='done', error=str(e))
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                job.update(fields)
+                job['updated_at'] = time.time()
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond max_finished_jobs"""
+        finished = [job for job in self._jobs.values() if job['status'] in ('completed', 'failed')]
+        excess = len(finished) - self.max_finished_jobs
+        if excess > 0:
+            finished.sort(key=lambda job: job['updated_at'])
+            for job in finished[:excess]:
+                del self._jobs[job['id']]
@@ -1,6 +1,10 @@
-from typing import List, Dict
+import asyncio
+import threading
+from typing import List, Dict, Iterator, Tuple
+import httpx
 import openai
 import anthropic
+from context_packer import ContextPacker
 from config import Config
 
 
@@ -13,7 +17,7 @@ class LLMClient:
         if self.provider == 'openai':
             if not Config.OPENAI_API_KEY:
                 raise ValueError("OPENAI_API_KEY not set in environment")
-            openai.api_key = Config.OPENAI_API_KEY
+            self.client = openai.OpenAI(api_key=Config.OPENAI_API_KEY)
             self.model = Config.OPENAI_MODEL
         
         elif self.provider == 'anthropic':
@@ -24,6 +28,12 @@ class LLMClient:
         
         else:
             raise ValueError(f"Unsupported LLM provider: {self.provider}")
+        
+        self.packer = ContextPacker(
+            token_budget=Config.CONTEXT_TOKEN_BUDGET,
+            model=self.model,
+            max_overlap=Config.CHUNK_OVERLAP
+        )
     
     def generate_answer(self, question: str, context: List[str]) -> Dict[str, any]:
         """
@@ -36,8 +46,59 @@ class LLMClient:
         Returns:
             Dictionary with answer and metadata
         """
+        system_prompt, user_prompt, packed = self._build_prompts(question, context)
+        
+        try:
+            if self.provider == 'openai':
+                result = self._generate_openai(system_prompt, user_prompt)
+            elif self.provider == 'anthropic':
+                result = self._generate_anthropic(system_prompt, user_prompt)
+            result['context_tokens'] = self._context_tokens(packed)
+            result['context_indices'] = packed['indices']
+            return result
+        except Exception as e:
+            return {
+                'success': False,
+                'answer': None,
+                'error': str(e)
+            }
+    
+    def stream_answer(self, question: str, context: List[str]) -> Iterator[Dict[str, any]]:
+        """
+        Stream an answer to a question based on provided context
+        
+        Args:
+            question: User's question
+            context: List of relevant text chunks
+            
+        Yields:
+            A {'type': 'context', 'indices': ...} event naming the chunks
+            packed into the prompt, {'type': 'token', 'text': ...} events as
+            the answer is generated, then a single 'done' event with model
+            metadata, or an 'error' event
+        """
+        system_prompt, user_prompt, packed = self._build_prompts(question, context)
+        yield {'type': 'context', 'indices': packed['indices']}
+        
+        try:
+            if self.provider == 'openai':
+                events = self._stream_openai(system_prompt, user_prompt)
+            elif self.provider == 'anthropic':
+                events = self._stream_anthropic(system_prompt, user_prompt)
+            
+            for event in events:
+                if event['type'] == 'done':
+                    event['context_tokens'] = self._context_tokens(packed)
+                yield event
+        except Exception as e:
+            yield {'type': 'error', 'error': str(e)}
+    
+    def _build_prompts(self, question: str, context: List[str]) -> Tuple[str, str, Dict[str, any]]:
+        """Build the system and user prompts for a question, packing the context into the token budget"""
         # Prepare the context
-        context_text = "\n\n---\n\n".join(context)
+        separator = "\n\n---\n\n"
+        packed = self.packer.pack(context, separator=separator)
+        context_text = separator.join(packed['parts'])
         
         # Create the prompt
         system_prompt = """You are a helpful AI assistant that answers questions based on the provided document context. 
@@ -59,30 +120,53 @@ Question: {question}
 
 Please provide a detailed answer based on the context above."""
 
-        try:
-            if self.provider == 'openai':
-                return self._generate_openai(system_prompt, user_prompt)
-            elif self.provider == 'anthropic':
-                return self._generate_anthropic(system_prompt, user_prompt)
-        except Exception as e:
-            return {
-                'success': False,
-                'answer': None,
-                'error': str(e)
-            }
+        return system_prompt, user_prompt, packed
     
-    def _generate_openai(self, system_prompt: str, user_prompt: str) -> Dict[str, any]:
-        """Generate answer using OpenAI API"""
-        response = openai.chat.completions.create(
-            model=self.model,
-            messages=[
+    def _context_tokens(self, packed: Dict[str, any]) -> Dict[str, int]:
+        """Summarize how the context was packed"""
+        return {
+            'chunks': len(packed['indices']),
+            'tokens': packed['tokens'],
+            'unpacked_tokens': packed['unpacked_tokens'],
+            'tokens_saved': packed['tokens_saved']
+        }
+    
+    def _openai_request(self, system_prompt: str, user_prompt: str) -> Dict[str, any]:
+        """Build the arguments of an OpenAI chat completion request"""
+        return {
+            'model': self.model,
+            'messages': [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
-            temperature=0.7,
-            max_tokens=1500
-        )
-        
+            'temperature': 0.7,
+            'max_tokens': 1500
+        }
+    
+    def _anthropic_request(self, system_prompt: str, user_prompt: str) -> Dict[str, any]:
+        """Build the arguments of an Anthropic messages request"""
+        return {
+            'model': self.model,
+            'max_tokens': 1500,
+            'system': system_prompt,
+            'messages': [
+                {"role": "user", "content": user_prompt}
+            ],
+            'temperature': 0.7
+        }
+    
+    def _generate_openai(self, system_prompt: str, user_prompt: str) -> Dict[str, any]:
+        """Generate answer using OpenAI API"""
+        response = self.client.chat.completions.create(**self._openai_request(system_prompt, user_prompt))
+        return self._openai_result(response)
+    
+    def _generate_anthropic(self, system_prompt: str, user_prompt: str) -> Dict[str, any]:
+        """Generate answer using Anthropic API"""
+        response = self.client.messages.create(**self._anthropic_request(system_prompt, user_prompt))
+        return self._anthropic_result(response)
+    
+    def _openai_result(self, response) -> Dict[str, any]:
+        """Convert an OpenAI chat completion into an answer dictionary"""
         answer = response.choices[0].message.content
         
         return {
@@ -97,18 +181,8 @@ Please provide a detailed answer based on the context above."""
             }
         }
     
-    def _generate_anthropic(self, system_prompt: str, user_prompt: str) -> Dict[str, any]:
-        """Generate answer using Anthropic API"""
-        response = self.client.messages.create(
-            model=self.model,
-            max_tokens=1500,
-            system=system_prompt,
-            messages=[
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.7
-        )
-        
+    def _anthropic_result(self, response) -> Dict[str, any]:
+        """Convert an Anthropic message into an answer dictionary"""
         answer = response.content[0].text
         
         return {
@@ -121,3 +195,144 @@ Please provide a detailed answer based on the context above."""
                 'output': response.usage.output_tokens
             }
         }
+    
+    def _stream_openai(self, system_prompt: str, user_prompt: str) -> Iterator[Dict[str, any]]:
+        """Stream answer using OpenAI API"""
+        stream = self.client.chat.completions.create(
+            **self._openai_request(system_prompt, user_prompt),
+            stream=True
+        )
+        
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield {'type': 'token', 'text': chunk.choices[0].delta.content}
+        
+        # Usage is not reported on streamed completions
+        yield {
+            'type': 'done',
+            'model': self.model,
+            'provider': 'openai',
+            'tokens_used': None
+        }
+    
+    def _stream_anthropic(self, system_prompt: str, user_prompt: str) -> Iterator[Dict[str, any]]:
+        """Stream answer using Anthropic API"""
+        with self.client.messages.stream(**self._anthropic_request(system_prompt, user_prompt)) as stream:
+            for text in stream.text_stream:
+                yield {'type': 'token', 'text': text}
+            
+            response = stream.get_final_message()
+        
+        yield {
+            'type': 'done',
+            'model': self.model,
+            'provider': 'anthropic',
+            'tokens_used': {
+                'input': response.usage.input_tokens,
+                'output': response.usage.output_tokens
+            }
+        }
+
+
+class AsyncLLMClient(LLMClient):
+    """
+    LLM client that serves many concurrent requests from one connection pool
+    
+    The asynchronous SDK clients and their HTTP connection pool live on a
+    private event loop running in a background thread, so coroutines on any
+    other loop (such as the one Flask creates for each async view) and plain
+    threads can all share them. At most max_concurrency requests are in
+    flight at once; the rest wait their turn.
+    """
+    
+    def __init__(self, max_concurrency: int = None):
+        super().__init__()
+        self.max_concurrency = max_concurrency or Config.LLM_MAX_CONCURRENCY
+        
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='llm-client', daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._open(), self._loop).result()
+    
+    async def _open(self):
+        """Create the pooled clients on the client's event loop"""
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency
+            )
+        )
+        
+        if self.provider == 'openai':
+            self.async_client = openai.AsyncOpenAI(
+                api_key=Config.OPENAI_API_KEY, http_client=self._http_client
+            )
+        else:
+            self.async_client = anthropic.AsyncAnthropic(
+                api_key=Config.ANTHROPIC_API_KEY, http_client=self._http_client
+            )
+    
+    async def agenerate_answer(self, question: str, context: List[str]) -> Dict[str, any]:
+        """
+        Generate an answer without blocking the caller's event loop
+        
+        Args:
+            question: User's question
+            context: List of relevant text chunks
+            
+        Returns:
+            Dictionary with answer and metadata
+        """
+        future = asyncio.run_coroutine_threadsafe(self._agenerate(question, context), self._loop)
+        return await asyncio.wrap_future(future)
+    
+    def generate_answers(self, requests: List[Tuple[str, List[str]]]) -> List[Dict[str, any]]:
+        """
+        Answer many questions concurrently from synchronous code
+        
+        Args:
+            requests: (question, context) pairs
+            
+        Returns:
+            Answer dictionaries in the order of requests
+        """
+        async def gather():
+            return await asyncio.gather(*(
+                self._agenerate(question, context) for question, context in requests
+            ))
+        
+        return asyncio.run_coroutine_threadsafe(gather(), self._loop).result()
+    
+    def close(self):
+        """Close the connection pool and stop the event loop"""
+        asyncio.run_coroutine_threadsafe(self._http_client.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+    
+    async def _agenerate(self, question: str, context: List[str]) -> Dict[str, any]:
+        """Generate an answer on the client's event loop"""
+        system_prompt, user_prompt, packed = self._build_prompts(question, context)
+        
+        try:
+            async with self._semaphore:
+                if self.provider == 'openai':
+                    response = await self.async_client.chat.completions.create(
+                        **self._openai_request(system_prompt, user_prompt)
+                    )
+                    result = self._openai_result(response)
+                else:
+                    response = await self.async_client.messages.create(
+                        **self._anthropic_request(system_prompt, user_prompt)
+                    )
+                    result = self._anthropic_result(response)
+            
+            result['context_tokens'] = self._context_tokens(packed)
+            result['context_indices'] = packed['indices']
+            return result
+        except Exception as e:
+            return {
+                'success': False,
+                'answer': None,
+                'error': str(e)
+            }
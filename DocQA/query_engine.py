@@ -1,7 +1,18 @@
-from typing import Dict, List
-from document_processor import DocumentProcessor
+import asyncio
+import json
+import multiprocessing
+import os
+import threading
+import time
+from contextlib import contextmanager
+from itertools import chain
+from typing import Callable, Dict, Iterator, List
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from document_processor import DocumentProcessor, extract_chunks
 from vector_store import VectorStore
-from llm_client import LLMClient
+from llm_client import AsyncLLMClient
+from answer_cache import AnswerCache
+from reranker import Reranker
 from config import Config
 
 
@@ -9,120 +20,427 @@ class QueryEngine:
     """Main engine for document Q&A"""
     
     def __init__(self):
-        self.processor = DocumentProcessor()
+        self.processor = DocumentProcessor(
+            pdf_workers=Config.PDF_WORKERS,
+            pdf_parallel_min_pages=Config.PDF_PARALLEL_MIN_PAGES
+        )
         self.vector_store = VectorStore()
-        self.llm_client = LLMClient()
+        self.llm_client = AsyncLLMClient()
+        
+        # Per-document locks and how many jobs hold or wait for each
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        
+        # Answers to repeated or near-duplicate questions
+        self.answer_cache = None
+        if Config.ANSWER_CACHE_ENABLED:
+            self.answer_cache = AnswerCache(
+                max_entries=Config.ANSWER_CACHE_MAX_ENTRIES,
+                ttl_seconds=Config.ANSWER_CACHE_TTL_SECONDS,
+                similarity_threshold=Config.ANSWER_CACHE_SIMILARITY
+            )
+        
+        # Cross-encoder that picks the best chunks from an over-fetched candidate list
+        self.reranker = None
+        if Config.RERANK_ENABLED:
+            self.reranker = Reranker(Config.RERANK_MODEL, batch_size=Config.RERANK_BATCH_SIZE)
     
-    def index_document(self, file_path: str) -> Dict[str, any]:
+    def index_document(self, file_path: str,
+                       progress: Callable[[str, int], None] = None) -> Dict[str, any]:
         """
         Process and index a document
         
         Args:
             file_path: Path to the document
+            progress: Optional callback receiving (stage, percent complete)
             
         Returns:
             Result dictionary with success status and metadata
         """
-        # Process document
-        result = self.processor.process_document(file_path)
+        with self._document_locks([os.path.basename(file_path)]):
+            return self._index_document(file_path, progress)
+    
+    def _index_document(self, file_path: str,
+                        progress: Callable[[str, int], None] = None) -> Dict[str, any]:
+        """Index a document while holding its lock"""
+        if progress is None:
+            progress = lambda stage, percent: None
         
-        if not result['success']:
+        # Open the document for streaming extraction
+        progress('extracting', 5)
+        try:
+            result = self.processor.stream_document(file_path)
+            
+            # Extraction, chunking and embedding run as one streaming pipeline
+            chunks = self.processor.iter_chunks(
+                result['segments'],
+                chunk_size=Config.CHUNK_SIZE,
+                overlap=Config.CHUNK_OVERLAP
+            )
+            first_chunk = next(chunks, None)
+        except Exception as e:
             return {
                 'success': False,
-                'error': result['error'],
-                'file_name': result['file_name']
+                'error': str(e),
+                'file_name': os.path.basename(file_path)
             }
         
         # Check if content is empty
-        if not result['content'].strip():
+        if first_chunk is None:
             return {
                 'success': False,
                 'error': 'Document contains no extractable text',
                 'file_name': result['file_name']
             }
         
-        # Chunk the text
-        chunks = self.processor.chunk_text(
-            result['content'],
-            chunk_size=Config.CHUNK_SIZE,
-            overlap=Config.CHUNK_OVERLAP
-        )
-        
         # Add to vector store
         metadata = {
             'file_type': result['file_type'],
             'size': result['size']
         }
         
-        success = self.vector_store.add_document(
-            file_name=result['file_name'],
-            chunks=chunks,
-            metadata=metadata
+        # The chunk total is unknown while streaming, so estimate it from the file size
+        estimated_chunks = max(1, result['size'] // max(1, Config.CHUNK_SIZE - Config.CHUNK_OVERLAP))
+        
+        progress('embedding', 25)
+        store_result = self.vector_store.add_documents(
+            [{
+                'file_name': result['file_name'],
+                'chunks': chain([first_chunk], chunks),
+                'metadata': metadata
+            }],
+            progress=lambda done: progress('embedding', 25 + min(70, 70 * done // estimated_chunks))
         )
+        self._invalidate_answers([result['file_name']])
         
-        if not success:
+        if not store_result['success']:
             return {
                 'success': False,
-                'error': 'Failed to add document to vector store',
+                'error': store_result.get('error', 'Failed to add document to vector store'),
                 'file_name': result['file_name']
             }
         
         return {
             'success': True,
             'file_name': result['file_name'],
-            'chunks': len(chunks),
+            'chunks': store_result['documents'][result['file_name']],
             'size': result['size']
         }
     
-    def ask(self, question: str, n_results: int = None) -> Dict[str, any]:
+    def index_documents(self, file_paths: List[str],
+                        progress: Callable[[str, int], None] = None) -> Dict[str, any]:
+        """
+        Process and index many documents at once
+        
+        Documents are extracted and chunked across a process pool of
+        Config.EXTRACT_WORKERS, and their chunks feed a single batched
+        embedding pass as each extraction completes.
+        
+        Args:
+            file_paths: Paths to the documents
+            progress: Optional callback receiving (stage, percent complete)
+            
+        Returns:
+            Result dictionary with indexed and failed documents
+        """
+        with self._document_locks([os.path.basename(file_path) for file_path in file_paths]):
+            return self._index_documents(file_paths, progress)
+    
+    def _index_documents(self, file_paths: List[str],
+                         progress: Callable[[str, int], None] = None) -> Dict[str, any]:
+        """Index many documents while holding their locks"""
+        if progress is None:
+            progress = lambda stage, percent: None
+        
+        extracted = {}
+        failed = []
+        
+        def extracted_documents():
+            # Spawned, not forked: this process already runs job, LLM and model threads
+            with ProcessPoolExecutor(max_workers=Config.EXTRACT_WORKERS,
+                                     mp_context=multiprocessing.get_context('spawn')) as pool:
+                futures = [
+                    pool.submit(extract_chunks, file_path, Config.CHUNK_SIZE, Config.CHUNK_OVERLAP)
+                    for file_path in file_paths
+                ]
+                
+                for done, future in enumerate(as_completed(futures), 1):
+                    progress('indexing', 5 + 90 * done // len(futures))
+                    result = future.result()
+                    
+                    if not result['success']:
+                        failed.append({
+                            'file_name': result['file_name'],
+                            'file_path': result['file_path'],
+                            'error': result['error']
+                        })
+                        continue
+                    
+                    extracted[result['file_name']] = result
+                    yield {
+                        'file_name': result['file_name'],
+                        'chunks': result['chunks'],
+                        'metadata': {
+                            'file_type': result['file_type'],
+                            'size': result['size']
+                        }
+                    }
+        
+        progress('indexing', 5)
+        store_result = self.vector_store.add_documents(extracted_documents())
+        self._invalidate_answers(extracted)
+        
+        indexed = [
+            {
+                'file_name': file_name,
+                'chunks': chunk_count,
+                'size': extracted[file_name]['size']
+            }
+            for file_name, chunk_count in store_result['documents'].items()
+        ]
+        
+        if not store_result['success']:
+            error = store_result.get('error', 'Failed to add documents to vector store')
+        elif not indexed:
+            error = 'None of the documents could be indexed'
+        else:
+            error = None
+        
+        return {
+            'success': error is None,
+            'error': error,
+            'indexed': indexed,
+            'failed': failed,
+            'chunks': sum(doc['chunks'] for doc in indexed)
+        }
+    
+    def ask(self, question: str, n_results: int = None, filters: Dict = None) -> Dict[str, any]:
         """
         Ask a question about the indexed documents
         
         Args:
             question: User's question
             n_results: Number of relevant chunks to retrieve
+            filters: Optional metadata filters, e.g. {'file_type': ['xlsx', 'csv']}
             
         Returns:
             Answer with sources
         """
+        retrieval = self._retrieve(question, n_results, filters)
+        if 'response' in retrieval:
+            return retrieval['response']
+        
+        # Extract context
+        context = [result['text'] for result in retrieval['results']]
+        
+        # Generate answer
+        started = time.perf_counter()
+        llm_result = self.llm_client.generate_answer(question, context)
+        retrieval['timings']['generation_ms'] = self._elapsed_ms(started)
+        
+        return self._answer_response(question, retrieval, llm_result)
+    
+    async def aask(self, question: str, n_results: int = None,
+                   filters: Dict = None) -> Dict[str, any]:
+        """
+        Ask a question without blocking the caller's event loop
+        
+        Retrieval runs in a worker thread and the answer is generated on
+        the shared asynchronous LLM client.
+        
+        Args:
+            question: User's question
+            n_results: Number of relevant chunks to retrieve
+            filters: Optional metadata filters, e.g. {'file_type': ['xlsx', 'csv']}
+            
+        Returns:
+            Answer with sources
+        """
+        retrieval = await asyncio.to_thread(self._retrieve, question, n_results, filters)
+        if 'response' in retrieval:
+            return retrieval['response']
+        
+        context = [result['text'] for result in retrieval['results']]
+        started = time.perf_counter()
+        llm_result = await self.llm_client.agenerate_answer(question, context)
+        retrieval['timings']['generation_ms'] = self._elapsed_ms(started)
+        
+        return self._answer_response(question, retrieval, llm_result)
+    
+    def ask_stream(self, question: str, n_results: int = None,
+                   filters: Dict = None) -> Iterator[Dict[str, any]]:
+        """
+        Ask a question and stream the answer as it is generated
+        
+        Args:
+            question: User's question
+            n_results: Number of relevant chunks to retrieve
+            filters: Optional metadata filters, e.g. {'file_type': ['xlsx', 'csv']}
+            
+        Yields:
+            A 'sources' event once the context is packed, 'token' events
+            with answer text, and a final 'done' or 'error' event
+        """
+        retrieval = self._retrieve(question, n_results, filters)
+        if 'response' in retrieval:
+            response = retrieval['response']
+            if not response['success']:
+                yield {'type': 'error', 'error': response['error']}
+                return
+            
+            # Cached and empty-index answers are complete already
+            yield {'type': 'sources', 'sources': response['sources']}
+            yield {'type': 'token', 'text': response['answer']}
+            yield {
+                'type': 'done',
+                'model': response.get('model'),
+                'tokens_used': response.get('tokens_used'),
+                'cached': response.get('cached')
+            }
+            return
+        
+        timings = retrieval['timings']
+        context = [result['text'] for result in retrieval['results']]
+        answer = []
+        started = time.perf_counter()
+        
+        for event in self.llm_client.stream_answer(question, context):
+            if event['type'] == 'context':
+                # Only the chunks that fit the prompt are cited
+                self._keep_packed(retrieval, event['indices'])
+                sources = self._build_sources(retrieval['results'])
+                yield {'type': 'sources', 'sources': sources, 'timings': dict(timings)}
+                continue
+            if event['type'] == 'token':
+                if not answer:
+                    timings['first_token_ms'] = self._elapsed_ms(started)
+                answer.append(event['text'])
+            elif event['type'] == 'done':
+                timings['generation_ms'] = self._elapsed_ms(started)
+                event['timings'] = timings
+                self._cache_answer(question, retrieval, {
+                    'success': True,
+                    'answer': ''.join(answer),
+                    'sources': sources,
+                    'model': event.get('model'),
+                    'tokens_used': event.get('tokens_used'),
+                    'context_tokens': event.get('context_tokens'),
+                    'timings': timings
+                })
+            yield event
+    
+    def _retrieve(self, question: str, n_results: int = None,
+                  filters: Dict = None) -> Dict[str, any]:
+        """
+        Find the chunks to answer a question from
+        
+        Returns:
+            {'response': ...} when the question is answered without the LLM
+            (invalid question, cache hit, search failure or no results),
+            otherwise the search results with the cache scope and query embedding
+        """
         if not question.strip():
-            return {
+            return {'response': {
                 'success': False,
                 'error': 'Question cannot be empty'
-            }
+            }}
+        
+        if n_results is None:
+            n_results = Config.RERANK_TOP_K if self.reranker else Config.TOP_K_RESULTS
         
-        # Search for relevant chunks
-        search_results = self.vector_store.search(question, n_results)
+        # Answers only depend on the question and which chunks may be retrieved
+        scope = (n_results, json.dumps(filters, sort_keys=True) if filters else None)
+        
+        if self.answer_cache:
+            cached = self.answer_cache.get(question, scope)
+            if cached:
+                return {'response': cached}
+        
+        started = time.perf_counter()
+        try:
+            query_embedding = self.vector_store.embed_query(question)
+        except Exception as e:
+            return {'response': {
+                'success': False,
+                'error': str(e)
+            }}
+        
+        if self.answer_cache:
+            cached = self.answer_cache.get_similar(query_embedding, scope)
+            if cached:
+                return {'response': cached}
+        
+        # Search for relevant chunks, over-fetching candidates for the re-ranker
+        candidates = max(n_results, Config.RERANK_CANDIDATES) if self.reranker else n_results
+        search_results = self.vector_store.search(
+            question, candidates, query_embedding=query_embedding, filters=filters
+        )
+        timings = {'retrieval_ms': self._elapsed_ms(started)}
         
         if not search_results['success']:
-            return {
+            return {'response': {
                 'success': False,
                 'error': search_results.get('error', 'Search failed')
-            }
+            }}
         
         if search_results['count'] == 0:
-            return {
+            return {'response': {
                 'success': True,
                 'answer': 'I could not find any relevant information in the indexed documents to answer your question. Please make sure you have uploaded relevant documents.',
                 'sources': []
-            }
+            }}
         
-        # Extract context
-        context = [result['text'] for result in search_results['results']]
-        
-        # Generate answer
-        llm_result = self.llm_client.generate_answer(question, context)
+        results = search_results['results']
+        if self.reranker:
+            started = time.perf_counter()
+            results = self.reranker.rerank(question, results, n_results)
+            timings['rerank_ms'] = self._elapsed_ms(started)
         
+        return {
+            'scope': scope,
+            'query_embedding': query_embedding,
+            'results': results,
+            'timings': timings
+        }
+    
+    def _answer_response(self, question: str, retrieval: Dict[str, any],
+                         llm_result: Dict[str, any]) -> Dict[str, any]:
+        """Build (and cache) the response for a generated answer"""
         if not llm_result['success']:
             return {
                 'success': False,
                 'error': llm_result.get('error', 'Failed to generate answer')
             }
         
-        # Prepare sources
+        self._keep_packed(retrieval, llm_result['context_indices'])
+        response = {
+            'success': True,
+            'answer': llm_result['answer'],
+            'sources': self._build_sources(retrieval['results']),
+            'model': llm_result.get('model'),
+            'tokens_used': llm_result.get('tokens_used'),
+            'context_tokens': llm_result.get('context_tokens'),
+            'timings': retrieval['timings']
+        }
+        
+        self._cache_answer(question, retrieval, response)
+        return response
+    
+    @staticmethod
+    def _elapsed_ms(started: float) -> float:
+        """Milliseconds since a time.perf_counter() reading"""
+        return round((time.perf_counter() - started) * 1000, 1)
+    
+    @staticmethod
+    def _keep_packed(retrieval: Dict[str, any], indices: List[int]):
+        """Narrow the retrieved chunks to those packed into the prompt"""
+        retrieval['results'] = [retrieval['results'][i] for i in indices]
+    
+    def _build_sources(self, results: List[Dict[str, any]]) -> List[Dict[str, any]]:
+        """Summarize search results as one source per document"""
         sources = []
         seen_files = set()
-        for result in search_results['results']:
+        for result in results:
             file_name = result['metadata'].get('file_name', 'Unknown')
             if file_name not in seen_files:
                 sources.append({
@@ -131,18 +449,59 @@ class QueryEngine:
                     'preview': result['text'][:200] + '...' if len(result['text']) > 200 else result['text']
                 })
                 seen_files.add(file_name)
-        
-        return {
-            'success': True,
-            'answer': llm_result['answer'],
-            'sources': sources,
-            'model': llm_result.get('model'),
-            'tokens_used': llm_result.get('tokens_used')
-        }
+        return sources
+    
+    def _cache_answer(self, question: str, retrieval: Dict[str, any], response: Dict[str, any]):
+        """Remember a generated answer together with the documents it came from"""
+        if self.answer_cache and response['answer']:
+            contributing_files = {
+                result['metadata'].get('file_name') for result in retrieval['results']
+            }
+            self.answer_cache.put(
+                question, retrieval['scope'], retrieval['query_embedding'], response, contributing_files
+            )
+    
+    def _invalidate_answers(self, file_names: List[str]):
+        """Forget cached answers built from documents that changed"""
+        if self.answer_cache:
+            self.answer_cache.invalidate_files(file_names)
     
     def delete_document(self, file_name: str) -> bool:
         """Delete a document from the index"""
-        return self.vector_store.delete_document(file_name)
+        with self._document_locks([file_name]):
+            success = self.vector_store.delete_document(file_name)
+        self._invalidate_answers([file_name])
+        return success
+    
+    @contextmanager
+    def _document_locks(self, file_names: List[str]):
+        """
+        Hold the locks of some documents, so two jobs never index or delete
+        the same file name at once
+        
+        Each job computes which of a document's chunks are stale from the
+        chunks stored when it starts, so overlapping jobs would leave chunks
+        of both versions behind.
+        """
+        names = sorted(set(file_names))
+        with self._locks_guard:
+            entries = [self._locks.setdefault(name, [threading.Lock(), 0]) for name in names]
+            for entry in entries:
+                entry[1] += 1
+        
+        # Always taken in name order, so jobs sharing several documents cannot deadlock
+        for lock, _ in entries:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock, _ in entries:
+                lock.release()
+            with self._locks_guard:
+                for name, entry in zip(names, entries):
+                    entry[1] -= 1
+                    if not entry[1]:
+                        del self._locks[name]
     
     def list_documents(self) -> List[str]:
         """List all indexed documents"""
@@ -150,8 +509,14 @@ class QueryEngine:
     
     def get_stats(self) -> Dict[str, any]:
         """Get statistics about indexed documents"""
-        return self.vector_store.get_stats()
+        stats = self.vector_store.get_stats()
+        if self.answer_cache:
+            stats['answer_cache'] = self.answer_cache.stats()
+        return stats
     
     def clear_all(self) -> bool:
         """Clear all indexed documents"""
-        return self.vector_store.clear_all()
+        success = self.vector_store.clear_all()
+        if self.answer_cache:
+            self.answer_cache.clear()
+        return success
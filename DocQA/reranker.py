@@ -0,0 +1,54 @@
+import threading
+from typing import Dict, List
+
+
+class Reranker:
+    """
+    Re-orders retrieved chunks with a cross-encoder
+
+    The cross-encoder reads the question and each chunk together, which is
+    far more precise than comparing separate embeddings but too slow to run
+    over the whole collection, so it only scores an over-fetched candidate
+    list. The model is loaded on first use.
+    """
+
+    def __init__(self, model_name: str, batch_size: int = 32):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        """Cross-encoder model, loaded on first access"""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    # Imported here so torch is not loaded unless re-ranking is used
+                    from sentence_transformers import CrossEncoder
+                    self._model = CrossEncoder(self.model_name, device='cpu')
+        return self._model
+
+    def rerank(self, query: str, results: List[Dict], top_k: int) -> List[Dict]:
+        """
+        Score candidates against a query and keep the best
+
+        Args:
+            query: Search query
+            results: Candidate results with a 'text' key
+            top_k: Number of results to keep
+
+        Returns:
+            The top_k results, best first, each with a 'rerank_score'
+        """
+        if not results:
+            return []
+
+        scores = self.model.predict(
+            [(query, result['text']) for result in results],
+            batch_size=self.batch_size,
+            show_progress_bar=False
+        )
+
+        ranked = sorted(zip(results, scores), key=lambda pair: pair[1], reverse=True)
+        return [dict(result, rerank_score=float(score)) for result, score in ranked[:top_k]]
@@ -1,9 +1,105 @@
 import chromadb
 from chromadb.config import Settings
 from sentence_transformers import SentenceTransformer
-from typing import List, Dict
+from typing import List, Dict, Iterable, Iterator, Callable
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
 import hashlib
+import time
+import numpy as np
 from config import Config
+from embedding_cache import EmbeddingCache
+from document_catalog import DocumentCatalog
+from bm25_index import BM25Index, reciprocal_rank_fusion
+
+
+def _batched(iterable: Iterable, size: int) -> Iterator[list]:
+    """Yield successive lists of up to size items from an iterable"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+# Chunk metadata fields that search filters may constrain
+FILTER_FIELDS = {'file_type', 'file_name', 'size', 'chunk_index', 'indexed_at'}
+NUMERIC_FILTER_FIELDS = {'size', 'chunk_index', 'indexed_at'}
+
+
+def build_where(filters: Dict = None) -> Dict:
+    """
+    Translate search filters into a ChromaDB where clause
+    
+    Each filter maps a metadata field to a value, a list of accepted values
+    or a {"min": ..., "max": ...} range. indexed_at also accepts ISO dates.
+    
+    Args:
+        filters: Filters by field name
+        
+    Returns:
+        Where clause, or None when there is nothing to filter on
+        
+    Raises:
+        ValueError: If a filter names an unknown field or has an invalid value
+    """
+    if not filters:
+        return None
+    if not isinstance(filters, dict):
+        raise ValueError("Filters must be an object")
+    
+    conditions = []
+    for field, value in filters.items():
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Unsupported filter: {field}")
+        
+        if isinstance(value, dict):
+            if not value or set(value) - {'min', 'max'}:
+                raise ValueError(f"Range filter on {field} takes 'min' and/or 'max'")
+            if field not in NUMERIC_FILTER_FIELDS:
+                raise ValueError(f"Range filters are not supported on {field}")
+            # Chroma allows a single operator per field condition
+            if 'min' in value:
+                conditions.append({field: {'$gte': _filter_value(field, value['min'])}})
+            if 'max' in value:
+                conditions.append({field: {'$lte': _filter_value(field, value['max'])}})
+        
+        elif isinstance(value, list):
+            if not value:
+                raise ValueError(f"Filter on {field} needs at least one value")
+            conditions.append({field: {'$in': [_filter_value(field, item) for item in value]}})
+        
+        else:
+            conditions.append({field: _filter_value(field, value)})
+    
+    return conditions[0] if len(conditions) == 1 else {'$and': conditions}
+
+
+def _filter_value(field: str, value) -> any:
+    """Validate a filter value and convert it to the form stored in chunk metadata"""
+    if field == 'indexed_at' and isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            raise ValueError(f"Invalid date for indexed_at: {value}")
+    
+    if field in NUMERIC_FILTER_FIELDS:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"Filter on {field} needs a number")
+        return value
+    
+    if not isinstance(value, str) or not value:
+        raise ValueError(f"Filter on {field} needs a non-empty string")
+    
+    if field == 'file_type':
+        # Stored as the lower-case extension with its dot
+        value = value.lower()
+        return value if value.startswith('.') else f".{value}"
+    
+    return value
 
 
 class VectorStore:
@@ -24,59 +120,252 @@ class VectorStore:
         
         # Initialize embedding model
         self.embedding_model = SentenceTransformer(Config.EMBEDDING_MODEL)
+        
+        # Persistent cache so repeated text is never re-encoded
+        self.embedding_cache = None
+        if Config.EMBEDDING_CACHE_ENABLED:
+            self.embedding_cache = EmbeddingCache(
+                Config.EMBEDDING_CACHE_PATH,
+                Config.EMBEDDING_MODEL,
+                max_entries=Config.EMBEDDING_CACHE_MAX_ENTRIES
+            )
+        
+        # Per-document statistics, so listing and stats never scan the collection
+        self.catalog = DocumentCatalog(Config.CATALOG_DB_PATH)
+        if not self.catalog.list_documents() and self.collection.count() > 0:
+            self._rebuild_catalog()
+        
+        # Keyword index so exact identifiers are found even when embeddings miss them
+        self.bm25 = None
+        if Config.HYBRID_SEARCH:
+            self.bm25 = BM25Index(Config.BM25_DB_PATH, k1=Config.BM25_K1, b=Config.BM25_B)
+            if self.bm25.count() == 0 and self.collection.count() > 0:
+                self._rebuild_bm25()
     
-    def add_document(self, file_name: str, chunks: List[str], metadata: Dict = None) -> bool:
+    def add_document(self, file_name: str, chunks: Iterable[str], metadata: Dict = None,
+                     progress: Callable[[int], None] = None) -> bool:
         """
         Add document chunks to the vector store
         
+        Chunks are consumed lazily and embedded in batches of
+        Config.EMBED_BATCH_SIZE, each batch being written as soon as it is
+        encoded. Re-adding a document only embeds chunks whose content
+        changed; unchanged chunks are kept and chunks that disappeared are
+        removed.
+        
         Args:
             file_name: Name of the document
-            chunks: List of text chunks
+            chunks: Iterable of text chunks
             metadata: Additional metadata
+            progress: Optional callback receiving the number of chunks stored so far
             
         Returns:
             Success status
         """
+        result = self.add_documents(
+            [{'file_name': file_name, 'chunks': chunks, 'metadata': metadata}],
+            progress=progress
+        )
+        return result['success']
+    
+    def add_documents(self, documents: Iterable[Dict], 
+                      progress: Callable[[int], None] = None) -> Dict[str, any]:
+        """
+        Add several documents in one batched embedding pass
+        
+        Chunks of consecutive documents share embedding batches, so many
+        small documents are encoded as efficiently as one large one. Each
+        document is finalized (stale chunks removed, catalog updated) as
+        soon as all of its chunks have been written. If adding fails, the
+        chunks written for unfinished documents are deleted again, so they
+        keep their previous version.
+        
+        Args:
+            documents: Iterable of dicts with file_name, chunks and optional metadata
+            progress: Optional callback receiving the number of chunks stored so far
+            
+        Returns:
+            Dictionary with success status and chunk counts of stored documents
+        """
+        states = []
+        stored = {}
+        finalized = 0
+        written = 0
+        
         try:
-            # Generate embeddings
-            embeddings = self.embedding_model.encode(chunks).tolist()
+            items = self._iter_chunk_items(documents, states)
+            batches = self._prepare_batches(items)
+            for batch, embeddings in self._embed_batches(batches):
+                # Only new or changed chunks were embedded
+                if batch['ids']:
+                    self.collection.upsert(
+                        ids=batch['ids'],
+                        embeddings=embeddings.tolist(),
+                        documents=batch['documents'],
+                        metadatas=batch['metadatas']
+                    )
+                    if self.bm25:
+                        self.bm25.add(
+                            (chunk_id, metadata['file_name'], text)
+                            for chunk_id, metadata, text
+                            in zip(batch['ids'], batch['metadatas'], batch['documents'])
+                        )
+                
+                # Unchanged chunks keep their embeddings, only positions/metadata move
+                if batch['kept_ids']:
+                    self.collection.update(
+                        ids=batch['kept_ids'],
+                        metadatas=batch['kept_metadatas']
+                    )
+                
+                written += len(batch['ids']) + len(batch['kept_ids'])
+                if progress:
+                    progress(written)
+                
+                # Documents before the one this batch ended in are complete
+                while finalized < batch['last_document']:
+                    state = states[finalized]
+                    stored[state['file_name']] = self._finalize_document(state)
+                    finalized += 1
             
-            # Create unique IDs for each chunk
-            ids = [self._generate_id(file_name, i) for i in range(len(chunks))]
+            for state in states[finalized:]:
+                stored[state['file_name']] = self._finalize_document(state)
             
-            # Prepare metadata for each chunk
-            metadatas = []
-            for i, chunk in enumerate(chunks):
+            return {'success': True, 'documents': stored}
+        
+        except Exception as e:
+            print(f"Error adding document to vector store: {e}")
+            for state in states[finalized:]:
+                self._discard_partial_document(state)
+            return {'success': False, 'documents': stored, 'error': str(e)}
+    
+    def _discard_partial_document(self, state: Dict):
+        """Delete the chunks an unfinished document added, leaving its previous version intact"""
+        new_ids = list(state['seen_ids'] - state['existing_ids'])
+        if not new_ids:
+            return
+        
+        try:
+            self.collection.delete(ids=new_ids)
+            if self.bm25:
+                self.bm25.remove(new_ids)
+        except Exception as e:
+            print(f"Error removing partially added chunks of {state['file_name']}: {e}")
+    
+    def _iter_chunk_items(self, documents: Iterable[Dict], states: List[Dict]) -> Iterator[tuple]:
+        """Flatten documents into (state, chunk_index, chunk) items, tracking per-document state"""
+        for document in documents:
+            file_name = document['file_name']
+            
+            # Chunks already stored for this document
+            existing = self.collection.get(where={"file_name": file_name}, include=[])
+            state = {
+                'ordinal': len(states),
+                'file_name': file_name,
+                'metadata': document.get('metadata') or {},
+                'indexed_at': time.time(),
+                'existing_ids': set(existing['ids']),
+                'seen_ids': set(),
+                'occurrences': {}
+            }
+            states.append(state)
+            
+            for i, chunk in enumerate(document['chunks']):
+                yield state, i, chunk
+    
+    def _prepare_batches(self, items: Iterable[tuple]) -> Iterator[Dict[str, list]]:
+        """Split a chunk stream into batches of new and unchanged chunks"""
+        for batch in _batched(items, Config.EMBED_BATCH_SIZE):
+            prepared = {
+                'ids': [], 'documents': [], 'metadatas': [],
+                'kept_ids': [], 'kept_metadatas': [],
+                'last_document': batch[-1][0]['ordinal']
+            }
+            for state, i, chunk in batch:
+                file_name = state['file_name']
+                chunk_id = self._chunk_id(file_name, chunk, state['occurrences'])
+                state['seen_ids'].add(chunk_id)
+                
                 chunk_metadata = {
                     'file_name': file_name,
                     'chunk_index': i,
-                    'chunk_text': chunk[:500]  # Store preview
+                    'chunk_text': chunk[:500],  # Store preview
+                    'indexed_at': state['indexed_at']
                 }
-                if metadata:
-                    chunk_metadata.update(metadata)
-                metadatas.append(chunk_metadata)
-            
-            # Add to collection
-            self.collection.add(
-                ids=ids,
-                embeddings=embeddings,
-                documents=chunks,
-                metadatas=metadatas
-            )
+                chunk_metadata.update(state['metadata'])
+                
+                if chunk_id in state['existing_ids']:
+                    prepared['kept_ids'].append(chunk_id)
+                    prepared['kept_metadatas'].append(chunk_metadata)
+                else:
+                    prepared['ids'].append(chunk_id)
+                    prepared['documents'].append(chunk)
+                    prepared['metadatas'].append(chunk_metadata)
+            yield prepared
+    
+    def _finalize_document(self, state: Dict) -> int:
+        """Remove a document's stale chunks and record it in the catalog"""
+        file_name = state['file_name']
+        
+        with self.catalog.transaction() as conn:
+            # Remove chunks that no longer exist in the document
+            stale_ids = list(state['existing_ids'] - state['seen_ids'])
+            if stale_ids:
+                self.collection.delete(ids=stale_ids)
+                if self.bm25:
+                    self.bm25.remove(stale_ids)
             
-            return True
+            if state['seen_ids']:
+                self.catalog.record(
+                    conn,
+                    file_name,
+                    chunk_count=len(state['seen_ids']),
+                    size=state['metadata'].get('size'),
+                    file_type=state['metadata'].get('file_type'),
+                    indexed_at=state['indexed_at']
+                )
+            else:
+                self.catalog.remove(conn, file_name)
         
-        except Exception as e:
-            print(f"Error adding document to vector store: {e}")
-            return False
+        return len(state['seen_ids'])
+    
+    def _embed_batches(self, batches: Iterable[Dict[str, list]]):
+        """
+        Embed each batch's documents on a worker pool
+        
+        At most Config.EMBED_WORKERS batches are in flight at once and
+        results are yielded in input order as (batch, embeddings).
+        """
+        with ThreadPoolExecutor(max_workers=Config.EMBED_WORKERS) as pool:
+            pending = deque()
+            for batch in batches:
+                future = pool.submit(self._embed, batch['documents']) if batch['documents'] else None
+                pending.append((batch, future))
+                if len(pending) >= Config.EMBED_WORKERS:
+                    ready, future = pending.popleft()
+                    yield ready, future.result() if future else None
+            
+            while pending:
+                ready, future = pending.popleft()
+                yield ready, future.result() if future else None
+    
+    def embed_query(self, query: str) -> List[float]:
+        """Generate the embedding of a search query"""
+        return self._embed([query])[0].tolist()
     
-    def search(self, query: str, n_results: int = None) -> Dict[str, any]:
+    def search(self, query: str, n_results: int = None,
+               query_embedding: List[float] = None, filters: Dict = None) -> Dict[str, any]:
         """
         Search for relevant document chunks
         
+        With Config.HYBRID_SEARCH, the nearest chunks by embedding and the
+        best BM25 keyword matches are merged by reciprocal rank fusion.
+        
         Args:
             query: Search query
             n_results: Number of results to return
+            query_embedding: Precomputed embedding of the query
+            filters: Metadata filters (see build_where), applied inside ChromaDB
             
         Returns:
             Search results with documents and metadata
@@ -85,30 +374,43 @@ class VectorStore:
             n_results = Config.TOP_K_RESULTS
         
         try:
+            where = build_where(filters)
+            
             # Generate query embedding
-            query_embedding = self.embedding_model.encode([query]).tolist()
+            if query_embedding is None:
+                query_embedding = self.embed_query(query)
+            
+            candidates = max(n_results, Config.HYBRID_CANDIDATES) if self.bm25 else n_results
             
             # Search
             results = self.collection.query(
-                query_embeddings=query_embedding,
-                n_results=n_results
+                query_embeddings=[query_embedding],
+                n_results=candidates,
+                where=where
             )
             
-            if not results['documents'] or not results['documents'][0]:
-                return {
-                    'success': True,
-                    'results': [],
-                    'count': 0
-                }
-            
-            # Format results
-            formatted_results = []
-            for i in range(len(results['documents'][0])):
-                formatted_results.append({
+            hits = {}
+            vector_ids = results['ids'][0] if results['ids'] else []
+            for i, chunk_id in enumerate(vector_ids):
+                hits[chunk_id] = {
                     'text': results['documents'][0][i],
                     'metadata': results['metadatas'][0][i],
                     'distance': results['distances'][0][i] if 'distances' in results else None
-                })
+                }
+            
+            if self.bm25:
+                keyword_ids = self._keyword_search(query, candidates, where)
+                fused = reciprocal_rank_fusion([vector_ids, keyword_ids], k=Config.RRF_K)
+                ranked_ids = [chunk_id for chunk_id, _ in fused[:n_results]]
+                
+                missing_ids = [chunk_id for chunk_id in ranked_ids if chunk_id not in hits]
+                if missing_ids:
+                    hits.update(self._fetch_hits(missing_ids, query_embedding))
+            else:
+                ranked_ids = vector_ids[:n_results]
+            
+            # Format results
+            formatted_results = [hits[chunk_id] for chunk_id in ranked_ids if chunk_id in hits]
             
             return {
                 'success': True,
@@ -124,6 +426,39 @@ class VectorStore:
                 'error': str(e)
             }
     
+    def _keyword_search(self, query: str, limit: int, where: Dict = None) -> List[str]:
+        """Rank chunk IDs by BM25, keeping only chunks that match the where clause"""
+        if where is None:
+            return [chunk_id for chunk_id, _ in self.bm25.search(query, limit)]
+        
+        # The keyword index knows nothing about metadata, so over-fetch and let Chroma filter
+        keyword_ids = [chunk_id for chunk_id, _ in self.bm25.search(query, limit * 5)]
+        if not keyword_ids:
+            return []
+        
+        matching = set(self.collection.get(ids=keyword_ids, where=where, include=[])['ids'])
+        return [chunk_id for chunk_id in keyword_ids if chunk_id in matching][:limit]
+    
+    def _fetch_hits(self, chunk_ids: List[str], query_embedding: List[float]) -> Dict[str, Dict]:
+        """Load keyword-only matches and compute their cosine distance to the query"""
+        fetched = self.collection.get(ids=chunk_ids, include=['documents', 'metadatas', 'embeddings'])
+        
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = np.linalg.norm(query_vector) or 1.0
+        
+        hits = {}
+        for chunk_id, text, metadata, embedding in zip(
+            fetched['ids'], fetched['documents'], fetched['metadatas'], fetched['embeddings']
+        ):
+            vector = np.asarray(embedding, dtype=np.float32)
+            similarity = float(vector @ query_vector) / ((np.linalg.norm(vector) or 1.0) * query_norm)
+            hits[chunk_id] = {
+                'text': text,
+                'metadata': metadata,
+                'distance': 1 - similarity
+            }
+        return hits
+    
     def delete_document(self, file_name: str) -> bool:
         """
         Delete all chunks of a document
@@ -135,13 +470,20 @@ class VectorStore:
             Success status
         """
         try:
-            # Query for all chunks with this file_name
-            results = self.collection.get(
-                where={"file_name": file_name}
-            )
-            
-            if results['ids']:
-                self.collection.delete(ids=results['ids'])
+            with self.catalog.transaction() as conn:
+                # Query for all chunks with this file_name
+                results = self.collection.get(
+                    where={"file_name": file_name},
+                    include=[]
+                )
+                
+                if results['ids']:
+                    self.collection.delete(ids=results['ids'])
+                
+                if self.bm25:
+                    self.bm25.remove_document(file_name)
+                
+                self.catalog.remove(conn, file_name)
             
             return True
         
@@ -157,19 +499,7 @@ class VectorStore:
             List of document names
         """
         try:
-            # Get all metadata
-            results = self.collection.get()
-            
-            if not results['metadatas']:
-                return []
-            
-            # Extract unique file names
-            file_names = set()
-            for metadata in results['metadatas']:
-                if 'file_name' in metadata:
-                    file_names.add(metadata['file_name'])
-            
-            return sorted(list(file_names))
+            return self.catalog.list_documents()
         
         except Exception as e:
             print(f"Error listing documents: {e}")
@@ -183,16 +513,12 @@ class VectorStore:
             Dictionary with statistics
         """
         try:
-            results = self.collection.get()
-            
-            total_chunks = len(results['ids']) if results['ids'] else 0
-            documents = self.list_documents()
+            stats = self.catalog.totals()
+            stats['documents'] = self.catalog.list_documents()
+            if self.embedding_cache:
+                stats['embedding_cache'] = self.embedding_cache.stats()
             
-            return {
-                'total_documents': len(documents),
-                'total_chunks': total_chunks,
-                'documents': documents
-            }
+            return stats
         
         except Exception as e:
             return {
@@ -210,19 +536,74 @@ class VectorStore:
             Success status
         """
         try:
-            # Delete the collection and recreate it
-            self.client.delete_collection(name="documents")
-            self.collection = self.client.get_or_create_collection(
-                name="documents",
-                metadata={"hnsw:space": "cosine"}
-            )
+            with self.catalog.transaction() as conn:
+                # Delete the collection and recreate it
+                self.client.delete_collection(name="documents")
+                self.collection = self.client.get_or_create_collection(
+                    name="documents",
+                    metadata={"hnsw:space": "cosine"}
+                )
+                self.catalog.clear(conn)
+                
+                if self.bm25:
+                    self.bm25.clear()
+            
             return True
         
         except Exception as e:
             print(f"Error clearing vector store: {e}")
             return False
     
-    def _generate_id(self, file_name: str, chunk_index: int) -> str:
+    def _rebuild_catalog(self):
+        """Backfill the catalog from chunk metadata with a one-off collection scan"""
+        results = self.collection.get(include=['metadatas'])
+        
+        documents = {}
+        for metadata in results['metadatas'] or []:
+            file_name = metadata.get('file_name')
+            if file_name is None:
+                continue
+            entry = documents.setdefault(file_name, {
+                'chunk_count': 0,
+                'size': metadata.get('size'),
+                'file_type': metadata.get('file_type')
+            })
+            entry['chunk_count'] += 1
+        
+        with self.catalog.transaction() as conn:
+            for file_name, entry in documents.items():
+                self.catalog.record(conn, file_name, **entry)
+    
+    def _rebuild_bm25(self, page_size: int = 1000):
+        """Backfill the keyword index from stored chunks"""
+        offset = 0
+        while True:
+            results = self.collection.get(include=['documents', 'metadatas'], limit=page_size, offset=offset)
+            if not results['ids']:
+                break
+            
+            self.bm25.add(
+                (chunk_id, metadata.get('file_name', ''), text)
+                for chunk_id, metadata, text
+                in zip(results['ids'], results['metadatas'], results['documents'])
+            )
+            offset += len(results['ids'])
+    
+    def _embed(self, texts: List[str]):
+        """Encode texts, consulting the embedding cache when enabled"""
+        if self.embedding_cache is None:
+            return self.embedding_model.encode(texts)
+        return self.embedding_cache.encode(texts, self.embedding_model.encode)
+    
+    def _chunk_id(self, file_name: str, chunk: str, occurrences: Dict[str, int]) -> str:
+        """Generate a content-addressed ID for the next chunk of a document"""
+        content_hash = hashlib.sha256(chunk.encode('utf-8')).hexdigest()
+        # Repeated chunks within one document still get distinct IDs
+        occurrence = occurrences.get(content_hash, 0)
+        occurrences[content_hash] = occurrence + 1
+        return self._generate_id(file_name, content_hash, occurrence)
+    
+    def _generate_id(self, file_name: str, content_hash: str, occurrence: int = 0) -> str:
         """Generate unique ID for a document chunk"""
-        content = f"{file_name}_{chunk_index}"
+        content = f"{file_name}_{content_hash}_{occurrence}"
         return hashlib.md5(content.encode()).hexdigest()
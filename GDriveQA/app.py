@@ -1,10 +1,13 @@
 """Flask web application for GDriveQA."""
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
 from flask_cors import CORS
 from pathlib import Path
 from config import Config
-from query_engine import QueryEngine
+from query_engine import QueryEngine, batch_record, parse_batch_question
+from vector_store import build_where
 from indexer import DocumentIndexer
+from query_server import reload_daemon
+import json
 import threading
 import time
 
@@ -21,7 +24,7 @@ def init_app():
     global query_engine, indexer
     Config.setup_directories()
     query_engine = QueryEngine()
-    indexer = DocumentIndexer()
+    indexer = DocumentIndexer(vector_store=query_engine.vector_store)
 
 
 @app.route('/')
@@ -31,7 +34,7 @@ def index():
 
 
 @app.route('/api/query', methods=['POST'])
-def query():
+async def query():
     """Handle query requests."""
     try:
         data = request.json
@@ -40,7 +43,13 @@ def query():
         if not question:
             return jsonify({'error': 'No question provided'}), 400
         
-        result = query_engine.ask(question)
+        filters = data.get('filters')
+        try:
+            build_where(filters)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        result = await query_engine.aask(question, filters=filters)
         
         if result['success']:
             # Format response
@@ -48,6 +57,8 @@ def query():
                 'answer': result['answer'],
                 'sources': list(set(result['sources'])),
                 'num_sources': result['num_sources'],
+                'context_tokens': result['context_tokens'],
+                'timings': result['timings'],
                 'context_chunks': [
                     {
                         'file_name': chunk['file_name'],
@@ -65,6 +76,30 @@ def query():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/query/batch', methods=['POST'])
+def query_batch():
+    """Answer a list of questions, streaming one JSON line per answer."""
+    data = request.json or {}
+    questions = data.get('questions')
+    
+    if not isinstance(questions, list) or not questions:
+        return jsonify({'error': 'No questions provided'}), 400
+    
+    filters = data.get('filters')
+    try:
+        build_where(filters)
+        entries = [parse_batch_question(item, i) for i, item in enumerate(questions)]
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def generate():
+        results = query_engine.ask_batch([question for _, question in entries], filters=filters)
+        for (request_id, _), result in zip(entries, results):
+            yield json.dumps(batch_record(request_id, result)) + "\n"
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
 @app.route('/api/stats', methods=['GET'])
 def stats():
     """Get index statistics."""
@@ -81,7 +116,11 @@ def trigger_index():
     try:
         # Run indexing in background thread
         def index_task():
-            indexer.sync_and_index()
+            try:
+                indexer.sync_and_index()
+            finally:
+                # A query daemon (cli.py serve) has its own copy of the index open
+                reload_daemon()
         
         thread = threading.Thread(target=index_task)
         thread.daemon = True
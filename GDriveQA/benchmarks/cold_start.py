@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Benchmark GDriveQA cold-start time.
+
+Each scenario runs in a fresh interpreter, the way a CLI command does, and
+reports the median wall time across runs along with whether torch ended up
+imported and which models were loaded. Scenarios that should not need a
+model are flagged if one was loaded. Run it from the GDriveQA directory
+against an existing index:
+
+    python benchmarks/cold_start.py --runs 5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+# Each snippet is timed from interpreter start-up to completion
+SCENARIOS = {
+    'import cli': "import cli",
+    'stats': "from vector_store import VectorStore; VectorStore().get_stats()",
+    'QueryEngine()': "from query_engine import QueryEngine; QueryEngine()",
+    'first search': "from vector_store import VectorStore; VectorStore().search('cold start benchmark')",
+}
+
+# Scenarios that must not load a model; models load on first use only
+NO_MODELS = {'import cli', 'stats', 'QueryEngine()'}
+
+RUNNER = """
+import json, sys, time
+started = time.perf_counter()
+exec(sys.argv[1])
+seconds = time.perf_counter() - started
+from models import loaded_models
+print(json.dumps({
+    'seconds': seconds,
+    'torch_loaded': 'torch' in sys.modules,
+    'models': [kind for kind, _ in loaded_models()]
+}))
+"""
+
+
+def run_scenario(code: str) -> dict:
+    """Run a snippet in a new interpreter and return its timing."""
+    completed = subprocess.run(
+        [sys.executable, '-c', RUNNER, code],
+        cwd=APP_DIR, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    """Time every scenario and print a summary table."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3, help='runs per scenario')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='scenario to run (repeatable, default: all)')
+    args = parser.parse_args()
+
+    print(f"{'scenario':<16} {'median s':>9} {'min s':>7}  {'torch':<5}  models")
+    for name in args.scenario or SCENARIOS:
+        try:
+            runs = [run_scenario(SCENARIOS[name]) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{name:<16} failed: {e}")
+            continue
+
+        seconds = [run['seconds'] for run in runs]
+        torch_loaded = 'yes' if runs[-1]['torch_loaded'] else 'no'
+        models = ', '.join(runs[-1]['models']) or '-'
+        print(f"{name:<16} {statistics.median(seconds):>9.3f} {min(seconds):>7.3f}  {torch_loaded:<5}  {models}")
+        if name in NO_MODELS and runs[-1]['models']:
+            print(f"  warning: {name} loaded {models} eagerly")
+
+
+if __name__ == '__main__':
+    main()
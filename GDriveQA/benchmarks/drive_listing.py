@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""Benchmark Google Drive listing and metadata round trips.
+
+A local stand-in for the Drive v3 API serves a synthetic Drive of --files
+files, honouring pageSize limits, field masks, parent and MIME type queries
+and the batch endpoint. --subtree-files of the files sit in a "team" folder
+tree of 111 folders, the rest in My Drive's root. Each scenario runs
+GDriveClient against it and reports the HTTP requests made, the response
+bytes received and the wall time. Run it from the GDriveQA directory:
+
+    python benchmarks/drive_listing.py --files 20000 --subtree-files 2000
+"""
+import argparse
+import json
+import re
+import sys
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+APP_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(APP_DIR))
+
+import httplib2
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from gdrive_client import FOLDER_MIME_TYPE, GDriveClient
+
+# The fields requested per file when listing used pageSize=100, fixed so the
+# comparison does not move when FILE_FIELDS changes
+LEGACY_FILE_FIELDS = "id, name, mimeType, modifiedTime, md5Checksum, size, webViewLink, parents"
+
+
+def make_folders() -> dict:
+    """A "team" folder with 10 subfolders of 10 subfolders each."""
+    folders = {'team': ['root']}
+    for a in range(10):
+        folders[f"team-{a}"] = ['team']
+        for b in range(10):
+            folders[f"team-{a}-{b}"] = [f"team-{a}"]
+    return {
+        folder_id: {'kind': 'drive#file', 'id': folder_id, 'name': folder_id,
+                    'mimeType': FOLDER_MIME_TYPE, 'parents': parents}
+        for folder_id, parents in folders.items()
+    }
+
+
+def make_files(count: int, subtree_files: int) -> dict:
+    """Synthetic Drive files and folders keyed by ID, with more fields than the client asks for."""
+    files = make_folders()
+    leaves = [folder_id for folder_id in files if folder_id.count('-') == 2]
+    for i in range(count):
+        file_id = f"file{i:07d}"
+        files[file_id] = {
+            'kind': 'drive#file',
+            'id': file_id,
+            'name': f"document-{i}.pdf",
+            'mimeType': 'application/pdf',
+            'modifiedTime': '2024-06-01T12:00:00.000Z',
+            'md5Checksum': f"{i:032x}",
+            'size': str(100000 + i),
+            'webViewLink': f"https://drive.google.com/file/d/{file_id}/view",
+            'parents': [leaves[i % len(leaves)] if i < subtree_files else 'root'],
+            'owners': [{'displayName': 'Benchmark', 'emailAddress': 'benchmark@example.com'}],
+            'description': 'Synthetic file served by the Drive listing benchmark'
+        }
+    return files
+
+
+def mask(data: dict, fields: str) -> dict:
+    """Apply a Drive field mask such as "nextPageToken, files(id, name)"."""
+    if not fields:
+        return data
+
+    masked = {}
+    for name, nested in re.findall(r"(\w+)(?:\(([^)]*)\))?", fields):
+        if name not in data:
+            continue
+        value = data[name]
+        if nested and isinstance(value, list):
+            value = [mask(item, nested) for item in value]
+        masked[name] = value
+    return masked
+
+
+class DriveStandIn(BaseHTTPRequestHandler):
+    """Answers files.list, files.get and batch requests from the server's files."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        status, body = self.server.answer('GET', self.path)
+        self._send(status, 'application/json', body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        if not self.path.startswith('/batch/'):
+            self._send(404, 'application/json', b'{}')
+            return
+
+        # Each part of the batch is a complete HTTP request
+        message = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body
+        )
+        boundary = 'batch_stand_in'
+        parts = []
+        for part in message.iter_parts():
+            request_line = part.get_payload(decode=True).decode().splitlines()[0]
+            method, path, _ = request_line.split(' ', 2)
+            status, part_body = self.server.answer(method, path, batched=True)
+            parts.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{part['Content-ID'].strip('<>')}>\r\n\r\n"
+                f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(part_body)}\r\n\r\n".encode() + part_body + b"\r\n"
+            )
+        parts.append(f"--{boundary}--\r\n".encode())
+        self._send(200, f"multipart/mixed; boundary={boundary}", b''.join(parts))
+
+    def _send(self, status: int, content_type: str, body: bytes):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count(len(body))
+
+
+class DriveStandInServer(ThreadingHTTPServer):
+    """Local stand-in for the parts of the Drive v3 API GDriveClient lists with."""
+
+    daemon_threads = True
+
+    def __init__(self, files: dict):
+        super().__init__(('127.0.0.1', 0), DriveStandIn)
+        self.files = files
+        self.file_ids = sorted(files)
+        self.children = {}
+        for file_id in self.file_ids:
+            for parent in files[file_id]['parents']:
+                self.children.setdefault(parent, []).append(file_id)
+        self._lock = threading.Lock()
+        self.reset()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+    def reset(self):
+        """Zero the request counters."""
+        with self._lock:
+            self.requests = 0
+            self.batched_calls = 0
+            self.bytes_sent = 0
+
+    def count(self, size: int):
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += size
+
+    def answer(self, method: str, path: str, batched: bool = False):
+        """Status and JSON body for one API call."""
+        if batched:
+            with self._lock:
+                self.batched_calls += 1
+
+        url = urlsplit(path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if method == 'GET' and url.path == '/drive/v3/files':
+            # Like Drive, never return more than 1000 files per page
+            page_size = min(int(params.get('pageSize', 100)), 1000)
+            start = int(params.get('pageToken', 0))
+            matches = self.search(params.get('q', ''))
+            page = {'files': [self.files[i] for i in matches[start:start + page_size]]}
+            if start + page_size < len(matches):
+                page['nextPageToken'] = str(start + page_size)
+            return 200, json.dumps(mask(page, params.get('fields'))).encode()
+
+        file_id = url.path.rsplit('/', 1)[-1]
+        if method == 'GET' and url.path.startswith('/drive/v3/files/') and file_id in self.files:
+            return 200, json.dumps(mask(self.files[file_id], params.get('fields'))).encode()
+        return 404, json.dumps({'error': {'code': 404, 'message': 'File not found'}}).encode()
+
+    def search(self, query: str) -> list:
+        """IDs matching the "'id' in parents" and "mimeType='type'" conditions of a query."""
+        parents = re.findall(r"'([^']+)' in parents", query)
+        mime_types = set(re.findall(r"mimeType='([^']+)'", query))
+        if parents:
+            file_ids = sorted({i for parent in parents for i in self.children.get(parent, [])})
+        else:
+            file_ids = self.file_ids
+        return [i for i in file_ids if not mime_types or self.files[i]['mimeType'] in mime_types]
+
+
+def stand_in_client(server: DriveStandInServer) -> GDriveClient:
+    """GDriveClient whose Drive service, batch endpoint included, points at the stand-in."""
+    discovery = json.loads(get_static_doc('drive', 'v3'))
+    discovery['rootUrl'] = server.url
+    discovery['baseUrl'] = server.url + discovery['servicePath']
+    return GDriveClient(service=build_from_document(discovery, http=httplib2.Http()))
+
+
+def list_legacy(client: GDriveClient):
+    """Listing as it was: pages of 100 with webViewLink and parents."""
+    page_token = None
+    while True:
+        results = client.service.files().list(
+            q="trashed=false", pageSize=100, pageToken=page_token,
+            fields=f"nextPageToken, files({LEGACY_FILE_FIELDS})"
+        ).execute()
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return
+
+
+SCENARIOS = {
+    'list, pageSize=100': lambda client, ids: list_legacy(client),
+    'list_files': lambda client, ids: client.list_files(),
+    'list_folder_tree': lambda client, ids: client.list_folder_tree(['team']),
+    'get_file_metadata xN': lambda client, ids: [client.get_file_metadata(i) for i in ids],
+    'get_files_metadata': lambda client, ids: client.get_files_metadata(ids),
+}
+
+
+def main():
+    """Run every scenario against the stand-in and print a summary table."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=20000, help='files in the synthetic Drive')
+    parser.add_argument('--subtree-files', type=int, default=2000,
+                        help='files inside the "team" folder tree')
+    parser.add_argument('--metadata-files', type=int, default=1000,
+                        help='files whose metadata is fetched by ID')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='scenario to run (repeatable, default: all)')
+    args = parser.parse_args()
+
+    server = DriveStandInServer(make_files(args.files, args.subtree_files))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = stand_in_client(server)
+    ids = [i for i in server.file_ids if i.startswith('file')][:args.metadata_files]
+
+    print(f"{'scenario':<22} {'requests':>9} {'calls':>7} {'KiB':>9} {'seconds':>8}")
+    try:
+        for name in args.scenario or SCENARIOS:
+            server.reset()
+            started = time.perf_counter()
+            SCENARIOS[name](client, ids)
+            seconds = time.perf_counter() - started
+            calls = server.batched_calls or server.requests
+            print(f"{name:<22} {server.requests:>9} {calls:>7} "
+                  f"{server.bytes_sent / 1024:>9.0f} {seconds:>8.2f}")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,15 @@
 #!/usr/bin/env python3
-"""Command-line interface for GDriveQA."""
+"""Command-line interface for GDriveQA.
+
+Commands import what they need when they run, so quick ones like stats
+start without loading the embedding model, the LLM SDKs or the Drive client.
+Questions go to the query daemon (cli.py serve) when one is running.
+"""
+import json
 import sys
+import time
 from pathlib import Path
 from config import Config
-from indexer import DocumentIndexer
-from query_engine import QueryEngine
 
 
 def print_banner():
@@ -14,6 +19,48 @@ def print_banner():
     print("="*70 + "\n")
 
 
+def get_engine():
+    """Connect to a running query daemon, or load a QueryEngine in this process."""
+    from query_server import QueryClient
+    client = QueryClient.connect()
+    if client:
+        return client
+    
+    from query_engine import QueryEngine
+    return QueryEngine()
+
+
+def serve():
+    """Keep a warm QueryEngine answering questions on the query socket."""
+    from query_engine import QueryEngine
+    from query_server import QueryServer
+    
+    print_banner()
+    print("Loading models...")
+    engine = QueryEngine()
+    # Load models now rather than on the first question
+    engine.vector_store.embedding_model
+    if engine.reranker:
+        engine.reranker.model
+    
+    try:
+        server = QueryServer(engine)
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    
+    print(f"Query daemon listening on {server.socket_path}")
+    print("Press Ctrl+C to stop\n")
+    
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping query daemon...")
+    finally:
+        server.server_close()
+        engine.llm_client.close()
+
+
 def main():
     """Main CLI entry point."""
     # Setup
@@ -36,9 +83,15 @@ def main():
     
     if command == 'index':
         # Index documents
+        from indexer import DocumentIndexer
+        from query_server import reload_daemon
         print_banner()
         indexer = DocumentIndexer()
-        indexer.sync_and_index()
+        try:
+            indexer.sync_and_index(force_reindex='--full' in sys.argv[2:])
+        finally:
+            # Even a failed sync may have changed part of the index
+            reload_daemon()
     
     elif command == 'query' or command == 'ask':
         # Query documents
@@ -52,7 +105,7 @@ def main():
         print(f"Question: {question}\n")
         print("-" * 70 + "\n")
         
-        engine = QueryEngine()
+        engine = get_engine()
         result = engine.ask(question)
         
         if result['success']:
@@ -62,16 +115,43 @@ def main():
             print(f"\nSources used ({result['num_sources']} documents):")
             for i, source in enumerate(set(result['sources']), 1):
                 print(f"  {i}. {source}")
+            
+            context_tokens = result['context_tokens']
+            print(f"\nContext: {context_tokens['tokens']} tokens "
+                  f"({context_tokens['tokens_saved']} saved by packing)")
+            print("Timings: " + ", ".join(
+                f"{stage.replace('_ms', '')} {ms:.0f} ms" for stage, ms in result['timings'].items()
+            ))
         else:
             print(f"Error: {result.get('error', 'Unknown error')}")
         
         print("\n" + "="*70 + "\n")
     
+    elif command == 'batch':
+        # Answer a file of questions
+        if len(sys.argv) < 3:
+            print("Usage: python cli.py batch questions.jsonl [--output results.jsonl]")
+            sys.exit(1)
+        
+        output_path = None
+        if '--output' in sys.argv[3:]:
+            position = sys.argv.index('--output', 3)
+            if position + 1 >= len(sys.argv):
+                print("--output needs a file path")
+                sys.exit(1)
+            output_path = sys.argv[position + 1]
+        
+        run_batch(Path(sys.argv[2]), output_path)
+    
+    elif command == 'serve':
+        # Run the query daemon
+        serve()
+    
     elif command == 'stats':
         # Show statistics
+        from vector_store import VectorStore
         print_banner()
-        engine = QueryEngine()
-        stats = engine.get_stats()
+        stats = VectorStore().get_stats()
         
         print("Vector Store Statistics:")
         print(f"  Total documents indexed: {stats['total_files']}")
@@ -83,16 +163,19 @@ def main():
         # Clear index
         response = input("Are you sure you want to clear the entire index? (yes/no): ")
         if response.lower() == 'yes':
+            from indexer import DocumentIndexer
+            from query_server import reload_daemon
             indexer = DocumentIndexer()
             indexer.clear_index()
             print("Index cleared successfully.")
+            reload_daemon()
         else:
             print("Operation cancelled.")
     
     elif command == 'interactive':
         # Interactive mode
         print_banner()
-        engine = QueryEngine()
+        engine = get_engine()
         stats = engine.get_stats()
         
         print(f"Indexed documents: {stats['total_files']}")
@@ -136,13 +219,51 @@ def main():
         sys.exit(1)
 
 
+def run_batch(questions_path: Path, output_path: str = None):
+    """Answer every question in a JSONL file, writing one JSON result per line."""
+    from query_engine import QueryEngine, batch_record, parse_batch_question
+    
+    entries = []
+    try:
+        with open(questions_path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                if line.strip():
+                    entries.append(parse_batch_question(json.loads(line), line_number))
+    except (OSError, ValueError) as e:
+        print(f"Error reading {questions_path}: {e}", file=sys.stderr)
+        sys.exit(1)
+    
+    engine = QueryEngine()
+    output = open(output_path, 'w', encoding='utf-8') if output_path else sys.stdout
+    started = time.perf_counter()
+    failed = 0
+    
+    try:
+        results = engine.ask_batch([question for _, question in entries])
+        for i, ((request_id, _), result) in enumerate(zip(entries, results), 1):
+            if not result['success']:
+                failed += 1
+            output.write(json.dumps(batch_record(request_id, result)) + "\n")
+            output.flush()
+            print(f"\r{i}/{len(entries)} answered", end="", file=sys.stderr)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    
+    elapsed = time.perf_counter() - started
+    print(f"\n{len(entries)} questions in {elapsed:.1f}s "
+          f"({len(entries) / elapsed if elapsed else 0:.1f}/s), {failed} failed", file=sys.stderr)
+
+
 def print_usage():
     """Print usage information."""
     print("\nGDriveQA - Query your Google Drive documents using AI")
     print("\nUsage:")
-    print("  python cli.py index                  - Index all Google Drive documents")
+    print("  python cli.py index [--full]         - Index new and changed Google Drive documents")
     print("  python cli.py query \"question\"       - Ask a question")
+    print("  python cli.py batch questions.jsonl  - Answer a JSONL file of questions")
     print("  python cli.py interactive            - Interactive Q&A mode")
+    print("  python cli.py serve                  - Keep models warm for query/interactive")
     print("  python cli.py stats                  - Show index statistics")
     print("  python cli.py clear                  - Clear the index")
     print("\nExamples:")
@@ -26,17 +26,62 @@ class Config:
     ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY')
     LLM_PROVIDER = os.getenv('LLM_PROVIDER', 'openai')
     LLM_MODEL = os.getenv('LLM_MODEL', 'gpt-4-turbo-preview')
+    LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 16))
+    LLM_REQUESTS_PER_MINUTE = int(os.getenv('LLM_REQUESTS_PER_MINUTE', 0))  # 0 = unlimited
+    QUERY_BATCH_SIZE = int(os.getenv('QUERY_BATCH_SIZE', 64))
     
     # Model Settings
     EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
+    PDF_WORKERS = int(os.getenv('PDF_WORKERS', os.cpu_count() or 2))
+    PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', 50))
     CHUNK_SIZE = 1000
     CHUNK_OVERLAP = 200
     TOP_K_RESULTS = 5
+    CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', 6000))
+    
+    # Re-ranking (cross-encoder over an over-fetched candidate list)
+    RERANK_ENABLED = os.getenv('RERANK_ENABLED', 'False').lower() == 'true'
+    RERANK_MODEL = os.getenv('RERANK_MODEL', 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+    RERANK_CANDIDATES = int(os.getenv('RERANK_CANDIDATES', 20))
+    RERANK_TOP_K = int(os.getenv('RERANK_TOP_K', 3))
+    RERANK_BATCH_SIZE = int(os.getenv('RERANK_BATCH_SIZE', 32))
+    
+    # Embedding pipeline
+    EMBED_BATCH_SIZE = int(os.getenv('EMBED_BATCH_SIZE', 64))
+    EMBED_WORKERS = int(os.getenv('EMBED_WORKERS', 2))
+    
+    # Embedding cache (shared with DocQA when pointed at the same directory)
+    EMBEDDING_CACHE_ENABLED = os.getenv('EMBEDDING_CACHE_ENABLED', 'True').lower() == 'true'
+    EMBEDDING_CACHE_PATH = Path(
+        os.getenv('EMBEDDING_CACHE_PATH', '~/.cache/qa-embeddings')
+    ).expanduser()
+    EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', 100000))
+    
+    # Hybrid search (BM25 keyword index fused with vector results)
+    HYBRID_SEARCH = os.getenv('HYBRID_SEARCH', 'True').lower() == 'true'
+    BM25_DB_PATH = Path(os.getenv('BM25_DB_PATH', str(CHROMA_DB_PATH / 'bm25.sqlite3')))
+    BM25_K1 = float(os.getenv('BM25_K1', 1.2))
+    BM25_B = float(os.getenv('BM25_B', 0.75))
+    RRF_K = int(os.getenv('RRF_K', 60))
+    HYBRID_CANDIDATES = int(os.getenv('HYBRID_CANDIDATES', 20))
+    
+    # Query daemon (cli.py serve)
+    QUERY_SOCKET_PATH = Path(os.getenv('QUERY_SOCKET_PATH', str(STORAGE_PATH / 'query.sock')))
     
     # Sync Settings
+    SYNC_MANIFEST_PATH = Path(os.getenv('SYNC_MANIFEST_PATH', str(STORAGE_PATH / 'sync_manifest.json')))
     SYNC_INTERVAL_MINUTES = int(os.getenv('SYNC_INTERVAL_MINUTES', 60))
+    # Folders to sync, recursively (comma-separated IDs); empty syncs the whole Drive
+    DRIVE_FOLDER_IDS = [f.strip() for f in os.getenv('DRIVE_FOLDER_IDS', '').split(',') if f.strip()]
+    # Shared drive to sync instead of My Drive; folder IDs then refer to folders in it
+    SHARED_DRIVE_ID = os.getenv('SHARED_DRIVE_ID') or None
+    LIST_WORKERS = int(os.getenv('LIST_WORKERS', 8))
     MAX_FILE_SIZE_MB = int(os.getenv('MAX_FILE_SIZE_MB', 50))
     MAX_FILE_SIZE_BYTES = MAX_FILE_SIZE_MB * 1024 * 1024
+    DOWNLOAD_WORKERS = int(os.getenv('DOWNLOAD_WORKERS', 8))
+    DOWNLOAD_CHUNK_SIZE = int(os.getenv('DOWNLOAD_CHUNK_SIZE_MB', 8)) * 1024 * 1024
+    EXTRACT_WORKERS = int(os.getenv('EXTRACT_WORKERS', 4))
+    PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', 16))
     
     # Supported file types
     SUPPORTED_MIME_TYPES = {
@@ -81,3 +126,4 @@ class Config:
         """Create necessary directories."""
         cls.STORAGE_PATH.mkdir(parents=True, exist_ok=True)
         cls.CHROMA_DB_PATH.mkdir(parents=True, exist_ok=True)
+        cls.BM25_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
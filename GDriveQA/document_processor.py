@@ -7,6 +7,16 @@ from pptx import Presentation
 from openpyxl import load_workbook
 from bs4 import BeautifulSoup
 import markdown
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from config import Config
+
+
+def _extract_pdf_pages(file_path: Path, start: int, end: int) -> List[str]:
+    """Extract the text of pages [start, end) of a PDF."""
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        return [pdf_reader.pages[page_num].extract_text() for page_num in range(start, end)]
 
 
 class DocumentProcessor:
@@ -40,12 +50,29 @@ class DocumentProcessor:
     
     @staticmethod
     def _extract_pdf(file_path: Path) -> str:
-        """Extract text from PDF."""
-        text = []
+        """Extract text from PDF, splitting large files into page ranges across processes."""
         with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                text.append(page.extract_text())
+            page_count = len(PyPDF2.PdfReader(file).pages)
+        
+        # Inside a pool worker the other cores are already busy, so never start a nested pool
+        if (Config.PDF_WORKERS <= 1 or page_count < Config.PDF_PARALLEL_MIN_PAGES
+                or multiprocessing.parent_process() is not None):
+            return '\n\n'.join(_extract_pdf_pages(file_path, 0, page_count))
+        
+        # One contiguous page range per worker, reassembled in page order
+        workers = min(Config.PDF_WORKERS, page_count)
+        bounds = [page_count * i // workers for i in range(workers + 1)]
+        # Spawned, not forked: the calling process may be running other threads
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            parts = pool.map(
+                _extract_pdf_pages,
+                [file_path] * workers,
+                bounds[:-1],
+                bounds[1:]
+            )
+            text = [page for part in parts for page in part]
+        
         return '\n\n'.join(text)
     
     @staticmethod
@@ -141,25 +168,28 @@ class DocumentProcessor:
     @staticmethod
     def process_document(file_path: Path, chunk_size: int = 1000, 
                         overlap: int = 200) -> Dict:
-        """Process a document: extract text and create chunks."""
+        """Process a document: extract text and create chunks.
+        
+        success is False only if the text could not be extracted; a document
+        with no text succeeds with no chunks. The text itself is not returned,
+        so results stay small when they come back from a worker process.
+        """
         text = DocumentProcessor.extract_text(file_path)
         
-        if not text:
+        if text is None:
             return {
                 'file_path': str(file_path),
                 'file_name': file_path.name,
                 'success': False,
-                'text': None,
                 'chunks': []
             }
         
-        chunks = DocumentProcessor.chunk_text(text, chunk_size, overlap)
+        chunks = DocumentProcessor.chunk_text(text, chunk_size, overlap) if text.strip() else []
         
         return {
             'file_path': str(file_path),
             'file_name': file_path.name,
             'success': True,
-            'text': text,
             'chunks': chunks,
             'num_chunks': len(chunks)
         }
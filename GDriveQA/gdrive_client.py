@@ -1,25 +1,64 @@
 """Google Drive API client for file operations."""
+import json
 import pickle
 import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional, Set, Tuple
+import google_auth_httplib2
+import httplib2
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build, build_from_document
 from googleapiclient.http import MediaIoBaseDownload
-import io
 from tqdm import tqdm
 from config import Config
 
 
+# File fields used for syncing; md5Checksum only exists for binary files
+FILE_FIELDS = "id, name, mimeType, modifiedTime, md5Checksum, size, parents"
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+# Largest page files.list and changes.list will return
+MAX_PAGE_SIZE = 1000
+
+# Most calls the Drive batch endpoint accepts in one HTTP request
+MAX_BATCH_SIZE = 100
+
+# Folders whose children are listed by one files.list query
+PARENTS_PER_QUERY = 20
+
+# Sidecar in each file's directory recording which Drive version is stored there
+VERSION_FILE = '.drive-version.json'
+
+
 class GDriveClient:
     """Client for interacting with Google Drive API."""
     
-    def __init__(self):
-        self.service = None
+    def __init__(self, service=None, folder_ids: List[str] = None, shared_drive_id: str = None):
+        """Authenticate, or use an already built Drive service (e.g. one pointed at a test server).
+        
+        An injected service must come from googleapiclient: worker threads
+        rebuild it from its discovery document, with their own HTTP client.
+        
+        folder_ids and shared_drive_id limit syncing to those folders and
+        everything below them, or to one shared drive; they default to
+        Config.DRIVE_FOLDER_IDS and Config.SHARED_DRIVE_ID.
+        """
+        self.service = service
+        self.folder_ids = list(Config.DRIVE_FOLDER_IDS if folder_ids is None else folder_ids)
+        self.shared_drive_id = shared_drive_id or Config.SHARED_DRIVE_ID
         self.creds = None
-        self._authenticate()
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.cache_hits = 0
+        if service is None:
+            self._authenticate()
     
     def _authenticate(self):
         """Authenticate with Google Drive API."""
@@ -51,8 +90,30 @@ class GDriveClient:
         
         self.service = build('drive', 'v3', credentials=self.creds)
     
-    def list_files(self, query: Optional[str] = None, page_size: int = 100) -> List[Dict]:
-        """List files from Google Drive."""
+    def _thread_service(self):
+        """Drive service for the calling thread; the underlying HTTP client is not thread-safe."""
+        if threading.current_thread() is threading.main_thread():
+            return self.service
+        
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            service = self._local.service = self._new_service()
+        return service
+    
+    def _new_service(self):
+        """Build another Drive service like self.service, with its own HTTP client."""
+        if self.creds is not None:
+            return build('drive', 'v3', credentials=self.creds, cache_discovery=False)
+        
+        # An injected service: reuse its discovery document (and so its endpoint)
+        # and credentials, but never its HTTP client
+        http = httplib2.Http()
+        if isinstance(self.service._http, google_auth_httplib2.AuthorizedHttp):
+            http = google_auth_httplib2.AuthorizedHttp(self.service._http.credentials, http=http)
+        return build_from_document(self.service._rootDesc, http=http)
+    
+    def list_files(self, query: Optional[str] = None, page_size: int = MAX_PAGE_SIZE) -> List[Dict]:
+        """List files from Google Drive, fetching only FILE_FIELDS."""
         files = []
         page_token = None
         
@@ -63,66 +124,305 @@ class GDriveClient:
         
         print("Fetching files from Google Drive...")
         
+        try:
+            for file in self._list_pages(query, page_size):
+                files.append(file)
+        except Exception as e:
+            print(f"Error fetching files: {e}")
+        
+        print(f"Found {len(files)} files")
+        return files
+    
+    @property
+    def scope(self) -> Dict:
+        """The part of Drive being synced."""
+        return {'folder_ids': sorted(self.folder_ids), 'shared_drive_id': self.shared_drive_id}
+    
+    def _list_params(self) -> Dict:
+        """files.list parameters that search the synced drive."""
+        if self.shared_drive_id:
+            return {'corpora': 'drive', 'driveId': self.shared_drive_id,
+                    'includeItemsFromAllDrives': True, 'supportsAllDrives': True}
+        # Folders in a shared drive need shared_drive_id: searching every drive
+        # can come back incomplete
+        return {'corpora': 'user', 'supportsAllDrives': True}
+    
+    def _list_pages(self, query: str, page_size: int = MAX_PAGE_SIZE) -> Iterator[Dict]:
+        """Yield every file matching a query, raising on errors. Safe to call from several threads."""
+        service = self._thread_service()
+        page_token = None
+        
         while True:
-            try:
-                results = self.service.files().list(
-                    q=query,
-                    pageSize=page_size,
-                    pageToken=page_token,
-                    fields="nextPageToken, files(id, name, mimeType, modifiedTime, size, webViewLink, parents)"
-                ).execute()
-                
-                items = results.get('files', [])
-                files.extend(items)
-                
-                page_token = results.get('nextPageToken')
-                if not page_token:
-                    break
-                    
-            except Exception as e:
-                print(f"Error fetching files: {e}")
-                break
+            results = service.files().list(
+                q=query,
+                pageSize=page_size,
+                pageToken=page_token,
+                fields=f"nextPageToken, incompleteSearch, files({FILE_FIELDS})",
+                **self._list_params()
+            ).execute()
+            
+            if results.get('incompleteSearch'):
+                raise RuntimeError(f"Drive returned incomplete results for: {query}")
+            
+            yield from results.get('files', [])
+            
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return
+    
+    @staticmethod
+    def _supported_types_query() -> str:
+        """Query condition matching every supported MIME type."""
+        mime_conditions = [f"mimeType='{mime}'" for mime in Config.SUPPORTED_MIME_TYPES.keys()]
+        return f"({' or '.join(mime_conditions)})"
+    
+    def list_supported_files(self) -> List[Dict]:
+        """List every file in the synced folders or drive that can be indexed.
+        
+        Unlike list_files, errors are raised so a partial listing is never
+        mistaken for files having been removed.
+        """
+        if self.folder_ids:
+            print("Fetching files from Google Drive folders...")
+            files, folders = self.list_folder_tree()
+            print(f"Found {len(files)} files in {len(folders)} folders")
+            return files
         
+        print("Fetching files from Google Drive...")
+        query = f"trashed=false and {self._supported_types_query()}"
+        files = [f for f in self._list_pages(query) if self.is_supported(f)]
         print(f"Found {len(files)} files")
         return files
     
+    def list_folder_tree(self, folder_ids: List[str] = None) -> Tuple[List[Dict], Set[str]]:
+        """List the supported files in folders and all of their subfolders.
+        
+        The tree is walked breadth-first on Config.LIST_WORKERS threads, with
+        each query covering up to PARENTS_PER_QUERY folders, so the cost
+        follows the size of the subtree rather than of the whole Drive.
+        Returns the files and the IDs of every folder visited, the roots
+        included. Errors are raised so a partial listing is never mistaken
+        for files having been removed.
+        """
+        folder_ids = list(dict.fromkeys(folder_ids or self.folder_ids))
+        folders = set(folder_ids)
+        files = {}
+        
+        with ThreadPoolExecutor(max_workers=Config.LIST_WORKERS) as pool:
+            pending = {pool.submit(self._list_children, ids) for ids in self._parent_groups(folder_ids)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    subfolders = []
+                    for child in future.result():
+                        if child['mimeType'] == FOLDER_MIME_TYPE:
+                            # Folders can have several parents; visit each once
+                            if child['id'] not in folders:
+                                folders.add(child['id'])
+                                subfolders.append(child['id'])
+                        elif self.is_supported(child):
+                            files[child['id']] = child
+                    
+                    pending.update(pool.submit(self._list_children, ids)
+                                   for ids in self._parent_groups(subfolders))
+        
+        return list(files.values()), folders
+    
+    @staticmethod
+    def _parent_groups(folder_ids: List[str]) -> List[List[str]]:
+        """Split folder IDs into groups listed by one query each."""
+        return [folder_ids[i:i + PARENTS_PER_QUERY] for i in range(0, len(folder_ids), PARENTS_PER_QUERY)]
+    
+    def _list_children(self, folder_ids: List[str]) -> List[Dict]:
+        """List the subfolders and supported files directly inside some folders."""
+        parents = ' or '.join(f"'{folder_id}' in parents" for folder_id in folder_ids)
+        query = (f"trashed=false and ({parents}) and "
+                 f"(mimeType='{FOLDER_MIME_TYPE}' or {self._supported_types_query()})")
+        return list(self._list_pages(query))
+    
+    @staticmethod
+    def is_supported(file: Dict) -> bool:
+        """Whether a file can be indexed: a supported type, not trashed and not too large."""
+        if file.get('trashed') or file.get('mimeType') not in Config.SUPPORTED_MIME_TYPES:
+            return False
+        return not file.get('size') or int(file['size']) <= Config.MAX_FILE_SIZE_BYTES
+    
+    def get_start_page_token(self) -> str:
+        """Page token marking the current point in the Drive changes feed."""
+        params = {'driveId': self.shared_drive_id} if self.shared_drive_id else {}
+        return self.service.changes().getStartPageToken(
+            supportsAllDrives=True, **params
+        ).execute()['startPageToken']
+    
+    def list_changes(self, page_token: str) -> Tuple[List[Dict], str]:
+        """List changes since a page token.
+        
+        Returns the changes, oldest first, and the page token to resume from
+        next time. Errors are raised so the caller never skips changes.
+        """
+        changes = []
+        params = {'supportsAllDrives': True}
+        if self.shared_drive_id:
+            params.update(driveId=self.shared_drive_id, includeItemsFromAllDrives=True)
+        elif self.folder_ids:
+            params['includeItemsFromAllDrives'] = True
+        
+        while True:
+            results = self.service.changes().list(
+                pageToken=page_token,
+                pageSize=MAX_PAGE_SIZE,
+                includeRemoved=True,
+                spaces='drive',
+                fields=f"nextPageToken, newStartPageToken, changes(fileId, removed, file({FILE_FIELDS}, trashed))",
+                **params
+            ).execute()
+            
+            changes.extend(results.get('changes', []))
+            
+            if 'newStartPageToken' in results:
+                return changes, results['newStartPageToken']
+            page_token = results['nextPageToken']
+    
+    @staticmethod
+    def file_version(file: Dict) -> Optional[str]:
+        """Content version of a Drive file: its checksum, or modifiedTime for Google Docs."""
+        return file.get('md5Checksum') or file.get('modifiedTime')
+    
+    @staticmethod
+    def local_dir(file_id: str, destination: Path = None) -> Path:
+        """Directory holding the local copy of a Drive file."""
+        return Path(destination or Config.STORAGE_PATH) / file_id
+    
+    @staticmethod
+    def remove_local_copy(file_id: str, destination: Path = None):
+        """Delete the local copy of a Drive file."""
+        shutil.rmtree(GDriveClient.local_dir(file_id, destination), ignore_errors=True)
+    
     def download_file(self, file_id: str, file_name: str, mime_type: str, 
-                     destination: Path) -> Optional[Path]:
-        """Download a file from Google Drive."""
+                     destination: Path, version: str = None) -> Optional[Path]:
+        """Download a file from Google Drive.
+        
+        Each file is kept in its own directory under destination, named after
+        its Drive ID, so files sharing a name never overwrite each other. When
+        version (see file_version) matches the local copy, nothing is
+        downloaded or exported; a renamed file is just renamed locally.
+        
+        The file is streamed to a temporary file next to its destination in
+        chunks of Config.DOWNLOAD_CHUNK_SIZE, then renamed into place, so
+        memory use does not grow with file size and readers never see a
+        partial file. Safe to call from several threads at once.
+        """
+        # Exported Google Workspace files take the extension of their export format
+        if mime_type in Config.EXPORT_MIME_TYPES:
+            file_name = Path(file_name).stem + Config.SUPPORTED_MIME_TYPES[mime_type]
+        
+        file_dir = self.local_dir(file_id, destination)
+        file_path = file_dir / file_name
+        
+        cached_path = self._cached_copy(file_dir, file_name, version)
+        if cached_path:
+            with self._stats_lock:
+                self.cache_hits += 1
+            return cached_path
+        
+        temp_path = None
         try:
+            service = self._thread_service()
+            
             # Handle Google Workspace files (Docs, Sheets, Slides)
             if mime_type in Config.EXPORT_MIME_TYPES:
                 export_mime = Config.EXPORT_MIME_TYPES[mime_type]
-                request = self.service.files().export_media(
+                request = service.files().export_media(
                     fileId=file_id,
                     mimeType=export_mime
                 )
-                # Update file extension
-                file_name = Path(file_name).stem + Config.SUPPORTED_MIME_TYPES[mime_type]
             else:
-                request = self.service.files().get_media(fileId=file_id)
+                request = service.files().get_media(fileId=file_id, supportsAllDrives=True)
             
             # Download file
-            file_path = destination / file_name
-            file_path.parent.mkdir(parents=True, exist_ok=True)
+            file_dir.mkdir(parents=True, exist_ok=True)
             
-            fh = io.BytesIO()
-            downloader = MediaIoBaseDownload(fh, request)
+            with tempfile.NamedTemporaryFile(
+                dir=file_dir, prefix=f".{file_name}.", suffix='.part', delete=False
+            ) as fh:
+                temp_path = fh.name
+                downloader = MediaIoBaseDownload(fh, request, chunksize=Config.DOWNLOAD_CHUNK_SIZE)
+                
+                done = False
+                while not done:
+                    status, done = downloader.next_chunk()
             
-            done = False
-            while not done:
-                status, done = downloader.next_chunk()
+            os.replace(temp_path, file_path)
             
-            # Write to file
-            with open(file_path, 'wb') as f:
-                f.write(fh.getvalue())
+            # Drop copies saved under an earlier name of the file
+            for path in file_dir.iterdir():
+                if path != file_path and not path.name.startswith('.'):
+                    path.unlink()
             
+            self._write_version(file_dir, file_name, version)
             return file_path
             
         except Exception as e:
             print(f"Error downloading {file_name}: {e}")
+            if temp_path:
+                try:
+                    os.remove(temp_path)
+                except FileNotFoundError:
+                    pass
             return None
     
+    def _cached_copy(self, file_dir: Path, file_name: str, version: Optional[str]) -> Optional[Path]:
+        """Return the local copy if it is the given version, renamed to file_name."""
+        if version is None:
+            return None
+        
+        try:
+            with open(file_dir / VERSION_FILE, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        
+        cached_path = file_dir / cached.get('name', '')
+        if cached.get('version') != version or not cached_path.is_file():
+            return None
+        
+        file_path = file_dir / file_name
+        if cached_path != file_path:
+            os.replace(cached_path, file_path)
+            self._write_version(file_dir, file_name, version)
+        return file_path
+    
+    @staticmethod
+    def _write_version(file_dir: Path, file_name: str, version: Optional[str]):
+        """Record which version of the file the local copy is."""
+        version_path = file_dir / VERSION_FILE
+        if version is None:
+            version_path.unlink(missing_ok=True)
+            return
+        
+        temp_path = version_path.with_suffix('.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'name': file_name, 'version': version}, f)
+        os.replace(temp_path, version_path)
+    
+    def download_files(self, files: List[Dict],
+                       destination: Path) -> Iterator[Tuple[Dict, Optional[Path]]]:
+        """Download files on a pool of Config.DOWNLOAD_WORKERS threads.
+        
+        Yields (file, local path) pairs as downloads finish, with a path of
+        None for files that failed.
+        """
+        with ThreadPoolExecutor(max_workers=Config.DOWNLOAD_WORKERS) as pool:
+            futures = {
+                pool.submit(
+                    self.download_file, file['id'], file['name'], file['mimeType'],
+                    destination, self.file_version(file)
+                ): file
+                for file in files
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+    
     def sync_files(self, destination: Path = None) -> List[Path]:
         """Sync all supported files from Google Drive."""
         if destination is None:
@@ -130,25 +430,13 @@ class GDriveClient:
         
         destination.mkdir(parents=True, exist_ok=True)
         
-        # Build query for supported file types
-        mime_conditions = [f"mimeType='{mime}'" for mime in Config.SUPPORTED_MIME_TYPES.keys()]
-        query = f"trashed=false and ({' or '.join(mime_conditions)})"
-        
-        files = self.list_files(query=query)
-        
-        # Filter by size
-        files = [f for f in files if not f.get('size') or int(f.get('size', 0)) <= Config.MAX_FILE_SIZE_BYTES]
+        files = self.list_supported_files()
         
         print(f"\nDownloading {len(files)} files...")
         downloaded_paths = []
         
-        for file in tqdm(files, desc="Downloading"):
-            file_path = self.download_file(
-                file['id'],
-                file['name'],
-                file['mimeType'],
-                destination
-            )
+        downloads = self.download_files(files, destination)
+        for file, file_path in tqdm(downloads, total=len(files), desc="Downloading"):
             if file_path:
                 downloaded_paths.append(file_path)
         
@@ -160,9 +448,44 @@ class GDriveClient:
         try:
             file = self.service.files().get(
                 fileId=file_id,
-                fields="id, name, mimeType, modifiedTime, size, webViewLink, parents"
+                fields=FILE_FIELDS,
+                supportsAllDrives=True
             ).execute()
             return file
         except Exception as e:
             print(f"Error getting file metadata: {e}")
             return None
+    
+    def get_files_metadata(self, file_ids: List[str]) -> Dict[str, Optional[Dict]]:
+        """Get metadata for many files, MAX_BATCH_SIZE per HTTP request.
+        
+        Uses the Drive batch endpoint, so n files cost n / MAX_BATCH_SIZE
+        round trips instead of n. Returns metadata by file ID, with None for
+        files that could not be fetched.
+        """
+        metadata = {}
+        
+        def handle_response(file_id, response, exception):
+            if exception is not None:
+                print(f"Error getting file metadata for {file_id}: {exception}")
+            metadata[file_id] = response if exception is None else None
+        
+        # Batch request IDs must be unique
+        file_ids = list(dict.fromkeys(file_ids))
+        for start in range(0, len(file_ids), MAX_BATCH_SIZE):
+            batch_ids = file_ids[start:start + MAX_BATCH_SIZE]
+            batch = self.service.new_batch_http_request(callback=handle_response)
+            for file_id in batch_ids:
+                batch.add(
+                    self.service.files().get(fileId=file_id, fields=FILE_FIELDS, supportsAllDrives=True),
+                    request_id=file_id
+                )
+            
+            try:
+                batch.execute()
+            except Exception as e:
+                print(f"Error getting file metadata: {e}")
+                for file_id in batch_ids:
+                    metadata.setdefault(file_id, None)
+        
+        return metadata
@@ -1,72 +1,108 @@
 """Document indexing pipeline."""
+import os
+from functools import cached_property
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional, Tuple
 from tqdm import tqdm
-from gdrive_client import GDriveClient
+from gdrive_client import FOLDER_MIME_TYPE, GDriveClient
 from document_processor import DocumentProcessor
+from indexing_pipeline import IndexingPipeline
 from vector_store import VectorStore
+from sync_manifest import SyncManifest
 from config import Config
 
 
 class DocumentIndexer:
     """Index documents from Google Drive into vector store."""
     
-    def __init__(self):
-        self.gdrive_client = GDriveClient()
-        self.processor = DocumentProcessor()
-        self.vector_store = VectorStore()
+    def __init__(self, vector_store: VectorStore = None):
+        # Pass the query engine's store to share its ChromaDB client
+        self.vector_store = vector_store or VectorStore()
+    
+    @cached_property
+    def gdrive_client(self) -> GDriveClient:
+        """Google Drive client, authenticated on first use."""
+        return GDriveClient()
+    
+    @cached_property
+    def processor(self) -> DocumentProcessor:
+        """Document processor, created on first use."""
+        return DocumentProcessor()
     
     def sync_and_index(self, force_reindex: bool = False):
-        """Sync files from Google Drive and index them."""
+        """Sync changed files from Google Drive and index them.
+        
+        The first run (or force_reindex) lists the synced folders, shared
+        drive or whole Drive (see Config.DRIVE_FOLDER_IDS); later runs read
+        the Drive changes feed from the page token in the sync manifest.
+        Only added or modified files are downloaded and re-indexed, and
+        removed ones are deleted. The page token only advances once every
+        change was applied, so failed files are retried on the next run.
+        Downloading, extraction and embedding run concurrently (see
+        IndexingPipeline).
+        """
         
         print("\n" + "="*60)
         print("GOOGLE DRIVE DOCUMENT INDEXER")
         print("="*60 + "\n")
         
-        # Step 1: Sync files from Google Drive
-        print("Step 1: Syncing files from Google Drive...")
-        downloaded_files = self.gdrive_client.sync_files()
+        manifest = SyncManifest(Config.SYNC_MANIFEST_PATH)
         
-        if not downloaded_files:
-            print("No files to index.")
+        # Step 1: Find what changed in Google Drive
+        print("Step 1: Checking Google Drive for changes...")
+        changed, removed, page_token = self._find_changes(manifest, force_reindex)
+        
+        if not changed and not removed:
+            print("Everything is up to date.")
+            self._advance(manifest, page_token)
+            manifest.save()
             return
         
-        # Step 2: Process and index documents
-        print(f"\nStep 2: Processing and indexing {len(downloaded_files)} documents...")
+        # Step 2: Download and index changed documents, drop removed ones
+        print(f"\nStep 2: Indexing {len(changed)} changed documents, removing {len(removed)}...")
         
         successful = 0
         failed = 0
+        pipeline = IndexingPipeline(self.gdrive_client, self.vector_store, Config.STORAGE_PATH)
+        cache_hits = self.gdrive_client.cache_hits
         
-        for file_path in tqdm(downloaded_files, desc="Indexing"):
-            try:
-                # Process document
-                result = self.processor.process_document(
-                    file_path,
-                    chunk_size=Config.CHUNK_SIZE,
-                    overlap=Config.CHUNK_OVERLAP
-                )
-                
-                if result['success'] and result['chunks']:
-                    # Add to vector store
-                    self.vector_store.add_document(
-                        file_path=result['file_path'],
-                        file_name=result['file_name'],
-                        chunks=result['chunks']
-                    )
+        try:
+            for file_id in removed:
+                self._remove_file(manifest, file_id)
+            
+            indexed = pipeline.run(changed)
+            for i, (file, file_path, chunk_ids) in enumerate(tqdm(indexed, total=len(changed), desc="Indexing"), 1):
+                if chunk_ids is not None:
+                    self._record_indexed(manifest, file, file_path, chunk_ids)
                     successful += 1
                 else:
                     failed += 1
-                    
-            except Exception as e:
-                print(f"\nError processing {file_path}: {e}")
-                failed += 1
+                
+                # Keep progress if a long sync is interrupted
+                if i % 50 == 0:
+                    manifest.save()
+            
+            # Files that failed, or were never reported, are retried from the same token
+            if successful == len(changed):
+                self._advance(manifest, page_token)
+        finally:
+            manifest.save()
         
         # Step 3: Show results
         print("\n" + "="*60)
         print("INDEXING COMPLETE")
         print("="*60)
         print(f"Successfully indexed: {successful} documents")
+        print(f"Removed: {len(removed)} documents")
         print(f"Failed: {failed} documents")
+        print(f"Reused unchanged local copies: {self.gdrive_client.cache_hits - cache_hits}")
+        
+        print("\nPipeline throughput:")
+        for stage, stage_stats in pipeline.stats().items():
+            unit = pipeline.counters[stage].unit
+            print(f"  - {stage}: {stage_stats['items']} files, {stage_stats[unit]} {unit} "
+                  f"in {stage_stats['seconds']}s ({stage_stats['items_per_second']} files/s, "
+                  f"{stage_stats[unit + '_per_second']} {unit}/s)")
         
         stats = self.vector_store.get_stats()
         print(f"\nVector Store Stats:")
@@ -74,6 +110,105 @@ class DocumentIndexer:
         print(f"  - Total files: {stats['total_files']}")
         print("="*60 + "\n")
     
+    def _find_changes(self, manifest: SyncManifest,
+                      full_scan: bool) -> Tuple[List[Dict], List[str], str]:
+        """Work out which files to index and which to remove.
+        
+        Returns the changed Drive files, the IDs of removed files and the
+        page token to store once they have been applied.
+        """
+        # A token from another scope may even belong to another drive's changes feed;
+        # manifests written before scopes existed synced the whole Drive
+        synced_scope = manifest.scope or {'folder_ids': [], 'shared_drive_id': None}
+        same_scope = synced_scope == self.gdrive_client.scope
+        if not full_scan and manifest.page_token and same_scope:
+            try:
+                changes = self._read_changes(manifest)
+                if changes is not None:
+                    return changes
+                print("Synced folders were added, moved or removed, rescanning them...")
+                
+            except Exception as e:
+                print(f"Error reading Drive changes, falling back to a full scan: {e}")
+        
+        # Take the token before listing so changes made meanwhile are seen next time.
+        # Listing errors propagate: files missing from a failed listing are not removed.
+        page_token = self.gdrive_client.get_start_page_token()
+        if self.gdrive_client.folder_ids:
+            files, folders = self.gdrive_client.list_folder_tree()
+            print(f"Found {len(files)} files in {len(folders)} folders")
+            manifest.folders = sorted(folders)
+        else:
+            files = self.gdrive_client.list_supported_files()
+            manifest.folders = []
+        
+        listed = {file['id'] for file in files}
+        removed = [file_id for file_id in manifest.file_ids() if file_id not in listed]
+        changed = [file for file in files if full_scan or not manifest.is_current(file)]
+        return changed, removed, page_token
+    
+    def _read_changes(self, manifest: SyncManifest) -> Optional[Tuple[List[Dict], List[str], str]]:
+        """Changes since the manifest's page token, limited to the synced folders.
+        
+        Returns None if a folder in the synced tree changed, since working
+        out which files moved with it needs a rescan of the folders.
+        """
+        changes, page_token = self.gdrive_client.list_changes(manifest.page_token)
+        folders = set(manifest.folders)
+        
+        # A file may change several times; its last state wins
+        latest = {}
+        for change in changes:
+            latest[change['fileId']] = change
+        
+        changed, removed = [], []
+        for file_id, change in latest.items():
+            file = change.get('file')
+            in_scope = bool(file) and (not folders or not folders.isdisjoint(file.get('parents', [])))
+            
+            if folders and (file_id in folders or (in_scope and file['mimeType'] == FOLDER_MIME_TYPE)):
+                return None
+            
+            if change.get('removed') or not in_scope or not self.gdrive_client.is_supported(file):
+                if file_id in manifest:
+                    removed.append(file_id)
+            elif not manifest.is_current(file):
+                changed.append(file)
+        
+        return changed, removed, page_token
+    
+    def _advance(self, manifest: SyncManifest, page_token: str):
+        """Resume the next sync from page_token."""
+        manifest.page_token = page_token
+        manifest.scope = self.gdrive_client.scope
+    
+    def _record_indexed(self, manifest: SyncManifest, file: Dict, file_path: Path, chunk_ids: List[str]):
+        """Record a newly indexed file, dropping what is left of its previous version."""
+        entry = manifest.get(file['id'])
+        if entry is not None:
+            # Chunks of the previous version that the new one no longer has
+            stale_ids = set(entry['chunk_ids']) - set(chunk_ids)
+            self.vector_store.delete_chunks(list(stale_ids))
+            if entry['local_path'] != str(file_path):
+                self._delete_local_file(entry['local_path'])
+        
+        manifest.record(file, file_path, chunk_ids)
+    
+    def _remove_file(self, manifest: SyncManifest, file_id: str):
+        """Delete a file that is gone from Drive from the index and local storage."""
+        entry = manifest.remove(file_id)
+        self.vector_store.delete_chunks(entry['chunk_ids'])
+        self._delete_local_file(entry['local_path'])
+        GDriveClient.remove_local_copy(file_id, Config.STORAGE_PATH)
+    
+    @staticmethod
+    def _delete_local_file(local_path: str):
+        """Delete a downloaded copy, ignoring files that are already gone."""
+        try:
+            os.remove(local_path)
+        except FileNotFoundError:
+            pass
+    
     def index_local_files(self, directory: Path):
         """Index files from a local directory."""
         print(f"\nIndexing files from {directory}...")
@@ -104,4 +239,6 @@ class DocumentIndexer:
         """Clear all indexed documents."""
         print("\nClearing vector store...")
         self.vector_store.clear_all()
+        # Without its manifest the next sync re-indexes everything
+        Config.SYNC_MANIFEST_PATH.unlink(missing_ok=True)
         print("Vector store cleared.")
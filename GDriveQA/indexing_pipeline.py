@@ -0,0 +1,245 @@
+"""Concurrent download, extraction and embedding of Google Drive files."""
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from config import Config
+from document_processor import DocumentProcessor
+
+# Marks the end of a queue's input
+_DONE = object()
+
+
+class StageCounter:
+    """Thread-safe throughput counter for one pipeline stage."""
+
+    def __init__(self, name: str, unit: str):
+        self.name = name
+        self.unit = unit
+        self.items = 0
+        self.units = 0
+        self.busy_seconds = 0.0
+        self.first_started = None
+        self.last_finished = None
+        self._lock = threading.Lock()
+
+    def record(self, started: float, items: int = 1, units: int = 0):
+        """Count work that began at the time.perf_counter() reading started."""
+        finished = time.perf_counter()
+        with self._lock:
+            self.items += items
+            self.units += units
+            self.busy_seconds += finished - started
+            if self.first_started is None or started < self.first_started:
+                self.first_started = started
+            self.last_finished = finished
+
+    def summary(self) -> Dict:
+        """Totals and rates over the stage's active time."""
+        seconds = (self.last_finished - self.first_started) if self.items else 0.0
+        return {
+            'items': self.items,
+            self.unit: self.units,
+            'seconds': round(seconds, 2),
+            'busy_seconds': round(self.busy_seconds, 2),
+            'items_per_second': round(self.items / seconds, 2) if seconds else 0.0,
+            f'{self.unit}_per_second': round(self.units / seconds, 2) if seconds else 0.0
+        }
+
+
+class IndexingPipeline:
+    """
+    Download, extract and embed Drive files with every stage running at once.
+
+    Download threads feed extraction workers through a bounded queue, and
+    extraction workers feed the embedder through another, so a slow stage
+    holds back the ones before it instead of letting files pile up. The
+    embedder runs in the caller's thread and stores whatever documents are
+    ready in one batch, so results can be handled without extra locking.
+    """
+
+    def __init__(self, gdrive_client, vector_store, destination: Path = None,
+                 download_workers: int = None, extract_workers: int = None,
+                 queue_size: int = None):
+        self.gdrive_client = gdrive_client
+        self.vector_store = vector_store
+        self.destination = destination or Config.STORAGE_PATH
+        self.download_workers = download_workers or Config.DOWNLOAD_WORKERS
+        self.extract_workers = extract_workers or Config.EXTRACT_WORKERS
+        self.queue_size = queue_size or Config.PIPELINE_QUEUE_SIZE
+
+        self.counters = {
+            'download': StageCounter('download', 'bytes'),
+            'extract': StageCounter('extract', 'chunks'),
+            'embed': StageCounter('embed', 'chunks')
+        }
+        self._stop = threading.Event()
+
+    def run(self, files: List[Dict]) -> Iterator[Tuple[Dict, Optional[Path], Optional[List[str]]]]:
+        """Index files, yielding (file, local path, chunk IDs) as each one finishes.
+
+        The path is None if the download failed. The chunk IDs are None if
+        the file could not be downloaded, extracted or stored, and empty only
+        if its text was extracted and there is none to index.
+        """
+        pending = queue.Queue()
+        for file in files:
+            pending.put(file)
+        extract_queue = queue.Queue(maxsize=self.queue_size)
+        embed_queue = queue.Queue(maxsize=self.queue_size)
+        self._stop.clear()
+
+        # Spawned, not forked: workers start while download and embedding threads are running
+        with ProcessPoolExecutor(max_workers=self.extract_workers,
+                                 mp_context=multiprocessing.get_context('spawn')) as extract_pool:
+            downloaders = self._start(self.download_workers, self._download_worker, pending, extract_queue)
+            extractors = self._start(self.extract_workers, self._extract_worker, extract_queue,
+                                     embed_queue, extract_pool)
+            # Close each queue once every thread feeding it has finished
+            self._start(1, self._close_when_done, downloaders, extract_queue, self.extract_workers)
+            self._start(1, self._close_when_done, extractors, embed_queue, 1)
+
+            try:
+                yield from self._embed(embed_queue)
+            finally:
+                # Unblock the workers if the caller stops early
+                self._stop.set()
+
+    def stats(self) -> Dict[str, Dict]:
+        """Throughput of each stage so far."""
+        return {name: counter.summary() for name, counter in self.counters.items()}
+
+    def _start(self, count: int, target, *args) -> List[threading.Thread]:
+        """Start worker threads."""
+        threads = [threading.Thread(target=target, args=args, daemon=True) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def _put(self, target: queue.Queue, item) -> bool:
+        """Put an item, waiting for space unless the pipeline is stopping."""
+        while not self._stop.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source: queue.Queue):
+        """Take an item, waiting for one unless the pipeline is stopping."""
+        while not self._stop.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _close_when_done(self, threads: List[threading.Thread], target: queue.Queue, consumers: int):
+        """Wait for the producers of a queue, then tell each consumer it has ended."""
+        for thread in threads:
+            thread.join()
+        for _ in range(consumers):
+            self._put(target, _DONE)
+
+    def _download_worker(self, pending: queue.Queue, extract_queue: queue.Queue):
+        """Download files until none are left."""
+        while not self._stop.is_set():
+            try:
+                file = pending.get_nowait()
+            except queue.Empty:
+                return
+
+            started = time.perf_counter()
+            try:
+                file_path = self.gdrive_client.download_file(
+                    file['id'], file['name'], file['mimeType'], self.destination,
+                    self.gdrive_client.file_version(file)
+                )
+                if file_path:
+                    self.counters['download'].record(started, units=os.path.getsize(file_path))
+            except Exception as e:
+                # Passed on without a path so the file is reported as failed
+                print(f"\nError downloading {file['name']}: {e}")
+                file_path = None
+
+            if not self._put(extract_queue, (file, file_path)):
+                return
+
+    def _extract_worker(self, extract_queue: queue.Queue, embed_queue: queue.Queue,
+                        extract_pool: ProcessPoolExecutor):
+        """Extract and chunk downloaded files in the process pool."""
+        while True:
+            item = self._get(extract_queue)
+            if item is _DONE:
+                return
+
+            file, file_path = item
+            result = None
+            if file_path:
+                started = time.perf_counter()
+                try:
+                    result = extract_pool.submit(
+                        DocumentProcessor.process_document,
+                        file_path, Config.CHUNK_SIZE, Config.CHUNK_OVERLAP
+                    ).result()
+                    self.counters['extract'].record(started, units=len(result['chunks']))
+                except Exception as e:
+                    print(f"\nError processing {file['name']}: {e}")
+
+            if not self._put(embed_queue, (file, file_path, result)):
+                return
+
+    def _embed(self, embed_queue: queue.Queue) -> Iterator[Tuple[Dict, Optional[Path], Optional[List[str]]]]:
+        """Embed extracted documents in batches of whatever is ready."""
+        done = False
+        while not done:
+            item = embed_queue.get()
+            if item is _DONE:
+                return
+
+            # Take whatever else is ready, up to a full embedding batch
+            ready = [item]
+            chunk_count = len(item[2]['chunks']) if item[2] else 0
+            while chunk_count < Config.EMBED_BATCH_SIZE:
+                try:
+                    item = embed_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _DONE:
+                    done = True
+                    break
+                ready.append(item)
+                chunk_count += len(item[2]['chunks']) if item[2] else 0
+
+            indexable = [
+                (file, file_path, result) for file, file_path, result in ready
+                if result and result['success'] and result['chunks']
+            ]
+
+            stored = {}
+            if indexable:
+                started = time.perf_counter()
+                chunk_ids = self.vector_store.add_documents([result for _, _, result in indexable])
+                for (file, _, _), ids in zip(indexable, chunk_ids):
+                    stored[file['id']] = ids
+                
+                succeeded = [ids for ids in chunk_ids if ids is not None]
+                if succeeded:
+                    self.counters['embed'].record(
+                        started, items=len(succeeded), units=sum(len(ids) for ids in succeeded)
+                    )
+
+            for file, file_path, result in ready:
+                if file['id'] in stored:
+                    yield file, file_path, stored[file['id']]
+                elif result is not None and result['success']:
+                    # Extracted but with no text: recorded as indexed so it is not retried
+                    yield file, file_path, []
+                else:
+                    # Extraction failed: left pending so the next sync retries it
+                    yield file, file_path, None
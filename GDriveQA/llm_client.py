@@ -1,6 +1,11 @@
 """LLM client for answering questions based on context."""
-from typing import List, Dict, Optional
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import List, Dict, Optional, Tuple
 from config import Config
+from context_packer import ContextPacker
+import httpx
 import openai
 import anthropic
 
@@ -13,32 +18,53 @@ class LLMClient:
         self.model = Config.LLM_MODEL
         
         if self.provider == 'openai':
-            openai.api_key = Config.OPENAI_API_KEY
             self.client = openai.OpenAI(api_key=Config.OPENAI_API_KEY)
         elif self.provider == 'anthropic':
             self.client = anthropic.Anthropic(api_key=Config.ANTHROPIC_API_KEY)
         else:
             raise ValueError(f"Unsupported LLM provider: {self.provider}")
+        
+        self.packer = ContextPacker(
+            token_budget=Config.CONTEXT_TOKEN_BUDGET,
+            model=self.model,
+            max_overlap=Config.CHUNK_OVERLAP
+        )
     
     def answer_question(self, question: str, context_chunks: List[Dict], 
-                       max_context_length: int = 8000) -> Dict:
+                       max_context_tokens: int = None) -> Dict:
         """Answer a question using retrieved context."""
+        system_prompt, user_prompt, packed = self._build_prompts(
+            question, context_chunks, max_context_tokens
+        )
         
-        # Prepare context
-        context_parts = []
-        total_length = 0
-        
-        for i, chunk in enumerate(context_chunks):
-            chunk_text = f"[Document: {chunk['file_name']}]\n{chunk['text']}\n"
-            chunk_length = len(chunk_text)
+        # Get response from LLM
+        try:
+            if self.provider == 'openai':
+                response = self._openai_call(system_prompt, user_prompt)
+            else:  # anthropic
+                response = self._anthropic_call(system_prompt, user_prompt)
             
-            if total_length + chunk_length > max_context_length:
-                break
+            return self._answer_result(response, context_chunks, packed)
             
-            context_parts.append(chunk_text)
-            total_length += chunk_length
-        
-        context = "\n---\n".join(context_parts)
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'answer': None
+            }
+    
+    def _build_prompts(self, question: str, context_chunks: List[Dict],
+                       max_context_tokens: int = None) -> Tuple[str, str, Dict]:
+        """Build the system and user prompts, packing the context into the token budget."""
+        # Prepare context
+        separator = "\n\n---\n"
+        packed = self.packer.pack(
+            [chunk['text'] for chunk in context_chunks],
+            headers=[f"[Document: {chunk['file_name']}]\n" for chunk in context_chunks],
+            separator=separator,
+            token_budget=max_context_tokens
+        )
+        context = separator.join(packed['parts'])
         
         # Create prompt
         system_prompt = """You are a helpful assistant that answers questions based on the provided documents. 
@@ -55,49 +81,170 @@ Question: {question}
 
 Please answer the question based on the context above."""
         
-        # Get response from LLM
-        try:
-            if self.provider == 'openai':
-                response = self._openai_call(system_prompt, user_prompt)
-            else:  # anthropic
-                response = self._anthropic_call(system_prompt, user_prompt)
-            
-            return {
-                'success': True,
-                'answer': response,
-                'sources': [chunk['file_name'] for chunk in context_chunks],
-                'num_sources': len(context_parts)
-            }
-            
-        except Exception as e:
-            return {
-                'success': False,
-                'error': str(e),
-                'answer': None
+        return system_prompt, user_prompt, packed
+    
+    def _answer_result(self, answer: str, context_chunks: List[Dict], packed: Dict) -> Dict:
+        """Build the result dictionary for a successful answer, citing only the chunks the LLM saw."""
+        return {
+            'success': True,
+            'answer': answer,
+            'sources': [context_chunks[i]['file_name'] for i in packed['indices']],
+            'num_sources': len(packed['indices']),
+            'context_tokens': {
+                'tokens': packed['tokens'],
+                'unpacked_tokens': packed['unpacked_tokens'],
+                'tokens_saved': packed['tokens_saved']
             }
+        }
     
-    def _openai_call(self, system_prompt: str, user_prompt: str) -> str:
-        """Make call to OpenAI API."""
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[
+    def _openai_request(self, system_prompt: str, user_prompt: str) -> Dict:
+        """Build the arguments of an OpenAI chat completion request."""
+        return {
+            'model': self.model,
+            'messages': [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
-            temperature=0.3,
-            max_tokens=1500
-        )
+            'temperature': 0.3,
+            'max_tokens': 1500
+        }
+    
+    def _anthropic_request(self, system_prompt: str, user_prompt: str) -> Dict:
+        """Build the arguments of an Anthropic messages request."""
+        return {
+            'model': self.model,
+            'max_tokens': 1500,
+            'temperature': 0.3,
+            'system': system_prompt,
+            'messages': [
+                {"role": "user", "content": user_prompt}
+            ]
+        }
+    
+    def _openai_call(self, system_prompt: str, user_prompt: str) -> str:
+        """Make call to OpenAI API."""
+        response = self.client.chat.completions.create(**self._openai_request(system_prompt, user_prompt))
         return response.choices[0].message.content
     
     def _anthropic_call(self, system_prompt: str, user_prompt: str) -> str:
         """Make call to Anthropic API."""
-        message = self.client.messages.create(
-            model=self.model,
-            max_tokens=1500,
-            temperature=0.3,
-            system=system_prompt,
-            messages=[
-                {"role": "user", "content": user_prompt}
-            ]
-        )
+        message = self.client.messages.create(**self._anthropic_request(system_prompt, user_prompt))
         return message.content[0].text
+
+
+class AsyncLLMClient(LLMClient):
+    """
+    LLM client that serves many concurrent requests from one connection pool.
+    
+    The asynchronous SDK clients and their HTTP connection pool live on a
+    private event loop running in a background thread, so coroutines on any
+    other loop and plain threads can all share them. At most max_concurrency
+    requests are in flight at once and, when requests_per_minute is set,
+    request starts are spaced to stay under that rate; the rest wait their turn.
+    """
+    
+    def __init__(self, max_concurrency: int = None, requests_per_minute: int = None):
+        super().__init__()
+        self.max_concurrency = max_concurrency or Config.LLM_MAX_CONCURRENCY
+        self.requests_per_minute = requests_per_minute or Config.LLM_REQUESTS_PER_MINUTE
+        
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='llm-client', daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._open(), self._loop).result()
+    
+    async def _open(self):
+        """Create the pooled clients on the client's event loop."""
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._rate_lock = asyncio.Lock()
+        self._next_request_at = 0.0
+        self._http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency
+            )
+        )
+        
+        if self.provider == 'openai':
+            self.async_client = openai.AsyncOpenAI(
+                api_key=Config.OPENAI_API_KEY, http_client=self._http_client
+            )
+        else:
+            self.async_client = anthropic.AsyncAnthropic(
+                api_key=Config.ANTHROPIC_API_KEY, http_client=self._http_client
+            )
+    
+    async def aanswer_question(self, question: str, context_chunks: List[Dict],
+                               max_context_tokens: int = None) -> Dict:
+        """Answer a question without blocking the caller's event loop."""
+        future = asyncio.run_coroutine_threadsafe(
+            self._aanswer(question, context_chunks, max_context_tokens), self._loop
+        )
+        return await asyncio.wrap_future(future)
+    
+    def submit_question(self, question: str, context_chunks: List[Dict],
+                        max_context_tokens: int = None) -> Future:
+        """Start answering a question and return a future for the result."""
+        return asyncio.run_coroutine_threadsafe(
+            self._aanswer(question, context_chunks, max_context_tokens), self._loop
+        )
+    
+    def answer_questions(self, requests: List[Tuple[str, List[Dict]]],
+                         max_context_tokens: int = None) -> List[Dict]:
+        """Answer many (question, context_chunks) pairs concurrently, in order."""
+        async def gather():
+            return await asyncio.gather(*(
+                self._aanswer(question, context_chunks, max_context_tokens)
+                for question, context_chunks in requests
+            ))
+        
+        return asyncio.run_coroutine_threadsafe(gather(), self._loop).result()
+    
+    def close(self):
+        """Close the connection pool and stop the event loop."""
+        asyncio.run_coroutine_threadsafe(self._http_client.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+    
+    async def _throttle(self):
+        """Wait for the next request slot allowed by requests_per_minute."""
+        if not self.requests_per_minute:
+            return
+        
+        async with self._rate_lock:
+            now = self._loop.time()
+            wait = self._next_request_at - now
+            self._next_request_at = max(now, self._next_request_at) + 60 / self.requests_per_minute
+        
+        if wait > 0:
+            await asyncio.sleep(wait)
+    
+    async def _aanswer(self, question: str, context_chunks: List[Dict],
+                       max_context_tokens: int) -> Dict:
+        """Answer a question on the client's event loop."""
+        system_prompt, user_prompt, packed = self._build_prompts(
+            question, context_chunks, max_context_tokens
+        )
+        
+        try:
+            async with self._semaphore:
+                await self._throttle()
+                if self.provider == 'openai':
+                    response = await self.async_client.chat.completions.create(
+                        **self._openai_request(system_prompt, user_prompt)
+                    )
+                    answer = response.choices[0].message.content
+                else:  # anthropic
+                    message = await self.async_client.messages.create(
+                        **self._anthropic_request(system_prompt, user_prompt)
+                    )
+                    answer = message.content[0].text
+            
+            return self._answer_result(answer, context_chunks, packed)
+            
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'answer': None
+            }
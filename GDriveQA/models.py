@@ -0,0 +1,45 @@
+"""Process-wide cache of lazily loaded models.
+
+Importing sentence_transformers pulls in torch, which dominates start-up
+time, so nothing is imported until a model is first requested. Each model
+is loaded at most once per process and shared by every caller.
+"""
+import threading
+from typing import Callable, Dict, Tuple
+
+_models: Dict[Tuple[str, str], object] = {}
+_lock = threading.Lock()
+
+
+def get_embedding_model(model_name: str):
+    """Return the shared SentenceTransformer for a model, loading it on first use."""
+    def load():
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+
+    return _get_model(('embedding', model_name), load)
+
+
+def get_cross_encoder(model_name: str):
+    """Return the shared CrossEncoder for a model, loading it on first use."""
+    def load():
+        from sentence_transformers import CrossEncoder
+        return CrossEncoder(model_name, device='cpu')
+
+    return _get_model(('cross-encoder', model_name), load)
+
+
+def loaded_models() -> list:
+    """(kind, model name) of every model loaded so far."""
+    return list(_models)
+
+
+def _get_model(key: Tuple[str, str], load: Callable[[], object]):
+    """Return a cached model, loading it once even when threads race for it."""
+    model = _models.get(key)
+    if model is None:
+        with _lock:
+            model = _models.get(key)
+            if model is None:
+                model = _models[key] = load()
+    return model
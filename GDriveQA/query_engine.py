@@ -1,26 +1,65 @@
 """Query engine for answering questions."""
-from typing import Dict
+import asyncio
+import time
+from collections import deque
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from vector_store import VectorStore
-from llm_client import LLMClient
+from llm_client import AsyncLLMClient
+from reranker import Reranker
 from config import Config
 
 
+def parse_batch_question(item, default_id) -> Tuple[object, str]:
+    """Read a batch entry, either a question string or {"id": ..., "question": ...}."""
+    if isinstance(item, str):
+        request_id, question = default_id, item
+    elif isinstance(item, dict):
+        request_id, question = item.get('id', default_id), item.get('question')
+    else:
+        raise ValueError(f"Entry {default_id} must be a string or an object")
+    
+    if not isinstance(question, str) or not question.strip():
+        raise ValueError(f"Entry {default_id} has no question")
+    return request_id, question
+
+
+def batch_record(request_id, result: Dict) -> Dict:
+    """Reduce a batch result to the JSON record written for it."""
+    record = {
+        'id': request_id,
+        'question': result['question'],
+        'success': result['success'],
+        'answer': result.get('answer')
+    }
+    if result['success']:
+        record['sources'] = sorted(set(result['sources']))
+        record['num_sources'] = result['num_sources']
+        record['context_tokens'] = result['context_tokens']
+        record['timings'] = result['timings']
+    elif result.get('error'):
+        record['error'] = result['error']
+    return record
+
+
 class QueryEngine:
     """Engine for querying indexed documents."""
     
     def __init__(self):
         self.vector_store = VectorStore()
-        self.llm_client = LLMClient()
-    
-    def ask(self, question: str, top_k: int = None) -> Dict:
-        """Ask a question and get an answer with sources."""
+        self.llm_client = AsyncLLMClient()
         
-        if top_k is None:
-            top_k = Config.TOP_K_RESULTS
+        # Cross-encoder that picks the best chunks from an over-fetched candidate list
+        self.reranker = None
+        if Config.RERANK_ENABLED:
+            self.reranker = Reranker(Config.RERANK_MODEL, batch_size=Config.RERANK_BATCH_SIZE)
+    
+    def ask(self, question: str, top_k: int = None, filters: Optional[Dict] = None) -> Dict:
+        """Ask a question and get an answer with sources, optionally filtered by metadata."""
         
         # Step 1: Retrieve relevant documents
         print(f"Searching for relevant documents...")
-        search_results = self.vector_store.search(question, top_k=top_k)
+        search_results, timings = self._retrieve(question, top_k, filters)
         
         if not search_results:
             return {
@@ -34,13 +73,121 @@ class QueryEngine:
         
         # Step 2: Generate answer using LLM
         print("Generating answer...")
+        started = time.perf_counter()
         result = self.llm_client.answer_question(question, search_results)
+        timings['generation_ms'] = self._elapsed_ms(started)
+        
+        if result['success']:
+            result['context_chunks'] = search_results
+            result['timings'] = timings
+        
+        return result
+    
+    async def aask(self, question: str, top_k: int = None, filters: Optional[Dict] = None) -> Dict:
+        """Ask a question without blocking the caller's event loop."""
+        
+        # Retrieval is CPU and disk bound, so it runs in a worker thread
+        search_results, timings = await asyncio.to_thread(self._retrieve, question, top_k, filters)
+        
+        if not search_results:
+            return {
+                'success': False,
+                'answer': "I couldn't find any relevant documents to answer your question.",
+                'sources': [],
+                'context_chunks': []
+            }
+        
+        started = time.perf_counter()
+        result = await self.llm_client.aanswer_question(question, search_results)
+        timings['generation_ms'] = self._elapsed_ms(started)
         
         if result['success']:
             result['context_chunks'] = search_results
+            result['timings'] = timings
         
         return result
     
+    def ask_batch(self, questions: Iterable[str], top_k: int = None,
+                  filters: Optional[Dict] = None) -> Iterator[Dict]:
+        """Answer many questions, yielding results in input order as they complete.
+        
+        Questions are embedded and searched Config.QUERY_BATCH_SIZE at a time,
+        and each batch's LLM calls run concurrently in the background while
+        the next batch is retrieved. Each result is shaped like ask()'s, with
+        the question added.
+        """
+        questions = iter(questions)
+        pending = deque()
+        
+        while True:
+            batch = list(islice(questions, Config.QUERY_BATCH_SIZE))
+            if not batch:
+                break
+            
+            for question, (search_results, timings) in zip(batch, self._retrieve_many(batch, top_k, filters)):
+                answer = None
+                if search_results:
+                    answer = self.llm_client.submit_question(question, search_results)
+                pending.append((question, search_results, timings, answer))
+            
+            # Hand back whatever has finished without waiting on the rest
+            while pending and (pending[0][3] is None or pending[0][3].done()):
+                yield self._batch_result(*pending.popleft())
+        
+        while pending:
+            yield self._batch_result(*pending.popleft())
+    
+    def _batch_result(self, question: str, search_results: List[Dict], timings: Dict, answer) -> Dict:
+        """Build the result for one question of a batch."""
+        if answer is None:
+            return {
+                'question': question,
+                'success': False,
+                'answer': "I couldn't find any relevant documents to answer your question.",
+                'sources': [],
+                'context_chunks': []
+            }
+        
+        result = answer.result()
+        result['question'] = question
+        if result['success']:
+            result['context_chunks'] = search_results
+            result['timings'] = timings
+        return result
+    
+    def _retrieve(self, question: str, top_k: int = None,
+                  filters: Optional[Dict] = None) -> Tuple[List[Dict], Dict]:
+        """Find the chunks to answer from, re-ranking over-fetched candidates when enabled."""
+        return self._retrieve_many([question], top_k, filters)[0]
+    
+    def _retrieve_many(self, questions: List[str], top_k: int = None,
+                       filters: Optional[Dict] = None) -> List[Tuple[List[Dict], Dict]]:
+        """Retrieve chunks for several questions with a single batched search."""
+        if top_k is None:
+            top_k = Config.RERANK_TOP_K if self.reranker else Config.TOP_K_RESULTS
+        
+        started = time.perf_counter()
+        candidates = max(top_k, Config.RERANK_CANDIDATES) if self.reranker else top_k
+        batch_results = self.vector_store.search_many(questions, top_k=candidates, filters=filters)
+        # The search is shared, so each question is charged an equal share of it
+        retrieval_ms = round(self._elapsed_ms(started) / len(questions), 1)
+        
+        retrieved = []
+        for question, search_results in zip(questions, batch_results):
+            timings = {'retrieval_ms': retrieval_ms}
+            if self.reranker:
+                started = time.perf_counter()
+                search_results = self.reranker.rerank(question, search_results, top_k)
+                timings['rerank_ms'] = self._elapsed_ms(started)
+            retrieved.append((search_results, timings))
+        
+        return retrieved
+    
+    @staticmethod
+    def _elapsed_ms(started: float) -> float:
+        """Milliseconds since a time.perf_counter() reading."""
+        return round((time.perf_counter() - started) * 1000, 1)
+    
     def get_stats(self) -> Dict:
         """Get statistics about the indexed documents."""
         return self.vector_store.get_stats()
@@ -0,0 +1,155 @@
+"""Resident query daemon and the client the CLI uses to reach it.
+
+The daemon keeps a QueryEngine (embedding model, ChromaDB client and LLM
+connection pool) warm behind a Unix socket. Requests and responses are
+single JSON lines, and a connection may carry any number of requests.
+"""
+import json
+import os
+import socket
+import socketserver
+from pathlib import Path
+from typing import Dict, Optional
+from config import Config
+
+
+class QueryRequestHandler(socketserver.StreamRequestHandler):
+    """Answer JSON-line requests on one client connection."""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+
+            try:
+                response = json.dumps(self.server.dispatch(json.loads(line)))
+            except Exception as e:
+                response = json.dumps({'success': False, 'error': str(e)})
+
+            self.wfile.write((response + "\n").encode('utf-8'))
+            self.wfile.flush()
+
+
+class QueryServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server that answers questions with a shared QueryEngine."""
+
+    daemon_threads = True
+
+    def __init__(self, engine, socket_path: Path = None):
+        self.engine = engine
+        self.socket_path = Path(socket_path or Config.QUERY_SOCKET_PATH)
+
+        if self.socket_path.exists():
+            if QueryClient.connect(self.socket_path):
+                raise RuntimeError(f"A query daemon is already listening on {self.socket_path}")
+            # Left behind by a daemon that did not shut down cleanly
+            self.socket_path.unlink()
+
+        # Questions and answers are private to the local user, so the socket
+        # is created with mode 0600 rather than restricted after binding
+        umask = os.umask(0o177)
+        try:
+            super().__init__(str(self.socket_path), QueryRequestHandler)
+        finally:
+            os.umask(umask)
+
+    def dispatch(self, request: Dict) -> Dict:
+        """Run one request against the engine."""
+        action = request.get('action')
+
+        if action == 'ask':
+            if not request.get('question'):
+                return {'success': False, 'error': 'No question provided'}
+            return self.engine.ask(
+                request['question'],
+                top_k=request.get('top_k'),
+                filters=request.get('filters')
+            )
+        if action == 'stats':
+            return self.engine.get_stats()
+        if action == 'reload':
+            # Another process changed the index
+            self.engine.vector_store.reload()
+            return {'success': True}
+        if action == 'ping':
+            return {'success': True}
+
+        return {'success': False, 'error': f"Unknown action: {action}"}
+
+    def server_close(self):
+        """Close the socket and remove its file."""
+        super().server_close()
+        try:
+            self.socket_path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class QueryClient:
+    """Client for a running query daemon, with the same ask/get_stats calls as QueryEngine."""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.reader = sock.makefile('r', encoding='utf-8')
+
+    @classmethod
+    def connect(cls, socket_path: Path = None, timeout: float = 1.0) -> Optional['QueryClient']:
+        """Connect to the daemon, or return None if none is running."""
+        socket_path = Path(socket_path or Config.QUERY_SOCKET_PATH)
+        if not hasattr(socket, 'AF_UNIX') or not socket_path.exists():
+            return None
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(timeout)
+            sock.connect(str(socket_path))
+        except OSError:
+            sock.close()
+            return None
+
+        # Answers take as long as the LLM does
+        sock.settimeout(None)
+        return cls(sock)
+
+    def ask(self, question: str, top_k: int = None, filters: Optional[Dict] = None) -> Dict:
+        """Ask the daemon a question."""
+        return self._request({'action': 'ask', 'question': question, 'top_k': top_k, 'filters': filters})
+
+    def get_stats(self) -> Dict:
+        """Get statistics about the indexed documents."""
+        return self._request({'action': 'stats'})
+
+    def reload(self) -> Dict:
+        """Make the daemon reopen the index after another process changed it."""
+        return self._request({'action': 'reload'})
+
+    def close(self):
+        """Close the connection."""
+        self.reader.close()
+        self.sock.close()
+
+    def _request(self, request: Dict) -> Dict:
+        """Send a request and wait for its response."""
+        try:
+            self.sock.sendall((json.dumps(request) + "\n").encode('utf-8'))
+            line = self.reader.readline()
+        except OSError as e:
+            return {'success': False, 'error': f"Query daemon connection failed: {e}"}
+
+        if not line:
+            return {'success': False, 'error': "Query daemon closed the connection"}
+        return json.loads(line)
+
+
+def reload_daemon():
+    """Tell a running query daemon to pick up changes to the index."""
+    client = QueryClient.connect()
+    if not client:
+        return
+
+    result = client.reload()
+    client.close()
+    if result['success']:
+        print("Query daemon reloaded the index.")
+    else:
+        print(f"Error reloading the query daemon: {result.get('error', 'Unknown error')}")
@@ -0,0 +1,92 @@
+"""Local record of what has been synced from Google Drive."""
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+class SyncManifest:
+    """
+    Persistent map of Drive file ID to its synced state.
+
+    Each entry keeps the Drive name, modifiedTime and md5Checksum of the
+    version that was indexed, where it was downloaded and the IDs of the
+    chunks it produced. The manifest also stores the Drive changes page
+    token to resume from, so a sync only has to look at what changed since,
+    along with the scope (folders or shared drive) the token belongs to and,
+    for folder syncs, every folder in the synced tree.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.page_token: Optional[str] = None
+        self.scope: Optional[Dict] = None
+        self.folders: List[str] = []
+        self.files: Dict[str, Dict] = {}
+        self._load()
+
+    def _load(self):
+        """Read the manifest from disk, starting empty if there is none."""
+        if not self.path.exists():
+            return
+
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.page_token = data.get('page_token')
+            self.scope = data.get('scope')
+            self.folders = data.get('folders', [])
+            self.files = data.get('files', {})
+        except (OSError, ValueError) as e:
+            # A full sync rebuilds everything the manifest would have told us
+            print(f"Error reading sync manifest {self.path}: {e}")
+
+    def save(self):
+        """Write the manifest atomically so a crash never leaves it half written."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'page_token': self.page_token,
+                'scope': self.scope,
+                'folders': self.folders,
+                'files': self.files
+            }, f)
+        os.replace(temp_path, self.path)
+
+    def __contains__(self, file_id: str) -> bool:
+        return file_id in self.files
+
+    def get(self, file_id: str) -> Optional[Dict]:
+        """Entry for a file, or None if it has not been synced."""
+        return self.files.get(file_id)
+
+    def file_ids(self) -> List[str]:
+        """IDs of every synced file."""
+        return list(self.files)
+
+    def is_current(self, file: Dict) -> bool:
+        """Whether the synced copy of a Drive file is up to date."""
+        entry = self.files.get(file['id'])
+        if entry is None or entry['name'] != file['name']:
+            return False
+
+        # Binary files carry a checksum; Google Docs only change their modifiedTime
+        if file.get('md5Checksum') and entry.get('md5_checksum'):
+            return file['md5Checksum'] == entry['md5_checksum']
+        return file.get('modifiedTime') == entry.get('modified_time')
+
+    def record(self, file: Dict, local_path: Path, chunk_ids: List[str]):
+        """Record the synced state of a Drive file."""
+        self.files[file['id']] = {
+            'name': file['name'],
+            'mime_type': file['mimeType'],
+            'modified_time': file.get('modifiedTime'),
+            'md5_checksum': file.get('md5Checksum'),
+            'local_path': str(local_path),
+            'chunk_ids': chunk_ids
+        }
+
+    def remove(self, file_id: str) -> Optional[Dict]:
+        """Forget a file, returning its last entry."""
+        return self.files.pop(file_id, None)
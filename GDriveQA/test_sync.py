@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Tests for Google Drive sync: nothing is lost when Drive or a stage fails.
+
+The Drive service and vector store are replaced with in-memory fakes, so no
+credentials or network access are needed:
+
+    python -m pytest test_sync.py
+"""
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from config import Config
+from gdrive_client import GDriveClient
+from indexer import DocumentIndexer
+from sync_manifest import SyncManifest
+
+
+def drive_file(file_id: str) -> dict:
+    """Metadata of a small PDF in Drive."""
+    return {
+        'id': file_id,
+        'name': f"{file_id}.pdf",
+        'mimeType': 'application/pdf',
+        'modifiedTime': '2024-06-01T12:00:00.000Z',
+        'md5Checksum': file_id,
+        'size': '1000',
+        'parents': ['root']
+    }
+
+
+class FakeRequest:
+    """Stands in for a googleapiclient request."""
+
+    def __init__(self, execute):
+        self.execute = execute
+
+
+class FailingListService:
+    """Drive service whose files.list fails after the first page."""
+
+    def __init__(self, first_page: list):
+        self.first_page = first_page
+
+    def files(self):
+        return self
+
+    def changes(self):
+        return self
+
+    def list(self, pageToken=None, **kwargs):
+        if pageToken is None:
+            return FakeRequest(lambda: {'files': self.first_page, 'nextPageToken': 'page-2'})
+        return FakeRequest(self._fail)
+
+    def getStartPageToken(self, **kwargs):
+        return FakeRequest(lambda: {'startPageToken': 'token-2'})
+
+    @staticmethod
+    def _fail():
+        raise ConnectionError("Drive listing failed")
+
+
+class IncompleteListService(FailingListService):
+    """Drive service whose files.list returns one page flagged as incomplete."""
+
+    def list(self, pageToken=None, **kwargs):
+        return FakeRequest(lambda: {'files': self.first_page, 'incompleteSearch': True})
+
+
+class FullScanTest(unittest.TestCase):
+    """A full scan whose listing fails must not remove anything."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.manifest_path = Path(self.tmp.name) / 'sync_manifest.json'
+        patcher = mock.patch.object(Config, 'SYNC_MANIFEST_PATH', self.manifest_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # Three files indexed by an earlier sync
+        manifest = SyncManifest(self.manifest_path)
+        for file_id in ('a', 'b', 'c'):
+            manifest.record(drive_file(file_id), Path(self.tmp.name) / file_id, [f"{file_id}-0"])
+        manifest.save()
+
+    def test_failed_listing_removes_nothing(self):
+        vector_store = mock.MagicMock()
+        indexer = DocumentIndexer(vector_store=vector_store)
+        indexer.gdrive_client = GDriveClient(
+            service=FailingListService([drive_file('a')]), folder_ids=[], shared_drive_id=None
+        )
+
+        with self.assertRaises(ConnectionError):
+            indexer.sync_and_index(force_reindex=True)
+
+        vector_store.delete_chunks.assert_not_called()
+        manifest = SyncManifest(self.manifest_path)
+        self.assertEqual(sorted(manifest.file_ids()), ['a', 'b', 'c'])
+        self.assertIsNone(manifest.page_token)
+
+    def test_incomplete_listing_removes_nothing(self):
+        vector_store = mock.MagicMock()
+        indexer = DocumentIndexer(vector_store=vector_store)
+        indexer.gdrive_client = GDriveClient(
+            service=IncompleteListService([drive_file('a')]), folder_ids=[], shared_drive_id=None
+        )
+
+        with self.assertRaises(RuntimeError):
+            indexer.sync_and_index(force_reindex=True)
+
+        vector_store.delete_chunks.assert_not_called()
+        manifest = SyncManifest(self.manifest_path)
+        self.assertEqual(sorted(manifest.file_ids()), ['a', 'b', 'c'])
+
+
+class LocalDriveClient:
+    """Drive client that "downloads" files from an in-memory dict."""
+
+    folder_ids = []
+    scope = {'folder_ids': [], 'shared_drive_id': None}
+    cache_hits = 0
+
+    def __init__(self, contents: dict):
+        self.contents = contents
+        self.files = [dict(drive_file(name), name=name) for name in contents]
+
+    def get_start_page_token(self):
+        return 'token-1'
+
+    def list_supported_files(self):
+        return self.files
+
+    file_version = staticmethod(GDriveClient.file_version)
+
+    def download_file(self, file_id, file_name, mime_type, destination, version=None):
+        file_path = Path(destination) / file_name
+        file_path.write_bytes(self.contents[file_name])
+        return file_path
+
+
+class ExtractionFailureTest(unittest.TestCase):
+    """Files that cannot be downloaded or extracted stay pending; empty ones do not."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.manifest_path = Path(self.tmp.name) / 'sync_manifest.json'
+        for name, value in (('SYNC_MANIFEST_PATH', self.manifest_path),
+                            ('STORAGE_PATH', Path(self.tmp.name))):
+            patcher = mock.patch.object(Config, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_failed_extraction_is_retried(self):
+        vector_store = mock.MagicMock()
+        vector_store.add_documents.side_effect = lambda documents: [
+            [f"{document['file_name']}-{i}" for i in range(len(document['chunks']))]
+            for document in documents
+        ]
+        vector_store.get_stats.return_value = {'total_chunks': 1, 'total_files': 1}
+
+        indexer = DocumentIndexer(vector_store=vector_store)
+        indexer.gdrive_client = LocalDriveClient({
+            'notes.txt': b"Quarterly budget notes.",
+            'blank.txt': b"",
+            'broken.pdf': b"not a PDF"
+        })
+        indexer.sync_and_index()
+
+        manifest = SyncManifest(self.manifest_path)
+        recorded = {manifest.get(file_id)['name']: manifest.get(file_id)['chunk_ids']
+                    for file_id in manifest.file_ids()}
+        self.assertEqual(recorded, {'notes.txt': ['notes.txt-0'], 'blank.txt': []})
+        # The changes token stays put so the broken file is tried again
+        self.assertIsNone(manifest.page_token)
+
+    def test_failed_download_is_retried(self):
+        vector_store = mock.MagicMock()
+        vector_store.add_documents.side_effect = lambda documents: [
+            [f"{document['file_name']}-0"] for document in documents
+        ]
+        vector_store.get_stats.return_value = {'total_chunks': 1, 'total_files': 1}
+
+        gdrive_client = LocalDriveClient({'notes.txt': b"Quarterly budget notes.", 'lost.txt': b"Lost."})
+        download_file = gdrive_client.download_file
+
+        def failing_download(file_id, file_name, *args, **kwargs):
+            if file_name == 'lost.txt':
+                raise OSError("Connection reset")
+            return download_file(file_id, file_name, *args, **kwargs)
+
+        gdrive_client.download_file = failing_download
+        indexer = DocumentIndexer(vector_store=vector_store)
+        indexer.gdrive_client = gdrive_client
+        indexer.sync_and_index()
+
+        manifest = SyncManifest(self.manifest_path)
+        self.assertEqual([manifest.get(file_id)['name'] for file_id in manifest.file_ids()], ['notes.txt'])
+        self.assertIsNone(manifest.page_token)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,106 @@
 """Vector store for document embeddings using ChromaDB."""
+import os
+import time
+from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterable, Iterator, Sized
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 import chromadb
 from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
 from config import Config
+from embedding_cache import EmbeddingCache
+from models import get_embedding_model
+from bm25_index import BM25Index, reciprocal_rank_fusion
 import hashlib
+import numpy as np
+
+
+def _batched(iterable: Iterable, size: int) -> Iterator[list]:
+    """Yield successive lists of up to size items from an iterable."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+# Chunk metadata fields that search filters may constrain
+FILTER_FIELDS = {'file_type', 'file_name', 'file_path', 'size', 'chunk_index', 'indexed_at'}
+NUMERIC_FILTER_FIELDS = {'size', 'chunk_index', 'indexed_at'}
+
+
+def build_where(filters: Dict = None) -> Dict:
+    """Translate search filters into a ChromaDB where clause.
+    
+    Each filter maps a metadata field to a value, a list of accepted values
+    or a {"min": ..., "max": ...} range. indexed_at also accepts ISO dates.
+    
+    Args:
+        filters: Filters by field name
+        
+    Returns:
+        Where clause, or None when there is nothing to filter on
+        
+    Raises:
+        ValueError: If a filter names an unknown field or has an invalid value
+    """
+    if not filters:
+        return None
+    if not isinstance(filters, dict):
+        raise ValueError("Filters must be an object")
+    
+    conditions = []
+    for field, value in filters.items():
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Unsupported filter: {field}")
+        
+        if isinstance(value, dict):
+            if not value or set(value) - {'min', 'max'}:
+                raise ValueError(f"Range filter on {field} takes 'min' and/or 'max'")
+            if field not in NUMERIC_FILTER_FIELDS:
+                raise ValueError(f"Range filters are not supported on {field}")
+            # Chroma allows a single operator per field condition
+            if 'min' in value:
+                conditions.append({field: {'$gte': _filter_value(field, value['min'])}})
+            if 'max' in value:
+                conditions.append({field: {'$lte': _filter_value(field, value['max'])}})
+        
+        elif isinstance(value, list):
+            if not value:
+                raise ValueError(f"Filter on {field} needs at least one value")
+            conditions.append({field: {'$in': [_filter_value(field, item) for item in value]}})
+        
+        else:
+            conditions.append({field: _filter_value(field, value)})
+    
+    return conditions[0] if len(conditions) == 1 else {'$and': conditions}
+
+
+def _filter_value(field: str, value) -> any:
+    """Validate a filter value and convert it to the form stored in chunk metadata."""
+    if field == 'indexed_at' and isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            raise ValueError(f"Invalid date for indexed_at: {value}")
+    
+    if field in NUMERIC_FILTER_FIELDS:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"Filter on {field} needs a number")
+        return value
+    
+    if not isinstance(value, str) or not value:
+        raise ValueError(f"Filter on {field} needs a non-empty string")
+    
+    if field == 'file_type':
+        # Stored as the lower-case extension with its dot
+        value = value.lower()
+        return value if value.startswith('.') else f".{value}"
+    
+    return value
 
 
 class VectorStore:
@@ -13,89 +108,315 @@ class VectorStore:
     
     def __init__(self, collection_name: str = "documents"):
         self.collection_name = collection_name
-        self.embedding_model = SentenceTransformer(Config.EMBEDDING_MODEL)
+        
+        # Persistent cache so repeated text is never re-encoded
+        self.embedding_cache = None
+        if Config.EMBEDDING_CACHE_ENABLED:
+            self.embedding_cache = EmbeddingCache(
+                str(Config.EMBEDDING_CACHE_PATH),
+                Config.EMBEDDING_MODEL,
+                max_entries=Config.EMBEDDING_CACHE_MAX_ENTRIES
+            )
         
         # Initialize ChromaDB
-        self.client = chromadb.PersistentClient(
+        self.client, self.collection = self._open_collection()
+        
+        # Keyword index so exact identifiers are found even when embeddings miss them
+        self.bm25 = None
+        if Config.HYBRID_SEARCH:
+            self.bm25 = BM25Index(str(Config.BM25_DB_PATH), k1=Config.BM25_K1, b=Config.BM25_B)
+            if self.bm25.count() == 0 and self.collection.count() > 0:
+                self._rebuild_bm25()
+    
+    def _open_collection(self):
+        """Open the ChromaDB client and get or create the collection."""
+        client = chromadb.PersistentClient(
             path=str(Config.CHROMA_DB_PATH),
             settings=Settings(anonymized_telemetry=False)
         )
-        
-        # Get or create collection
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name,
+        collection = client.get_or_create_collection(
+            name=self.collection_name,
             metadata={"description": "Google Drive documents"}
         )
+        return client, collection
+    
+    def reload(self):
+        """Reopen ChromaDB so changes written by another process are seen.
+        
+        Chroma keeps one system per path and caches its HNSW index in memory,
+        so a long-lived process (the query daemon) never sees what cli.py
+        index writes until the cached system is dropped. Searches already
+        running finish against the old collection.
+        """
+        chromadb.PersistentClient.clear_system_cache()
+        self.client, self.collection = self._open_collection()
+    
+    @property
+    def embedding_model(self):
+        """Embedding model, loaded on first use and shared across the process."""
+        return get_embedding_model(Config.EMBEDDING_MODEL)
+    
+    def _embed(self, texts: List[str]):
+        """Encode texts, consulting the embedding cache when enabled."""
+        if self.embedding_cache is None:
+            return self.embedding_model.encode(texts, show_progress_bar=False)
+        return self.embedding_cache.encode(
+            texts, lambda batch: self.embedding_model.encode(batch, show_progress_bar=False)
+        )
     
     def _generate_id(self, text: str, file_path: str, chunk_index: int) -> str:
         """Generate unique ID for a chunk."""
         content = f"{file_path}_{chunk_index}_{text[:100]}"
         return hashlib.md5(content.encode()).hexdigest()
     
-    def add_document(self, file_path: str, file_name: str, chunks: List[str], 
-                    metadata: Optional[Dict] = None):
-        """Add document chunks to the vector store."""
-        if not chunks:
-            return
+    def add_document(self, file_path: str, file_name: str, chunks: Iterable[str], 
+                    metadata: Optional[Dict] = None) -> Optional[List[str]]:
+        """Add document chunks to the vector store.
+        
+        Chunks are consumed lazily and embedded in batches of
+        Config.EMBED_BATCH_SIZE; each batch is upserted as soon as it is encoded.
+        Returns the IDs of the stored chunks, or None if the document failed.
+        """
+        total_chunks = len(chunks) if isinstance(chunks, Sized) else None
+        file_metadata = self._file_metadata(file_path, file_name, metadata)
+        
+        chunk_ids = []
+        added_ids = []
+        try:
+            batches = self._prepare_batches(file_path, file_name, chunks, file_metadata, total_chunks)
+            for batch, embeddings in self._embed_batches(batches):
+                self._store_batch(batch, embeddings, added_ids)
+                chunk_ids.extend(batch['ids'])
+        except Exception as e:
+            print(f"Error adding document {file_name}: {e}")
+            self._discard_partial_documents(added_ids, file_name)
+            return None
+        
+        return chunk_ids
+    
+    def add_documents(self, documents: List[Dict]) -> List[Optional[List[str]]]:
+        """Add several documents, embedding their chunks together.
+        
+        Each document is a dict with 'file_path', 'file_name', 'chunks' and
+        optional 'metadata'. Chunks of small documents share embedding
+        batches instead of each filling a batch of their own. Returns each
+        document's chunk IDs, or None for every document if storing failed.
+        """
+        def entries():
+            for position, document in enumerate(documents):
+                chunks = list(document['chunks'])
+                file_metadata = self._file_metadata(
+                    document['file_path'], document['file_name'], document.get('metadata')
+                )
+                for entry in self._chunk_entries(
+                    document['file_path'], document['file_name'], chunks, file_metadata, len(chunks)
+                ):
+                    yield position, entry
+        
+        def batches():
+            for batch in _batched(entries(), Config.EMBED_BATCH_SIZE):
+                prepared = {'ids': [], 'documents': [], 'metadatas': [], 'positions': []}
+                for position, (chunk_id, chunk, chunk_metadata) in batch:
+                    prepared['ids'].append(chunk_id)
+                    prepared['documents'].append(chunk)
+                    prepared['metadatas'].append(chunk_metadata)
+                    prepared['positions'].append(position)
+                yield prepared
         
-        # Generate embeddings
-        embeddings = self.embedding_model.encode(chunks, show_progress_bar=False)
+        chunk_ids = [[] for _ in documents]
+        added_ids = []
+        try:
+            for batch, embeddings in self._embed_batches(batches()):
+                self._store_batch(batch, embeddings, added_ids)
+                for position, chunk_id in zip(batch['positions'], batch['ids']):
+                    chunk_ids[position].append(chunk_id)
+        except Exception as e:
+            names = ", ".join(document['file_name'] for document in documents)
+            print(f"Error adding documents {names}: {e}")
+            self._discard_partial_documents(added_ids, names)
+            return [None] * len(documents)
         
-        # Prepare data for ChromaDB
-        ids = []
-        metadatas = []
+        return chunk_ids
+    
+    def _file_metadata(self, file_path: str, file_name: str, metadata: Optional[Dict]) -> Dict:
+        """Searchable file-level metadata; explicit metadata takes precedence."""
+        file_metadata = {
+            'file_type': Path(file_name).suffix.lower(),
+            'indexed_at': time.time()
+        }
+        if os.path.exists(file_path):
+            file_metadata['size'] = os.path.getsize(file_path)
+        file_metadata.update(metadata or {})
+        return file_metadata
+    
+    def _store_batch(self, batch: Dict, embeddings, added_ids: List[str]):
+        """Upsert an embedded batch and add it to the keyword index.
         
+        IDs that were not stored before are appended to added_ids first, so
+        they can be removed if the document fails later on.
+        """
+        existing = set(self.collection.get(ids=batch['ids'], include=[])['ids'])
+        added_ids.extend(chunk_id for chunk_id in batch['ids'] if chunk_id not in existing)
+        self.collection.upsert(
+            ids=batch['ids'],
+            embeddings=embeddings.tolist(),
+            documents=batch['documents'],
+            metadatas=batch['metadatas']
+        )
+        if self.bm25:
+            self.bm25.add(
+                (chunk_id, metadata['file_path'], text)
+                for chunk_id, text, metadata in zip(batch['ids'], batch['documents'], batch['metadatas'])
+            )
+    
+    def _discard_partial_documents(self, added_ids: List[str], names: str):
+        """Delete the chunks unfinished documents added, leaving their previous versions intact."""
+        try:
+            self.delete_chunks(added_ids)
+        except Exception as e:
+            print(f"Error removing partially added chunks of {names}: {e}")
+    
+    def _prepare_batches(self, file_path: str, file_name: str, chunks: Iterable[str],
+                         metadata: Optional[Dict], total_chunks: Optional[int]) -> Iterator[Dict]:
+        """Split a chunk stream into batches ready for ChromaDB."""
+        entries = self._chunk_entries(file_path, file_name, chunks, metadata, total_chunks)
+        for batch in _batched(entries, Config.EMBED_BATCH_SIZE):
+            prepared = {'ids': [], 'documents': [], 'metadatas': []}
+            for chunk_id, chunk, chunk_metadata in batch:
+                prepared['ids'].append(chunk_id)
+                prepared['documents'].append(chunk)
+                prepared['metadatas'].append(chunk_metadata)
+            yield prepared
+    
+    def _chunk_entries(self, file_path: str, file_name: str, chunks: Iterable[str],
+                       metadata: Optional[Dict], total_chunks: Optional[int]) -> Iterator[tuple]:
+        """Yield (chunk ID, text, metadata) for each chunk of a document."""
         for i, chunk in enumerate(chunks):
-            chunk_id = self._generate_id(chunk, file_path, i)
-            ids.append(chunk_id)
-            
             chunk_metadata = {
                 'file_path': file_path,
                 'file_name': file_name,
-                'chunk_index': i,
-                'total_chunks': len(chunks)
+                'chunk_index': i
             }
+            if total_chunks is not None:
+                chunk_metadata['total_chunks'] = total_chunks
             if metadata:
                 chunk_metadata.update(metadata)
             
-            metadatas.append(chunk_metadata)
+            yield self._generate_id(chunk, file_path, i), chunk, chunk_metadata
+    
+    def _embed_batches(self, batches: Iterable[Dict]):
+        """Embed batches on a worker pool, yielding (batch, embeddings) in order.
         
-        # Add to collection
-        try:
-            self.collection.add(
-                ids=ids,
-                embeddings=embeddings.tolist(),
-                documents=chunks,
-                metadatas=metadatas
-            )
-        except Exception as e:
-            print(f"Error adding document {file_name}: {e}")
+        At most Config.EMBED_WORKERS batches are in flight at once.
+        """
+        with ThreadPoolExecutor(max_workers=Config.EMBED_WORKERS) as pool:
+            pending = deque()
+            for batch in batches:
+                pending.append((batch, pool.submit(self._embed, batch['documents'])))
+                if len(pending) >= Config.EMBED_WORKERS:
+                    ready, future = pending.popleft()
+                    yield ready, future.result()
+            
+            while pending:
+                ready, future = pending.popleft()
+                yield ready, future.result()
+    
+    def search(self, query: str, top_k: int = 5, filters: Optional[Dict] = None) -> List[Dict]:
+        """Search for similar documents.
+        
+        With Config.HYBRID_SEARCH, the nearest chunks by embedding and the
+        best BM25 keyword matches are merged by reciprocal rank fusion.
+        Metadata filters (see build_where) are applied inside ChromaDB.
+        """
+        return self.search_many([query], top_k=top_k, filters=filters)[0]
     
-    def search(self, query: str, top_k: int = 5) -> List[Dict]:
-        """Search for similar documents."""
-        # Generate query embedding
-        query_embedding = self.embedding_model.encode([query])[0]
+    def search_many(self, queries: List[str], top_k: int = 5,
+                    filters: Optional[Dict] = None) -> List[List[Dict]]:
+        """Search for several queries with one embedding pass and one ChromaDB query."""
+        if not queries:
+            return []
+        
+        where = build_where(filters)
+        
+        # Generate query embeddings
+        query_embeddings = self._embed(list(queries))
+        candidates = max(top_k, Config.HYBRID_CANDIDATES) if self.bm25 else top_k
         
         # Search in ChromaDB
         results = self.collection.query(
-            query_embeddings=[query_embedding.tolist()],
-            n_results=top_k,
+            query_embeddings=[embedding.tolist() for embedding in query_embeddings],
+            n_results=candidates,
+            where=where,
             include=['documents', 'metadatas', 'distances']
         )
         
+        return [
+            self._rank_hits(query, query_embeddings[i], results, i, top_k, candidates, where)
+            for i, query in enumerate(queries)
+        ]
+    
+    def _rank_hits(self, query: str, query_embedding, results: Dict, position: int,
+                   top_k: int, candidates: int, where: Optional[Dict]) -> List[Dict]:
+        """Rank one query's vector hits, fused with its keyword hits when hybrid search is on."""
+        hits = {}
+        vector_ids = results['ids'][position] if results and results['ids'] else []
+        for i, chunk_id in enumerate(vector_ids):
+            hits[chunk_id] = self._format_hit(
+                results['documents'][position][i],
+                results['metadatas'][position][i],
+                1 - results['distances'][position][i]  # Convert distance to similarity
+            )
+        
+        if self.bm25:
+            keyword_ids = self._keyword_search(query, candidates, where)
+            fused = reciprocal_rank_fusion([vector_ids, keyword_ids], k=Config.RRF_K)
+            ranked_ids = [chunk_id for chunk_id, _ in fused[:top_k]]
+            
+            missing_ids = [chunk_id for chunk_id in ranked_ids if chunk_id not in hits]
+            if missing_ids:
+                hits.update(self._fetch_hits(missing_ids, query_embedding))
+        else:
+            ranked_ids = vector_ids[:top_k]
+        
         # Format results
-        formatted_results = []
-        if results and results['ids']:
-            for i in range(len(results['ids'][0])):
-                formatted_results.append({
-                    'text': results['documents'][0][i],
-                    'metadata': results['metadatas'][0][i],
-                    'similarity': 1 - results['distances'][0][i],  # Convert distance to similarity
-                    'file_name': results['metadatas'][0][i].get('file_name', 'Unknown'),
-                    'file_path': results['metadatas'][0][i].get('file_path', 'Unknown')
-                })
+        return [hits[chunk_id] for chunk_id in ranked_ids if chunk_id in hits]
+    
+    def _format_hit(self, text: str, metadata: Dict, similarity: float) -> Dict:
+        """Build a search result entry."""
+        return {
+            'text': text,
+            'metadata': metadata,
+            'similarity': similarity,
+            'file_name': metadata.get('file_name', 'Unknown'),
+            'file_path': metadata.get('file_path', 'Unknown')
+        }
+    
+    def _keyword_search(self, query: str, limit: int, where: Optional[Dict] = None) -> List[str]:
+        """Rank chunk IDs by BM25, keeping only chunks that match the where clause."""
+        if where is None:
+            return [chunk_id for chunk_id, _ in self.bm25.search(query, limit)]
+        
+        # The keyword index knows nothing about metadata, so over-fetch and let Chroma filter
+        keyword_ids = [chunk_id for chunk_id, _ in self.bm25.search(query, limit * 5)]
+        if not keyword_ids:
+            return []
         
-        return formatted_results
+        matching = set(self.collection.get(ids=keyword_ids, where=where, include=[])['ids'])
+        return [chunk_id for chunk_id in keyword_ids if chunk_id in matching][:limit]
+    
+    def _fetch_hits(self, chunk_ids: List[str], query_embedding) -> Dict[str, Dict]:
+        """Load keyword-only matches and compute their similarity to the query."""
+        fetched = self.collection.get(ids=chunk_ids, include=['documents', 'metadatas', 'embeddings'])
+        query_norm = np.linalg.norm(query_embedding) or 1.0
+        
+        hits = {}
+        for chunk_id, text, metadata, embedding in zip(
+            fetched['ids'], fetched['documents'], fetched['metadatas'], fetched['embeddings']
+        ):
+            vector = np.asarray(embedding, dtype=np.float32)
+            similarity = float(vector @ query_embedding) / ((np.linalg.norm(vector) or 1.0) * query_norm)
+            hits[chunk_id] = self._format_hit(text, metadata, similarity)
+        return hits
     
     def delete_document(self, file_path: str):
         """Delete all chunks of a document."""
@@ -106,6 +427,18 @@ class VectorStore:
         
         if results and results['ids']:
             self.collection.delete(ids=results['ids'])
+        
+        if self.bm25:
+            self.bm25.remove_document(file_path)
+    
+    def delete_chunks(self, chunk_ids: List[str]):
+        """Delete chunks by ID."""
+        if not chunk_ids:
+            return
+        
+        self.collection.delete(ids=list(chunk_ids))
+        if self.bm25:
+            self.bm25.remove(chunk_ids)
     
     def clear_all(self):
         """Clear all documents from the collection."""
@@ -114,6 +447,23 @@ class VectorStore:
             name=self.collection_name,
             metadata={"description": "Google Drive documents"}
         )
+        if self.bm25:
+            self.bm25.clear()
+    
+    def _rebuild_bm25(self, page_size: int = 1000):
+        """Backfill the keyword index from stored chunks."""
+        offset = 0
+        while True:
+            results = self.collection.get(include=['documents', 'metadatas'], limit=page_size, offset=offset)
+            if not results['ids']:
+                break
+            
+            self.bm25.add(
+                (chunk_id, metadata.get('file_path', ''), text)
+                for chunk_id, metadata, text
+                in zip(results['ids'], results['metadatas'], results['documents'])
+            )
+            offset += len(results['ids'])
     
     def get_stats(self) -> Dict:
         """Get statistics about the vector store."""
@@ -125,8 +475,12 @@ class VectorStore:
         if all_data and all_data['metadatas']:
             unique_files = {meta.get('file_path') for meta in all_data['metadatas']}
         
-        return {
+        stats = {
             'total_chunks': count,
             'total_files': len(unique_files),
             'collection_name': self.collection_name
         }
+        if self.embedding_cache:
+            stats['embedding_cache'] = self.embedding_cache.stats()
+        
+        return stats